@@ -0,0 +1,57 @@
+"""
+批量问答命令行工具
+读取 JSONL 问题文件，逐批输出 JSONL 结果（与 /api/ask/batch 相同的处理流程）
+
+问题文件每行一个问题：
+    {"question": "...", "id": "可选", "collection_name": "可选"}
+
+用法：
+    python -m app.batch_ask --input questions.jsonl --output answers.jsonl --collection default
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from app.services.batch_qa import BatchQARunner, parse_jsonl
+from app.services.qa_service import QAService
+
+
+async def run(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        items = parse_jsonl(f)
+
+    qa_service = QAService()
+    runner = BatchQARunner(qa_service, chunk_size=args.chunk_size, llm_concurrency=args.llm_concurrency)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    start = time.time()
+    count = 0
+    try:
+        async for result in runner.run(items, collection_name=args.collection):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await qa_service.aclose()
+
+    elapsed = time.time() - start
+    print(f"✓ 完成 {count} 个问题，耗时 {elapsed:.1f}s（{count / elapsed:.1f} 问题/秒）", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量问答")
+    parser.add_argument("--input", required=True, help="问题文件（JSONL）")
+    parser.add_argument("--output", help="结果文件（JSONL），不指定时输出到标准输出")
+    parser.add_argument("--collection", default="default", help="未单独指定集合的问题使用的集合")
+    parser.add_argument("--chunk-size", type=int, help="每批检索的问题数（默认读取 BATCH_QA_CHUNK_SIZE）")
+    parser.add_argument("--llm-concurrency", type=int, help="LLM 并发数（默认读取 BATCH_QA_LLM_CONCURRENCY）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+批量入库命令行工具
+导入整个目录（递归）或 zip 压缩包中的 .pdf / .docx / .txt 文档（与 /api/upload/batch 相同的处理流程）
+
+中断后用相同参数重新运行即可续传：已完整入库且内容未变化的文件会被跳过
+
+服务（app.main）运行时不能使用本工具：服务把 BM25 索引、文档清单和集合版本号常驻内存，
+两个进程同时写入会互相覆盖。两者通过数据目录写入锁互斥，服务运行时请改用 POST /api/upload/batch
+
+用法：
+    python -m app.ingest docs/ --collection default --workers 4
+    python -m app.ingest manuals.zip --collection manuals --extract-dir uploads/manuals
+"""
+import sys
+import json
+import argparse
+
+from app.services.bulk_ingest import BulkIngestor, collect_files
+from app.services.document_service import DocumentService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量入库")
+    parser.add_argument("path", help="目录、zip 压缩包或单个文档")
+    parser.add_argument("--collection", default="default", help="目标集合名称")
+    parser.add_argument("--workers", type=int, help="工作进程数（默认读取 BULK_INGEST_WORKERS）")
+    parser.add_argument("--write-batch", type=int, help="合并写入 Chroma 的片段数（默认读取 BULK_WRITE_BATCH）")
+    parser.add_argument("--extract-dir", help="zip 的解压目录（默认为压缩包同名目录）")
+    args = parser.parse_args()
+
+    try:
+        files = collect_files(args.path, extract_dir=args.extract_dir)
+    except ValueError as e:
+        print(f"[ERROR] {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    if not files:
+        print("没有找到可入库的文档", file=sys.stderr)
+        return
+
+    last_reported = [0]
+
+    def progress(stage, files_processed=None, files_total=None, **kwargs):
+        if files_processed and files_processed != last_reported[0]:
+            last_reported[0] = files_processed
+            print(f"  进度：{files_processed}/{files_total} 个文件", file=sys.stderr)
+
+    document_service = DocumentService()
+    if not document_service.data_lock.acquire(owner="app.ingest"):
+        print(
+            f"[ERROR] 数据目录 {document_service.persist_directory} 正被其他进程使用"
+            f"（{document_service.data_lock.holder() or '未知进程'}）。"
+            f"服务运行时请通过 POST /api/upload/batch 批量入库，或停止服务后再运行",
+            file=sys.stderr
+        )
+        sys.exit(1)
+    try:
+        ingestor = BulkIngestor(document_service, num_workers=args.workers, write_batch=args.write_batch)
+        stats = ingestor.run(files, collection_name=args.collection, progress_callback=progress)
+    finally:
+        document_service.shutdown()
+        document_service.data_lock.release()
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if stats["files_failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
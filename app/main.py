@@ -11,8 +11,14 @@ project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
+import json
+import shutil
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -21,12 +27,44 @@ import uvicorn
 
 from app.services.document_service import DocumentService
 from app.services.qa_service import QAService
+from app.services.model_registry import model_registry
+from app.services.ingest_jobs import IngestionJobManager
+from app.services.llm_client import LLMSaturatedError
+from app.services.batch_qa import BatchQARunner, parse_jsonl
+from app.services.upload_storage import UploadSpooler, UploadTooLargeError
+from app.services.bulk_ingest import collect_files, extract_archive
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：获取数据目录写入锁（与 python -m app.ingest 互斥），
+    可选地在启动时预热模型，避免首次请求承担冷加载开销
+    """
+    if not document_service.data_lock.acquire(owner="app.main"):
+        raise RuntimeError(
+            f"数据目录 {document_service.persist_directory} 正被其他进程写入"
+            f"（{document_service.data_lock.holder() or '未知进程'}），请等待批量入库结束后再启动服务"
+        )
+    if os.getenv("WARMUP_MODELS", "0") == "1":
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, model_registry.warmup)
+        except Exception as e:
+            print(f"[WARN] 模型预热失败：{str(e)}")
+    yield
+    ingestion_jobs.shutdown(wait=False)
+    document_service.shutdown()
+    await qa_service.aclose()
+    document_service.data_lock.release()
+
 
 # 创建FastAPI应用实例
 app = FastAPI(
     title="智能知识库问答系统",
     description="基于LangChain和Chroma的文档问答系统",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置CORS，允许跨域请求（前端JSP页面需要）
@@ -41,15 +79,24 @@ app.add_middleware(
 # 静态文件目录（用于存放JSP页面）
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 初始化服务
+# 初始化服务（问答服务复用同一个文档服务实例）
 document_service = DocumentService()
-qa_service = QAService()
+qa_service = QAService(document_service=document_service)
+# 文档入库任务队列（后台线程池处理，避免阻塞事件循环）
+ingestion_jobs = IngestionJobManager(document_service)
+# 批量问答（批量向量化 / 批量检索 / 合并重排序）
+batch_runner = BatchQARunner(qa_service)
+# 上传文件分块落盘（边接收边计算哈希，限制文件大小）
+upload_spooler = UploadSpooler()
+# 批量上传的压缩包通常远大于单个文档，单独设置大小上限
+archive_spooler = UploadSpooler(max_bytes=int(os.getenv("BULK_UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024))))
 
 
 class QuestionRequest(BaseModel):
-    """问答请求模型"""
+    """问答请求模型（collection_names 指定多个集合时并发检索并全局融合）"""
     question: str
     collection_name: Optional[str] = "default"
+    collection_names: Optional[List[str]] = None
 
 
 class QuestionResponse(BaseModel):
@@ -82,7 +129,9 @@ async def upload_document(
 ):
     """
     上传文档接口
-    支持PDF、DOCX等格式，自动进行切片和向量化
+    支持PDF、DOCX等格式，分块保存文件后提交后台入库任务并立即返回任务ID，
+    通过 /api/jobs/{job_id} 查询切片和向量化进度；
+    与集合中已入库文件内容完全相同时直接返回，不重新解析
     """
     try:
         # 检查文件类型
@@ -95,32 +144,151 @@ async def upload_document(
                 detail=f"不支持的文件格式。支持格式：{', '.join(allowed_extensions)}"
             )
         
-        # 保存上传的文件
+        # 分块保存上传的文件，同时计算内容哈希
         upload_dir = "uploads"
         os.makedirs(upload_dir, exist_ok=True)
         file_path = os.path.join(upload_dir, file.filename)
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        try:
+            upload_spooler.check_size(getattr(file, "size", None))
+            tmp_path, file_size, content_hash = await upload_spooler.spool(file, file_path)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
         
-        # 处理文档：切片和向量化
-        result = await document_service.process_document(
+        # 内容与已入库的同名文件完全相同：跳过解析和向量化
+        loop = asyncio.get_running_loop()
+        existing = await loop.run_in_executor(
+            None, document_service.find_identical_document, collection_name, file_path, content_hash
+        )
+        if existing is not None:
+            await loop.run_in_executor(None, upload_spooler.discard, tmp_path)
+            return JSONResponse(status_code=200, content={
+                "message": "文档内容未变化，无需重新处理",
+                "job_id": None,
+                "filename": file.filename,
+                "status": "unchanged",
+                "collection_name": collection_name,
+                "chunks_count": existing.get("chunks_count", 0),
+                "content_hash": content_hash
+            })
+        
+        # 提交后台任务：临时文件在任务开始时才替换为正式文件（同名文件的任务串行执行），然后切片和向量化
+        job = ingestion_jobs.submit(
             file_path=file_path,
-            collection_name=collection_name
+            collection_name=collection_name,
+            filename=file.filename,
+            content_hash=content_hash,
+            tmp_path=tmp_path
         )
         
-        return JSONResponse(content={
-            "message": "文档上传并处理成功",
+        return JSONResponse(status_code=202, content={
+            "message": "文档已上传，正在后台处理",
+            "job_id": job.id,
             "filename": file.filename,
-            "chunks_count": result["chunks_count"],
-            "collection_name": collection_name
+            "status": job.status,
+            "collection_name": collection_name,
+            "file_size": file_size,
+            "content_hash": content_hash
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"处理文档时出错：{str(e)}")
 
 
+@app.post("/api/upload/batch")
+async def upload_batch(
+    file: Optional[UploadFile] = File(None),
+    directory: Optional[str] = None,
+    collection_name: str = "default"
+):
+    """
+    批量上传接口
+    上传一个 zip 压缩包，或指定服务器上 BULK_INGEST_ROOT 目录下的子目录，
+    其中全部 .pdf / .docx / .txt 文档作为一个后台任务批量入库，通过 /api/jobs/{job_id} 查询进度；
+    已入库且内容未变化的文件自动跳过，任务中断后重新提交即可续传
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        sources = None
+        extract_dir = None
+        if file is not None:
+            if os.path.splitext(file.filename)[1].lower() != ".zip":
+                raise HTTPException(status_code=400, detail="批量上传仅支持 zip 压缩包")
+            upload_dir = "uploads"
+            os.makedirs(upload_dir, exist_ok=True)
+            archive_path = os.path.join(upload_dir, os.path.basename(file.filename))
+            try:
+                archive_spooler.check_size(getattr(file, "size", None))
+                tmp_path, _, _ = await archive_spooler.spool(file, archive_path)
+            except UploadTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            # 每个请求解压到独立的临时目录，同名压缩包重复上传不会覆盖仍在处理的文件；
+            # 片段来源仍记为 uploads/<压缩包名>/<条目路径>，重新上传时按来源对比内容
+            extract_dir = tempfile.mkdtemp(prefix=".batch-", dir=upload_dir)
+            try:
+                files = await loop.run_in_executor(None, extract_archive, tmp_path, extract_dir)
+            except ValueError as e:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                raise HTTPException(status_code=400, detail=str(e))
+            finally:
+                await loop.run_in_executor(None, archive_spooler.discard, tmp_path)
+            source_root = os.path.splitext(archive_path)[0]
+            sources = [os.path.join(source_root, os.path.relpath(path, extract_dir)) for path in files]
+            name = file.filename
+        elif directory:
+            root_dir = os.getenv("BULK_INGEST_ROOT", "uploads")
+            root = os.path.realpath(root_dir)
+            source_path = os.path.normpath(os.path.join(root_dir, directory))
+            real_path = os.path.realpath(source_path)
+            if real_path != root and not real_path.startswith(root + os.sep):
+                raise HTTPException(status_code=400, detail="目录必须位于 BULK_INGEST_ROOT 之下")
+            if not os.path.isdir(source_path):
+                raise HTTPException(status_code=404, detail=f"目录不存在：{directory}")
+            files = await loop.run_in_executor(None, collect_files, source_path)
+            name = directory
+        else:
+            raise HTTPException(status_code=400, detail="请上传 zip 文件或指定 directory")
+        
+        if not files:
+            if extract_dir is not None:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+            raise HTTPException(status_code=400, detail="没有找到可入库的文档")
+        
+        job = ingestion_jobs.submit_bulk(
+            files,
+            collection_name=collection_name,
+            name=name,
+            sources=sources,
+            cleanup_dir=extract_dir
+        )
+        return JSONResponse(status_code=202, content={
+            "message": f"已提交 {len(files)} 个文档，正在后台批量处理",
+            "job_id": job.id,
+            "files_total": len(files),
+            "status": job.status,
+            "collection_name": collection_name
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量上传出错：{str(e)}")
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    查询文档入库任务进度
+    返回处理阶段、已处理片段数和吞吐量（片段/秒）
+    """
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在：{job_id}")
+    return JSONResponse(content=job.to_dict())
+
+
 @app.post("/api/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     """
@@ -134,7 +302,8 @@ async def ask_question(request: QuestionRequest):
         # 执行问答
         result = await qa_service.answer_question(
             question=request.question,
-            collection_name=request.collection_name
+            collection_name=request.collection_name,
+            collection_names=request.collection_names
         )
         
         return QuestionResponse(
@@ -142,10 +311,80 @@ async def ask_question(request: QuestionRequest):
             sources=result["sources"]
         )
     
+    except HTTPException:
+        raise
+    except LLMSaturatedError as e:
+        # LLM 并发和排队都已满：返回 429，由客户端稍后重试
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"问答处理出错：{str(e)}")
 
 
+@app.post("/api/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    流式问答接口（Server-Sent Events）
+    先推送检索到的来源（sources 事件），再逐个推送 LLM 生成的 token（token 事件），
+    结束时推送 done 事件
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="问题不能为空")
+    if qa_service.llm_client is not None:
+        try:
+            qa_service.llm_client.check_capacity()
+        except LLMSaturatedError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    
+    async def event_stream():
+        async for event in qa_service.stream_answer(
+            question=request.question,
+            collection_name=request.collection_name,
+            collection_names=request.collection_names
+        ):
+            data = json.dumps(event["data"], ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {data}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭反向代理缓冲，保证 token 实时送达
+        }
+    )
+
+
+@app.post("/api/ask/batch")
+async def ask_batch(
+    file: UploadFile = File(...),
+    collection_name: str = "default"
+):
+    """
+    批量问答接口
+    上传 JSONL 文件（每行 {"question": ..., "id": 可选, "collection_name": 可选}），
+    结果按输入顺序以 JSONL 流式返回（application/x-ndjson）
+    """
+    content = await file.read()
+    try:
+        items = parse_jsonl(content.decode("utf-8").splitlines())
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="文件必须是 UTF-8 编码的 JSONL")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def result_lines():
+        async for result in batch_runner.run(items, collection_name=collection_name):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """获取问答缓存、查询向量缓存、重排序分数缓存和 LLM 并发的统计"""
+    return JSONResponse(content=qa_service.cache_stats())
+
+
 @app.get("/api/collections")
 async def list_collections():
     """获取所有知识库集合列表"""
@@ -183,19 +422,24 @@ async def delete_collection(collection_name: str):
     """删除指定的知识库集合"""
     try:
         await document_service.delete_collection(collection_name)
+        qa_service.forget_collection(collection_name)
         return JSONResponse(content={"message": f"集合 {collection_name} 已删除"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除集合出错：{str(e)}")
 
 
 @app.get("/api/documents/{collection_name}")
-async def get_documents_list(collection_name: str = "default"):
+async def get_documents_list(collection_name: str = "default", limit: Optional[int] = None, offset: int = 0):
     """
     获取指定集合中的所有文档列表（按文件名分组）
-    用于文档管理功能
+    用于文档管理功能，可通过 limit/offset 分页
     """
     try:
-        documents_data = document_service.get_documents_list(collection_name=collection_name)
+        documents_data = document_service.get_documents_list(
+            collection_name=collection_name,
+            limit=limit,
+            offset=offset
+        )
         return JSONResponse(content=documents_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取文档列表失败：{str(e)}")
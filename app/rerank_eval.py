@@ -0,0 +1,97 @@
+"""
+自适应重排序评估
+在带标注的问题集上对比「始终重排序」与「自适应重排序」的召回率、跳过比例和耗时
+
+标注文件为 JSONL，每行一个问题：
+    {"question": "...", "relevant": ["片段ID或来源文件名", ...]}
+
+用法：
+    python -m app.rerank_eval --collection default --labels eval.jsonl
+"""
+import os
+import json
+import time
+import argparse
+from typing import Dict, List
+
+from app.services.hybrid_retriever import doc_key
+from app.services.qa_service import QAService
+from app.services.reranker_engine import AdaptiveRerankPolicy
+
+
+def _is_relevant(doc, relevant: set) -> bool:
+    """片段 ID、来源路径或来源文件名任一命中标注即视为相关"""
+    source = doc.metadata.get("source", "")
+    return doc_key(doc) in relevant or source in relevant or os.path.basename(source) in relevant
+
+
+def evaluate(qa_service: QAService, collection_name: str, labels: List[Dict], adaptive: bool) -> Dict:
+    """
+    在标注集上运行一遍检索管道
+
+    Args:
+        qa_service: QAService 实例
+        collection_name: 集合名称
+        labels: 标注列表
+        adaptive: 是否启用自适应重排序
+
+    Returns:
+        召回率、命中率、平均耗时和重排序模式计数
+    """
+    qa_service.rerank_policy = AdaptiveRerankPolicy(enabled=adaptive)
+    pipeline = qa_service.get_pipeline(collection_name)
+
+    recall_sum = hits = 0
+    elapsed = 0.0
+    for item in labels:
+        relevant = set(item["relevant"])
+        start = time.perf_counter()
+        docs = pipeline.run(item["question"]).docs
+        elapsed += time.perf_counter() - start
+
+        matched = sum(1 for doc in docs if _is_relevant(doc, relevant))
+        recall_sum += min(matched, len(relevant)) / len(relevant) if relevant else 0.0
+        hits += 1 if matched else 0
+
+    n = len(labels)
+    return {
+        "recall": round(recall_sum / n, 4),
+        "hit_rate": round(hits / n, 4),
+        "ms_per_question": round(elapsed / n * 1000, 1),
+        **qa_service.rerank_policy.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应重排序召回率评估")
+    parser.add_argument("--collection", default="default", help="集合名称")
+    parser.add_argument("--labels", required=True, help="标注文件（JSONL）")
+    args = parser.parse_args()
+
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = [json.loads(line) for line in f if line.strip()]
+    if not labels:
+        print("标注文件为空")
+        return
+
+    qa_service = QAService()
+    # 关闭分数缓存，避免第二轮直接命中第一轮的分数而低估耗时
+    qa_service.rerank_engine.cache_size = 0
+    # 预热：加载模型和索引，不计入耗时
+    qa_service.get_pipeline(args.collection).run(labels[0]["question"])
+
+    baseline = evaluate(qa_service, args.collection, labels, adaptive=False)
+    adaptive = evaluate(qa_service, args.collection, labels, adaptive=True)
+
+    top_n = qa_service.get_pipeline(args.collection).top_n
+    print(f"{len(labels)} 个问题，Top-{top_n}：")
+    print(f"  始终重排序：recall={baseline['recall']:.4f}  hit_rate={baseline['hit_rate']:.4f}  {baseline['ms_per_question']} ms/问题")
+    print(
+        f"  自适应重排序：recall={adaptive['recall']:.4f}  hit_rate={adaptive['hit_rate']:.4f}  {adaptive['ms_per_question']} ms/问题"
+        f"（跳过 {adaptive['skipped']}，缩小 {adaptive['shrunk']}，完整 {adaptive['full']}）"
+    )
+    print(f"  召回率变化：{adaptive['recall'] - baseline['recall']:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
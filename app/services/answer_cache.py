@@ -0,0 +1,185 @@
+"""
+问答结果缓存
+两级缓存：
+- 精确匹配：按归一化后的问题文本命中
+- 语义匹配：问题向量与已缓存问题的余弦相似度超过阈值时命中
+缓存键包含集合版本号，集合有上传或删除时版本号递增，旧条目自动失效
+"""
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[?？!！。.，,~～\s]+$")
+
+
+def normalize_question(question: str) -> str:
+    """问题归一化：全半角统一、小写、合并空白、去掉结尾标点"""
+    text = unicodedata.normalize("NFKC", question).lower().strip()
+    text = _WHITESPACE.sub(" ", text)
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+class AnswerCache:
+    """
+    带 TTL 和 LRU 淘汰的问答缓存（线程安全）
+
+    - ANSWER_CACHE_SIZE：最大缓存条目数（默认 1000）
+    - ANSWER_CACHE_TTL：条目有效期，单位秒（默认 3600）
+    - ANSWER_CACHE_SIMILARITY：语义匹配的余弦相似度阈值（默认 0.95，设为 0 关闭语义匹配）
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: Optional[float] = None
+    ):
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+        )
+
+        # (集合, 版本, 归一化问题) -> (过期时间, 问题向量或None, 结果)
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[float, Optional[np.ndarray], Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def get(
+        self,
+        collection_name: Hashable,
+        version: Hashable,
+        question: str,
+        embed_func: Optional[Callable[[str], List[float]]] = None
+    ) -> Tuple[Optional[Dict], Optional[List[float]]]:
+        """
+        查询缓存：先精确匹配，未命中时再计算问题向量进行语义匹配
+
+        Args:
+            collection_name: 集合键（见 QAService.cache_scope）
+            version: 集合版本号
+            question: 用户问题
+            embed_func: 计算问题向量的函数（不传则只做精确匹配）
+
+        Returns:
+            (缓存结果或None, 问题向量或None)，问题向量可在写入缓存时复用
+        """
+        result = self._get_exact(collection_name, version, question)
+        if result is not None:
+            self.exact_hits += 1
+            return result, None
+
+        embedding = None
+        if self.semantic_enabled and embed_func is not None:
+            embedding = embed_func(question)
+            result = self._get_semantic(collection_name, version, embedding)
+            if result is not None:
+                self.semantic_hits += 1
+                return result, embedding
+
+        self.misses += 1
+        return None, embedding
+
+    def _get_exact(self, collection_name: Hashable, version: Hashable, question: str) -> Optional[Dict]:
+        """精确匹配查询，未命中返回 None"""
+        key = (collection_name, version, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry[2])
+
+    def _get_semantic(self, collection_name: Hashable, version: Hashable, embedding: List[float]) -> Optional[Dict]:
+        """
+        语义匹配查询：在同一集合同一版本的条目中查找最相似的问题
+
+        Args:
+            collection_name: 集合名称
+            version: 集合版本号
+            embedding: 当前问题的向量
+
+        Returns:
+            命中时返回缓存结果，否则返回 None
+        """
+        now = time.time()
+        with self._lock:
+            keys = []
+            vectors = []
+            for key, (expires_at, vector, _) in self._entries.items():
+                if key[0] == collection_name and key[1] == version and vector is not None and expires_at >= now:
+                    keys.append(key)
+                    vectors.append(vector)
+
+            if not vectors:
+                return None
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query) or 1.0
+            matrix = np.vstack(vectors)
+            similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * query_norm + 1e-12)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            key = keys[best]
+            self._entries.move_to_end(key)
+            return dict(self._entries[key][2])
+
+    def put(
+        self,
+        collection_name: Hashable,
+        version: Hashable,
+        question: str,
+        result: Dict,
+        embedding: Optional[List[float]] = None
+    ):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        key = (collection_name, version, normalize_question(question))
+        vector = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, vector, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """命中统计"""
+        with self._lock:
+            size = len(self._entries)
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / total, 4) if total else 0.0,
+        }
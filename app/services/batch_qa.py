@@ -0,0 +1,289 @@
+"""
+批量问答
+面向离线评估和批量问答，一次处理成百上千个问题：
+- 同一批问题的查询向量一次性计算（embed_documents）
+- 向量检索使用 Chroma 的批量 query_embeddings，一次查询整批问题
+- 整批问题的 (问题, 片段) 对合并为一次 CrossEncoder 推理
+- LLM 调用限制并发，结果按输入顺序逐批以 JSONL 返回
+"""
+import os
+import json
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.llm_client import LLMSaturatedError
+from app.services.retrieval_pipeline import RetrievalPipeline, RetrievalResult
+
+
+NOT_FOUND_ANSWER = "抱歉，在知识库中没有找到相关信息。"
+
+
+def parse_jsonl(lines: Iterable[str]) -> List[Dict]:
+    """
+    解析问题文件：每行一个 JSON 对象 {"question": ..., "id": 可选, "collection_name": 可选}，
+    也可以直接是 JSON 字符串；空行忽略
+
+    Raises:
+        ValueError: 某行不是合法的 JSON 或缺少问题
+    """
+    items = []
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"第 {line_no} 行不是合法的 JSON")
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict) or not isinstance(item.get("question"), str):
+            raise ValueError(f"第 {line_no} 行缺少 question 字段")
+        items.append(item)
+    return items
+
+
+class BatchQARunner:
+    """
+    批量问答执行器
+
+    - BATCH_QA_CHUNK_SIZE：每批检索的问题数（默认 64）
+    - BATCH_QA_LLM_CONCURRENCY：批量问答同时进行的 LLM 调用数（默认 4，占用在线问答的 LLM 并发名额）
+    """
+
+    def __init__(self, qa_service, chunk_size: Optional[int] = None, llm_concurrency: Optional[int] = None):
+        """
+        Args:
+            qa_service: QAService 实例（复用其检索管道配置、缓存、Reranker 和 LLM 客户端）
+            chunk_size: 每批问题数
+            llm_concurrency: LLM 并发数
+        """
+        self.qa_service = qa_service
+        self.document_service = qa_service.document_service
+        self.chunk_size = chunk_size or int(os.getenv("BATCH_QA_CHUNK_SIZE", "64"))
+        self.llm_concurrency = llm_concurrency or int(os.getenv("BATCH_QA_LLM_CONCURRENCY", "4"))
+
+    def _vector_search(self, collection_name: str, vectors: List[List[float]], k: int) -> List[List[Tuple[Document, float]]]:
+        """批量向量检索：一次 Chroma 查询返回整批问题的结果（分数为负距离，越大越相关）"""
+        try:
+            collection = self.document_service.client.get_collection(collection_name)
+            result = collection.query(
+                query_embeddings=vectors,
+                n_results=k,
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception as e:
+            print(f"[WARN] 集合 {collection_name} 批量向量检索失败: {str(e)}")
+            return [[] for _ in vectors]
+
+        batches = []
+        for ids, texts, metadatas, distances in zip(
+            result["ids"], result["documents"], result["metadatas"], result["distances"]
+        ):
+            batches.append([
+                (Document(page_content=text, metadata=dict(metadata or {}), id=doc_id), -distance)
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ])
+        return batches
+
+    def retrieve_batch(self, collection_name: str, questions: List[str]) -> List[RetrievalResult]:
+        """
+        批量检索一个集合：批量向量化 -> 批量向量检索 + BM25 -> 融合 -> 合并重排序 -> 清洗拼接
+
+        Args:
+            collection_name: 集合名称
+            questions: 问题列表
+
+        Returns:
+            每个问题的 RetrievalResult（与输入顺序一致）
+        """
+        pipeline = self.qa_service.get_pipeline(collection_name)
+        vectors = self.qa_service.query_embeddings.embed_queries(questions)
+        vector_results = self._vector_search(collection_name, vectors, pipeline.vector_k)
+        bm25_retriever = self.document_service.get_bm25_retriever(collection_name, k=pipeline.bm25_k)
+        fuser = HybridRetriever(
+            [],
+            k=pipeline.rrf_k,
+            weights=pipeline.weights,
+            method=pipeline.fusion,
+            top_k=pipeline.candidate_k
+        )
+
+        candidates_list = []
+        rerank_indexes = []
+        rerank_docs = []
+        for i, question in enumerate(questions):
+            if bm25_retriever:
+                retriever_results = [vector_results[i], bm25_retriever.invoke_with_scores(question)]
+                candidates = fuser.fuse(retriever_results)
+            else:
+                retriever_results = None
+                candidates = [doc for doc, _ in vector_results[i]]
+            candidates_list.append(candidates)
+
+            # 与单个问题的检索管道使用同一自适应重排序策略
+            mode, count = self.qa_service.rerank_policy.decide(retriever_results, len(candidates), pipeline.top_n)
+            if mode != "skipped" and candidates:
+                rerank_indexes.append(i)
+                rerank_docs.append(candidates[:count])
+
+        docs_list = [candidates[:pipeline.top_n] for candidates in candidates_list]
+        reranked = self.qa_service.rerank_engine.rerank_batch(
+            [questions[i] for i in rerank_indexes], rerank_docs, top_n=pipeline.top_n
+        )
+        for i, docs in zip(rerank_indexes, reranked):
+            docs_list[i] = docs
+
+        results = []
+        for candidates, docs in zip(candidates_list, docs_list):
+            docs = RetrievalPipeline._clean_docs(docs)
+            results.append(RetrievalResult(candidates, docs, RetrievalPipeline.format_docs(docs)))
+        return results
+
+    async def _generate(self, question: str, retrieval: RetrievalResult, semaphore: asyncio.Semaphore) -> Tuple[str, bool]:
+        """生成答案，返回 (答案, 是否可缓存)"""
+        qa_service = self.qa_service
+        if not retrieval.docs:
+            return NOT_FOUND_ANSWER, False
+        if not qa_service.llm:
+            return qa_service.RETRIEVAL_ONLY_NOTICE + qa_service._format_retrieval_answer(retrieval.docs), True
+
+        async with semaphore:
+            while True:
+                try:
+                    result = await qa_service.llm_client.ainvoke({
+                        "context": retrieval.context,
+                        "question": question
+                    })
+                    return (result.content if hasattr(result, 'content') else str(result)), True
+                except LLMSaturatedError:
+                    # 在线请求占满了 LLM 名额：批量任务让路，稍后再试
+                    await asyncio.sleep(1.0)
+                except Exception as e:
+                    print(f"[WARN] 批量问答 LLM 生成失败，使用检索模式：{str(e)}")
+                    return qa_service._format_retrieval_answer(retrieval.docs), False
+
+    async def _retrieve_chunk(self, chunk: List[Dict]) -> Dict[int, RetrievalResult]:
+        """按集合分组批量检索一批问题（在线程池中执行）"""
+        loop = asyncio.get_running_loop()
+        groups: Dict[str, List[Dict]] = {}
+        for item in chunk:
+            groups.setdefault(item["collection_name"], []).append(item)
+
+        retrievals: Dict[int, RetrievalResult] = {}
+        for collection_name, items in groups.items():
+            results = await loop.run_in_executor(
+                None, self.retrieve_batch, collection_name, [item["question"] for item in items]
+            )
+            for item, retrieval in zip(items, results):
+                retrievals[item["index"]] = retrieval
+        return retrievals
+
+    async def _answer_chunk(
+        self,
+        chunk: List[Dict],
+        retrievals: Dict[int, RetrievalResult],
+        semaphore: asyncio.Semaphore
+    ) -> List[Dict]:
+        """为一批问题并发生成答案并写入问答缓存"""
+        qa_service = self.qa_service
+        loop = asyncio.get_running_loop()
+
+        async def answer(item: Dict) -> Dict:
+            retrieval = retrievals[item["index"]]
+            answer_text, cacheable = await self._generate(item["question"], retrieval, semaphore)
+            response = {"answer": answer_text, "sources": retrieval.sources if retrieval.docs else []}
+            if cacheable:
+                # 语义缓存需要问题向量：嵌入计算放到线程池，不阻塞事件循环
+                embedding = (
+                    await loop.run_in_executor(None, qa_service.query_embeddings.embed_query, item["question"])
+                    if qa_service.answer_cache.semantic_enabled else None
+                )
+                qa_service.answer_cache.put(
+                    item["scope"], item["version"], item["question"], response, embedding=embedding
+                )
+            return {**self._output_base(item), **response, "cached": False}
+
+        return await asyncio.gather(*(answer(item) for item in chunk))
+
+    @staticmethod
+    def _output_base(item: Dict) -> Dict:
+        base = {"index": item["index"], "question": item["question"], "collection_name": item["collection_name"]}
+        if item.get("id") is not None:
+            base["id"] = item["id"]
+        return base
+
+    def _check_cache(self, chunk: List[Dict]) -> Tuple[Dict[int, Dict], List[Dict]]:
+        """
+        精确查找问答缓存并记录各问题的集合版本
+
+        Returns:
+            (已有结果：空问题的错误和缓存命中, 需要检索和生成的问题)
+        """
+        outputs: Dict[int, Dict] = {}
+        to_process = []
+        for item in chunk:
+            if not item["question"]:
+                outputs[item["index"]] = {**self._output_base(item), "error": "问题不能为空"}
+                continue
+            item["scope"], item["version"] = self.qa_service.cache_scope([item["collection_name"]])
+            cached, _ = self.qa_service.answer_cache.get(item["scope"], item["version"], item["question"])
+            if cached is not None:
+                outputs[item["index"]] = {**self._output_base(item), **cached, "cached": True}
+            else:
+                to_process.append(item)
+        return outputs, to_process
+
+    async def run(self, items: List[Dict], collection_name: str = "default") -> AsyncIterator[Dict]:
+        """
+        执行批量问答，按输入顺序逐条返回结果
+
+        Args:
+            items: parse_jsonl 解析出的问题列表
+            collection_name: 未单独指定集合的问题使用的集合
+
+        Yields:
+            {"index", "id"（如有）, "question", "collection_name", "answer", "sources", "cached"}，
+            问题为空时为 {"index", "question", "error"}
+        """
+        semaphore = asyncio.Semaphore(self.llm_concurrency)
+
+        prepared = []
+        for index, item in enumerate(items):
+            prepared.append({
+                "index": index,
+                "id": item.get("id"),
+                "question": (item.get("question") or "").strip(),
+                "collection_name": item.get("collection_name") or collection_name,
+            })
+
+        chunks = [prepared[i:i + self.chunk_size] for i in range(0, len(prepared), self.chunk_size)]
+        pending = None
+        checked = self._check_cache(chunks[0]) if chunks else None
+        for n, chunk in enumerate(chunks):
+            outputs, to_process = checked
+            # 预取时上一批的答案尚未写入缓存：重复出现的问题此时可能已经命中，再精确查一次
+            if pending is not None:
+                hits, to_process = self._check_cache(to_process)
+                outputs.update(hits)
+
+            # 当前批次生成答案的同时预取下一批的检索结果；
+            # 预取前先查缓存，命中的问题不做检索
+            retrievals = await pending if pending is not None else await self._retrieve_chunk(to_process)
+            pending = None
+            if n + 1 < len(chunks):
+                checked = self._check_cache(chunks[n + 1])
+                if checked[1]:
+                    pending = asyncio.ensure_future(self._retrieve_chunk(checked[1]))
+
+            missing = [item for item in to_process if item["index"] not in retrievals]
+            if missing:
+                retrievals.update(await self._retrieve_chunk(missing))
+            for output in await self._answer_chunk(to_process, retrievals, semaphore):
+                outputs[output["index"]] = output
+
+            for item in chunk:
+                yield outputs[item["index"]]
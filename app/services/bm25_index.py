@@ -0,0 +1,327 @@
+"""
+BM25 关键词索引服务
+为每个集合维护一份持久化的倒排索引（存放在 chroma_db/bm25 目录下的 SQLite 文件），
+文档入库时增量更新并只写入变化的片段，查询时只加载一次并常驻内存；
+片段正文不进入索引，命中后从 Chroma 读取
+"""
+import os
+import json
+import math
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+
+def jieba_tokenizer(text: str) -> List[str]:
+    """使用 jieba 进行中文分词（与原 BM25Retriever 的预处理保持一致）"""
+    import jieba
+    return list(jieba.cut(text))
+
+
+class BM25Index:
+    """
+    单个集合的 BM25 倒排索引
+
+    评分公式与 rank_bm25.BM25Okapi 一致：
+    - idf = log(N - df + 0.5) - log(df + 0.5)，负值用 epsilon * 平均idf 代替
+    - score = Σ idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+
+    索引以片段 ID 为键，新增/删除片段时只处理变化的部分，无需重新分词整个集合。
+    磁盘上只保存每个片段的词频和长度（SQLite，每个片段一行），不保存片段正文：
+    save() 只写入上次保存以来变化的片段，正文在检索命中后按 ID 从 Chroma 读取
+    """
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        """
+        初始化索引
+
+        Args:
+            index_path: 索引文件路径（SQLite）
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            epsilon: 负 idf 的下限系数
+        """
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        # 片段 ID -> {"tf", "length"}
+        self._docs: Dict[str, Dict] = {}
+        # 词项 -> {片段 ID: 词频}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # 平均 idf 在索引变化后失效，查询时按需重新计算
+        self._average_idf: Optional[float] = None
+        # 上次保存以来新增/覆盖和删除的片段 ID
+        self._dirty: Set[str] = set()
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def exists(self) -> bool:
+        """索引文件是否已存在于磁盘"""
+        return os.path.exists(self.index_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """懒打开 SQLite 连接（调用方需持有锁）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL, tf TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self):
+        """从磁盘加载索引（只读取已分词的词频，不需要重新分词）"""
+        with self._lock:
+            self._docs = {}
+            self._postings = {}
+            self._total_length = 0
+            self._dirty = set()
+            for doc_id, tf_json in self._connect().execute("SELECT id, tf FROM docs"):
+                self._insert(doc_id, json.loads(tf_json))
+            self._average_idf = None
+
+    def save(self):
+        """
+        将上次保存以来变化的片段写入磁盘（单个事务，中途失败时整体回滚）
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            conn = self._connect()
+            upserts = []
+            removed = []
+            for doc_id in self._dirty:
+                doc = self._docs.get(doc_id)
+                if doc is None:
+                    removed.append((doc_id,))
+                else:
+                    upserts.append((doc_id, doc["length"], json.dumps(doc["tf"], ensure_ascii=False)))
+            with conn:
+                if removed:
+                    conn.executemany("DELETE FROM docs WHERE id = ?", removed)
+                if upserts:
+                    conn.executemany("INSERT OR REPLACE INTO docs (id, length, tf) VALUES (?, ?, ?)", upserts)
+            self._dirty = set()
+
+    def close(self):
+        """关闭 SQLite 连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _insert(self, doc_id: str, tf: Dict[str, int]):
+        """将已分词的片段写入内存索引（调用方需持有锁）"""
+        length = sum(tf.values())
+        self._docs[doc_id] = {"tf": tf, "length": length}
+        self._total_length += length
+        for term, freq in tf.items():
+            self._postings.setdefault(term, {})[doc_id] = freq
+
+    def _remove(self, doc_id: str):
+        """从内存索引中移除片段（调用方需持有锁）"""
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in doc["tf"]:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+
+    def add_documents(self, ids: List[str], texts: List[str]):
+        """
+        增量添加片段（已存在的 ID 会被覆盖），调用 save() 后写入磁盘
+
+        Args:
+            ids: 片段 ID 列表
+            texts: 片段文本列表（只用于分词，不保存）
+        """
+        # 分词在锁外完成，避免阻塞并发查询
+        tokenized = []
+        for text in texts:
+            tf: Dict[str, int] = {}
+            for token in jieba_tokenizer(text):
+                tf[token] = tf.get(token, 0) + 1
+            tokenized.append(tf)
+
+        with self._lock:
+            for doc_id, tf in zip(ids, tokenized):
+                self._remove(doc_id)
+                self._insert(doc_id, tf)
+                self._dirty.add(doc_id)
+            self._average_idf = None
+
+    def remove_documents(self, ids: List[str]):
+        """
+        删除片段，调用 save() 后写入磁盘
+
+        Args:
+            ids: 要删除的片段 ID 列表
+        """
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+                self._dirty.add(doc_id)
+            self._average_idf = None
+
+    def _idf(self, df: int) -> float:
+        n = len(self._docs)
+        return math.log(n - df + 0.5) - math.log(df + 0.5)
+
+    def _get_average_idf(self) -> float:
+        if self._average_idf is None:
+            if self._postings:
+                total = sum(self._idf(len(posting)) for posting in self._postings.values())
+                self._average_idf = total / len(self._postings)
+            else:
+                self._average_idf = 0.0
+        return self._average_idf
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        检索与查询最相关的片段
+
+        Args:
+            query: 查询字符串
+            k: 返回结果数量
+
+        Returns:
+            (片段 ID, BM25分数) 列表，按分数降序排列
+        """
+        query_terms = jieba_tokenizer(query)
+
+        with self._lock:
+            if not self._docs:
+                return []
+
+            avgdl = self._total_length / len(self._docs)
+            average_idf = self._get_average_idf()
+            scores: Dict[str, float] = {}
+
+            for term in query_terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = self._idf(len(posting))
+                if idf < 0:
+                    idf = self.epsilon * average_idf
+                for doc_id, freq in posting.items():
+                    doc_len = self._docs[doc_id]["length"]
+                    denom = freq + self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / denom
+
+            return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+class BM25IndexRetriever:
+    """基于持久化 BM25 索引的检索器（提供与 LangChain 检索器一致的 invoke 接口）"""
+
+    def __init__(self, index: BM25Index, fetch_documents: Callable[[List[str]], Dict[str, Document]], k: int = 5):
+        """
+        Args:
+            index: BM25 索引
+            fetch_documents: 按片段 ID 批量读取片段正文和元数据，返回 {片段 ID: Document}
+            k: 检索结果数量
+        """
+        self.index = index
+        self.fetch_documents = fetch_documents
+        self.k = k
+
+    def invoke(self, query: str) -> List[Document]:
+        return [doc for doc, _ in self.invoke_with_scores(query)]
+
+    def invoke_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        hits = self.index.search(query, k=self.k)
+        if not hits:
+            return []
+        docs = self.fetch_documents([doc_id for doc_id, _ in hits])
+        # 索引与向量库之间短暂不一致（片段刚被删除）时跳过取不到正文的片段
+        return [(docs[doc_id], score) for doc_id, score in hits if doc_id in docs]
+
+
+class BM25IndexManager:
+    """管理所有集合的 BM25 索引，每个集合只加载一次并常驻内存"""
+
+    def __init__(self, persist_directory: str):
+        """
+        Args:
+            persist_directory: 向量数据库存储路径，索引存放在其下的 bm25 子目录
+        """
+        self.index_directory = os.path.join(persist_directory, "bm25")
+        self._indexes: Dict[str, BM25Index] = {}
+        # 全局锁只保护字典本身；加载和构建索引持有集合自己的锁，冷启动一个大集合时不阻塞其他集合的检索
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def _load_lock(self, collection_name: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(collection_name, threading.Lock())
+
+    def _index_path(self, collection_name: str) -> str:
+        return os.path.join(self.index_directory, f"{collection_name}.sqlite3")
+
+    def get(self, collection_name: str, loader=None) -> BM25Index:
+        """
+        获取集合的 BM25 索引
+
+        Args:
+            collection_name: 集合名称
+            loader: 磁盘上没有索引文件时调用，返回 (ids, texts) 用于一次性构建索引
+                    （兼容引入持久化索引之前已经入库的集合）
+
+        Returns:
+            BM25Index 实例
+        """
+        with self._lock:
+            index = self._indexes.get(collection_name)
+        if index is not None:
+            return index
+
+        with self._load_lock(collection_name):
+            with self._lock:
+                index = self._indexes.get(collection_name)
+            if index is not None:
+                return index
+
+            index = BM25Index(self._index_path(collection_name))
+            if index.exists():
+                index.load()
+                print(f"✓ 已加载 BM25 索引：{collection_name}（{len(index)} 个片段）")
+            elif loader is not None:
+                ids, texts = loader()
+                if ids:
+                    print(f"正在为集合 {collection_name} 构建 BM25 索引（{len(ids)} 个片段）...")
+                    index.add_documents(ids, texts)
+                    index.save()
+                    print("✓ BM25 索引构建完成")
+            with self._lock:
+                self._indexes[collection_name] = index
+            return index
+
+    def drop(self, collection_name: str):
+        """删除集合的 BM25 索引（内存与磁盘）"""
+        with self._load_lock(collection_name), self._lock:
+            index = self._indexes.pop(collection_name, None)
+            if index is not None:
+                index.close()
+            path = self._index_path(collection_name)
+            for file_path in (path, path + "-wal", path + "-shm"):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
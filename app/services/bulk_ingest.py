@@ -0,0 +1,447 @@
+"""
+批量入库
+一次导入整个目录或 zip 压缩包中的成千上万个文档：
+- 文件分发到进程池，每个工作进程只加载一次嵌入模型和分词器，在进程内完成 解析 -> 清洗 -> 切片
+- 主进程先查入库向量缓存，只把未命中的片段再交给进程池向量化，结果写回缓存（与单文件入库共用同一缓存）
+- 主进程把多个文件的片段攒成大批次统一写入 Chroma 和 BM25 索引
+- 每批写入完成后才把对应文件（含内容哈希）记入集合的文档清单；
+  中断后重新运行时，清单中内容未变化的文件直接跳过，已写入但未记入清单的片段按确定性 ID 复用，不再重复向量化
+"""
+import os
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.embedding_pipeline import _encode_in_worker, _init_worker
+from app.services.model_registry import model_registry
+from app.services.upload_storage import file_sha256
+
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+
+def _decode_zip_name(info: zipfile.ZipInfo) -> str:
+    """未标记 UTF-8 的压缩包条目按 GBK 解码文件名（Windows 下压缩的中文文件名）"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _declared_size(entries: List[Tuple[zipfile.ZipInfo, str]]) -> int:
+    """条目头部记录的解压后总字节数（可以伪造，仅用于解压前的快速检查）"""
+    return sum(info.file_size for info, _ in entries)
+
+
+def _remove_files(paths: List[str]):
+    """删除解压中止前已写入的文件"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def extract_archive(
+    zip_path: str,
+    dest_dir: str,
+    max_bytes: Optional[int] = None,
+    max_files: Optional[int] = None
+) -> List[str]:
+    """
+    解压 zip 中支持的文档
+
+    解压前按条目头部记录的大小检查总量和文件数，解压时再统计实际写入的字节数
+    （头部大小可以伪造），任一超出上限即中止并删除已解压的文件，避免压缩炸弹占满磁盘
+
+    Args:
+        zip_path: 压缩包路径
+        dest_dir: 解压目录
+        max_bytes: 解压后总字节数上限（默认读取 BULK_EXTRACT_MAX_BYTES，0 表示不限制）
+        max_files: 解压文件数上限（默认读取 BULK_EXTRACT_MAX_FILES，0 表示不限制）
+
+    Returns:
+        解压出的文件路径列表（按压缩包内路径排序）
+
+    Raises:
+        ValueError: 不是合法的 zip 文件、条目路径越出解压目录，或解压后大小 / 文件数超出上限
+    """
+    if max_bytes is None:
+        max_bytes = int(os.getenv("BULK_EXTRACT_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+    if max_files is None:
+        max_files = int(os.getenv("BULK_EXTRACT_MAX_FILES", "100000"))
+    if not zipfile.is_zipfile(zip_path):
+        raise ValueError("不是合法的 zip 文件")
+
+    root = os.path.realpath(dest_dir)
+    files = []
+    with zipfile.ZipFile(zip_path) as archive:
+        entries = []
+        for info in archive.infolist():
+            name = _decode_zip_name(info)
+            if info.is_dir() or Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            target = os.path.normpath(os.path.join(dest_dir, name))
+            if not os.path.realpath(target).startswith(root + os.sep):
+                raise ValueError(f"压缩包条目路径不合法：{name}")
+            entries.append((info, target))
+
+        if max_files and len(entries) > max_files:
+            raise ValueError(f"压缩包中的文档数超过上限（{max_files} 个）")
+        if max_bytes and _declared_size(entries) > max_bytes:
+            raise ValueError(f"压缩包解压后大小超过上限（{max_bytes} 字节）")
+
+        written = 0
+        try:
+            for info, target in entries:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                files.append(target)
+                with archive.open(info) as src, open(target, "wb") as dst:
+                    while True:
+                        block = src.read(1024 * 1024)
+                        if not block:
+                            break
+                        written += len(block)
+                        if max_bytes and written > max_bytes:
+                            raise ValueError(f"压缩包解压后大小超过上限（{max_bytes} 字节）")
+                        dst.write(block)
+        except zipfile.BadZipFile as e:
+            _remove_files(files)
+            raise ValueError(f"压缩包已损坏：{str(e)}")
+        except BaseException:
+            _remove_files(files)
+            raise
+    return sorted(files)
+
+
+def collect_files(path: str, extract_dir: Optional[str] = None) -> List[str]:
+    """
+    列出目录（递归）或 zip 压缩包中支持的文档
+
+    Args:
+        path: 目录、zip 文件或单个文档
+        extract_dir: zip 的解压目录（默认为压缩包同名目录）
+
+    Returns:
+        文件路径列表（排序后，保证多次运行顺序一致）
+    """
+    if os.path.isdir(path):
+        files = []
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                if Path(filename).suffix.lower() in SUPPORTED_EXTENSIONS:
+                    files.append(os.path.join(dirpath, filename))
+        return sorted(files)
+    if Path(path).suffix.lower() == ".zip":
+        return extract_archive(path, extract_dir or os.path.splitext(path)[0])
+    if Path(path).suffix.lower() in SUPPORTED_EXTENSIONS:
+        return [path]
+    raise ValueError(f"不支持的路径：{path}（需要目录、zip 文件或 {'/'.join(SUPPORTED_EXTENSIONS)} 文档）")
+
+
+# ---- 子进程内的文档服务（每个工作进程只创建一次） ----
+_worker_service = None
+
+
+def _init_bulk_worker(model_name: str, normalize: bool, batch_size: int, torch_threads: int):
+    """工作进程初始化：加载嵌入模型，创建用于解析和切片的文档服务"""
+    global _worker_service
+    # 工作进程本身就是并行单元，不再嵌套 PDF 解析进程池
+    os.environ["PDF_PARSE_WORKERS"] = "0"
+    _init_worker(model_name, normalize, batch_size, torch_threads)
+    from app.services.document_service import DocumentService
+    _worker_service = DocumentService()
+
+
+def _process_file(file_path: str, existing_ids: Set[str], source: Optional[str] = None) -> Dict:
+    """
+    在工作进程中处理一个文件：逐页解析 -> 清洗 -> 切片，挑出需要写入的新增片段
+    （向量化由主进程查过向量缓存后再提交 _encode_in_worker）
+
+    Args:
+        file_path: 文件路径
+        existing_ids: 集合中该文件已有的片段 ID（未变化的片段不再向量化）
+        source: 写入片段元数据的来源（默认为文件路径；解压到临时目录的文件使用稳定的逻辑路径）
+
+    Returns:
+        {"pages", "chunks_count", "seen_ids", "ids", "texts", "metadatas"}
+    """
+    service = _worker_service
+    pages = 0
+    seen_ids = []
+    occurrences = {}
+    ids, texts, metadatas = [], [], []
+    for page in service.iter_pages(file_path):
+        pages += 1
+        if source is not None:
+            page.metadata["source"] = source
+        for chunk in service.iter_chunks([page]):
+            chunk_id = service.make_chunk_id(chunk, occurrences)
+            seen_ids.append(chunk_id)
+            if chunk_id in existing_ids:
+                continue
+            ids.append(chunk_id)
+            texts.append(chunk.page_content)
+            metadatas.append(chunk.metadata)
+    return {
+        "pages": pages,
+        "chunks_count": len(seen_ids),
+        "seen_ids": seen_ids,
+        "ids": ids,
+        "texts": texts,
+        "metadatas": metadatas,
+    }
+
+
+class BulkIngestor:
+    """
+    批量入库执行器
+
+    - BULK_INGEST_WORKERS：解析和向量化的工作进程数，每个进程加载一份嵌入模型（默认 2）
+    - BULK_WRITE_BATCH：合并写入 Chroma 的片段数（默认 4096，超过 Chroma 单次上限时自动拆分）
+    """
+
+    def __init__(self, document_service, num_workers: Optional[int] = None, write_batch: Optional[int] = None):
+        """
+        Args:
+            document_service: DocumentService 实例（主进程负责 Chroma、BM25 和文档清单的写入）
+            num_workers: 工作进程数
+            write_batch: 合并写入批大小
+        """
+        self.document_service = document_service
+        self.num_workers = num_workers or int(os.getenv("BULK_INGEST_WORKERS", "2"))
+        self.write_batch = write_batch or int(os.getenv("BULK_WRITE_BATCH", "4096"))
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        model_name, normalize = model_registry.embedding_model_spec()
+        print(f"正在启动批量入库进程池（{self.num_workers} 个进程）...")
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_bulk_worker,
+            initargs=(
+                model_name,
+                normalize,
+                int(os.getenv("EMBED_BATCH_SIZE", "32")),
+                int(os.getenv("EMBED_TORCH_THREADS", "0"))
+            )
+        )
+
+    def run(
+        self,
+        files: List[str],
+        collection_name: str = "default",
+        progress_callback: Optional[Callable] = None,
+        sources: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        批量入库
+
+        Args:
+            files: 文件路径列表
+            collection_name: 目标集合
+            progress_callback: 进度回调 (stage, chunks_processed=None, chunks_total=None,
+                               files_processed=None, files_total=None)
+            sources: 与 files 一一对应的片段来源（默认即文件路径），
+                     用于内容对比、片段 ID 和文档清单
+
+        Returns:
+            统计信息：文件数（入库 / 跳过 / 失败）、片段数（新增 / 删除 / 未变化）、
+                     向量缓存命中数与实际向量化数、耗时与吞吐量
+        """
+        def report(stage, **kwargs):
+            if progress_callback:
+                progress_callback(stage, files_total=len(files), **kwargs)
+
+        service = self.document_service
+        start = time.time()
+        stats = {
+            "files_total": len(files),
+            "files_ingested": 0,
+            "files_skipped": 0,
+            "files_failed": 0,
+            "pages": 0,
+            "chunks_added": 0,
+            "chunks_removed": 0,
+            "chunks_unchanged": 0,
+            "embedding_cache_hits": 0,
+            "chunks_embedded": 0,
+        }
+        errors = []
+
+        # 1. 对比内容哈希，跳过已完整入库且未变化的文件（中断后重跑即从这里续上）
+        report("loading", files_processed=0)
+        tasks = []
+        for file_path, source in zip(files, sources or files):
+            try:
+                content_hash = file_sha256(file_path)
+            except OSError as e:
+                stats["files_failed"] += 1
+                errors.append({"file": source, "error": str(e)})
+                continue
+            if service.find_identical_document(collection_name, source, content_hash):
+                stats["files_skipped"] += 1
+            else:
+                tasks.append((file_path, source, content_hash))
+        print(f"共 {len(files)} 个文件，跳过未变化的 {stats['files_skipped']} 个，待处理 {len(tasks)} 个")
+
+        writer = _CoalescedWriter(service, collection_name, self.write_batch, stats)
+        cache = service.embedding_cache
+        files_done = stats["files_skipped"] + stats["files_failed"]
+        chunks_done = 0
+        if tasks:
+            pool = self._create_pool()
+            try:
+                # 限制在途任务数（解析和向量化合计），避免已完成但未写入的结果堆积在内存中
+                max_in_flight = self.num_workers * 2
+                queue = list(reversed(tasks))
+                futures = {}
+                while queue or futures:
+                    while queue and len(futures) < max_in_flight:
+                        file_path, source, content_hash = queue.pop()
+                        existing_ids = set(service.get_chunk_ids_by_source(collection_name, [source]))
+                        # 只跳过向量库和 BM25 索引中都已存在的片段（上次中途失败只写入了向量库的片段重新写入）
+                        indexed_ids = {chunk_id for chunk_id in existing_ids if chunk_id in writer.bm25_index}
+                        future = pool.submit(_process_file, file_path, indexed_ids, source)
+                        futures[future] = ("parse", source, content_hash, existing_ids, None)
+
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, source, content_hash, existing_ids, result = futures.pop(future)
+                        try:
+                            output = future.result()
+                        except Exception as e:
+                            print(f"[WARN] 文件处理失败：{source}：{str(e)}")
+                            files_done += 1
+                            stats["files_failed"] += 1
+                            errors.append({"file": source, "error": str(e)})
+                            continue
+
+                        if stage == "parse":
+                            result = output
+                            result["vectors"] = [None] * len(result["texts"])
+                            if cache is not None and result["texts"]:
+                                for i, vector in cache.get_many(result["texts"]).items():
+                                    result["vectors"][i] = vector
+                            missing = [i for i, vector in enumerate(result["vectors"]) if vector is None]
+                            stats["embedding_cache_hits"] += len(result["texts"]) - len(missing)
+                            if missing:
+                                result["missing"] = missing
+                                encode_future = pool.submit(_encode_in_worker, [result["texts"][i] for i in missing])
+                                futures[encode_future] = ("encode", source, content_hash, existing_ids, result)
+                                continue
+                        else:
+                            missing = result.pop("missing")
+                            for i, vector in zip(missing, output):
+                                result["vectors"][i] = vector
+                            stats["chunks_embedded"] += len(missing)
+                            if cache is not None:
+                                cache.put_many([result["texts"][i] for i in missing], output)
+
+                        files_done += 1
+                        chunks_done += result["chunks_count"]
+                        writer.add(source, content_hash, existing_ids, result)
+                        # chunks_processed 为已完成切片和向量化的片段数（含尚未合并写入的片段）
+                        report("embedding", chunks_processed=chunks_done, files_processed=files_done)
+                writer.flush()
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.time() - start
+        stats["errors"] = errors
+        stats["collection_name"] = collection_name
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["files_per_second"] = round(len(tasks) / elapsed, 2) if elapsed > 0 else 0.0
+        stats["chunks_per_second"] = round(stats["chunks_added"] / elapsed, 2) if elapsed > 0 else 0.0
+        report("done", chunks_processed=chunks_done, files_processed=files_done)
+        print(
+            f"✓ 批量入库完成：入库 {stats['files_ingested']}，跳过 {stats['files_skipped']}，"
+            f"失败 {stats['files_failed']}，新增片段 {stats['chunks_added']}，耗时 {elapsed:.1f}s"
+        )
+        return stats
+
+
+class _CoalescedWriter:
+    """把多个文件的新增片段合并成大批次写入，写入完成后再提交这些文件的清单记录"""
+
+    def __init__(self, document_service, collection_name: str, write_batch: int, stats: Dict):
+        self.service = document_service
+        self.collection_name = collection_name
+        self.write_batch = write_batch
+        self.stats = stats
+        self.collection = document_service.client.get_or_create_collection(collection_name)
+        self.bm25_index = document_service.get_bm25_index(collection_name)
+        self.manifest = document_service.get_manifest(collection_name)
+        # 单次 upsert 不超过 Chroma 允许的最大批量
+        self.max_batch = write_batch
+        max_batch_size = getattr(document_service.client, "get_max_batch_size", None)
+        if max_batch_size:
+            self.max_batch = min(write_batch, max_batch_size())
+
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.vectors: List[List[float]] = []
+        self.pending_files: List[Dict] = []
+
+    def add(self, source: str, content_hash: str, existing_ids: Set[str], result: Dict):
+        """加入一个文件的处理结果，缓冲区达到批大小时写入"""
+        self.ids.extend(result["ids"])
+        self.texts.extend(result["texts"])
+        self.metadatas.extend(result["metadatas"])
+        self.vectors.extend(result["vectors"])
+        seen = set(result["seen_ids"])
+        self.pending_files.append({
+            "source": source,
+            "content_hash": content_hash,
+            "chunks_count": result["chunks_count"],
+            "added": len(result["ids"]),
+            "removed_ids": [chunk_id for chunk_id in existing_ids if chunk_id not in seen],
+            "pages": result["pages"],
+        })
+        if len(self.ids) >= self.write_batch:
+            self.flush()
+
+    def flush(self):
+        """写入缓冲的片段，删除各文件的过期片段，并提交文档清单"""
+        if not self.pending_files:
+            return
+        for i in range(0, len(self.ids), self.max_batch):
+            self.collection.upsert(
+                ids=self.ids[i:i + self.max_batch],
+                embeddings=self.vectors[i:i + self.max_batch],
+                documents=self.texts[i:i + self.max_batch],
+                # Chroma 不接受空字典作为元数据
+                metadatas=[metadata or None for metadata in self.metadatas[i:i + self.max_batch]]
+            )
+        self.bm25_index.add_documents(self.ids, self.texts)
+
+        removed_ids = [chunk_id for entry in self.pending_files for chunk_id in entry["removed_ids"]]
+        if removed_ids:
+            self.service.delete_chunks(self.collection_name, removed_ids)
+            self.bm25_index.remove_documents(removed_ids)
+        self.bm25_index.save()
+
+        for entry in self.pending_files:
+            if entry["chunks_count"]:
+                self.manifest.set_document(entry["source"], entry["chunks_count"], content_hash=entry["content_hash"])
+            else:
+                self.manifest.remove_document(entry["source"])
+            self.stats["files_ingested"] += 1
+            self.stats["pages"] += entry["pages"]
+            self.stats["chunks_added"] += entry["added"]
+            self.stats["chunks_removed"] += len(entry["removed_ids"])
+            self.stats["chunks_unchanged"] += entry["chunks_count"] - entry["added"]
+        self.manifest.save()
+
+        self.service.invalidate_vectorstore(self.collection_name)
+        self.service.bump_collection_version(self.collection_name)
+        print(f"✓ 已合并写入 {len(self.ids)} 个片段（{len(self.pending_files)} 个文件）")
+
+        self.ids, self.texts, self.metadatas, self.vectors = [], [], [], []
+        self.pending_files = []
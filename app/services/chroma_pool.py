@@ -0,0 +1,77 @@
+"""
+Chroma 连接池
+每个存储目录只创建一个长期存活的 PersistentClient，
+并用 LRU 缓存复用各集合的向量库句柄，避免每次请求都重新打开 SQLite/HNSW 文件
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+
+
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_chroma_client(persist_directory: str):
+    """
+    获取存储目录对应的 Chroma 客户端（进程内每个目录只创建一次）
+
+    Args:
+        persist_directory: 向量数据库存储路径
+
+    Returns:
+        chromadb.PersistentClient 实例
+    """
+    key = os.path.abspath(persist_directory)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import chromadb
+                client = chromadb.PersistentClient(path=persist_directory)
+                _clients[key] = client
+    return client
+
+
+class VectorStoreCache:
+    """按集合名称缓存向量库句柄的 LRU 缓存"""
+
+    def __init__(self, factory: Callable[[str], object], max_size: int = 16):
+        """
+        Args:
+            factory: 根据集合名称创建向量库句柄的函数
+            max_size: 最多缓存的句柄数量
+        """
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self._handles: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, collection_name: str):
+        """获取集合的向量库句柄，未缓存时创建并淘汰最久未使用的句柄"""
+        with self._lock:
+            handle = self._handles.get(collection_name)
+            if handle is not None:
+                self._handles.move_to_end(collection_name)
+                return handle
+
+        handle = self.factory(collection_name)
+
+        with self._lock:
+            self._handles[collection_name] = handle
+            self._handles.move_to_end(collection_name)
+            while len(self._handles) > self.max_size:
+                self._handles.popitem(last=False)
+        return handle
+
+    def invalidate(self, collection_name: str):
+        """使集合的句柄失效（集合被删除或写入后调用）"""
+        with self._lock:
+            self._handles.pop(collection_name, None)
+
+    def clear(self):
+        """清空所有句柄"""
+        with self._lock:
+            self._handles.clear()
@@ -0,0 +1,79 @@
+"""
+数据目录写入锁
+服务进程把 BM25 索引、文档清单和集合版本号常驻内存，
+其他进程（如 python -m app.ingest）同时写入同一数据目录时，服务进程感知不到这些修改：
+检索使用过期的索引，文档清单保存时覆盖对方的记录，问答缓存也会继续返回旧答案。
+
+服务启动和命令行批量入库都先获取同一把文件锁，获取失败时拒绝运行；
+锁由操作系统在进程退出时自动释放，进程异常退出不会留下失效的锁
+"""
+import os
+from typing import Optional
+
+
+class DataDirLock:
+    """数据目录的进程间互斥锁（非阻塞文件锁）"""
+
+    LOCK_FILE = ".writer.lock"
+
+    def __init__(self, persist_directory: str):
+        """
+        Args:
+            persist_directory: 数据目录（chroma_db）
+        """
+        self.lock_path = os.path.join(persist_directory, self.LOCK_FILE)
+        self._file = None
+
+    def acquire(self, owner: str = "") -> bool:
+        """
+        尝试获取锁（不等待）
+
+        Args:
+            owner: 持有者说明，写入锁文件便于排查
+
+        Returns:
+            是否获取成功（已被其他进程持有时返回 False）
+        """
+        if self._file is not None:
+            return True
+        f = open(self.lock_path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.truncate(0)
+        f.write(f"{owner} pid={os.getpid()}\n")
+        f.flush()
+        self._file = f
+        return True
+
+    def holder(self) -> Optional[str]:
+        """读取锁文件中记录的持有者（可能已过期，仅用于提示）"""
+        try:
+            with open(self.lock_path, "r") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def release(self):
+        """释放锁"""
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
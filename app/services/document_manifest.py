@@ -0,0 +1,125 @@
+"""
+文档清单
+按集合记录每个来源文档的片段数等信息，在入库和删除时维护，
+文档列表接口直接读取清单，无需扫描整个集合
+"""
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class DocumentManifest:
+    """单个集合的文档清单：{来源: {"chunks_count": 片段数, "updated_at": 更新时间, ...}}"""
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self._documents: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+
+    def exists(self) -> bool:
+        """清单文件是否已存在于磁盘"""
+        return os.path.exists(self.manifest_path)
+
+    def load(self):
+        """从磁盘加载清单"""
+        with self._lock:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._documents = json.load(f).get("documents", {})
+
+    def save(self):
+        """写入磁盘（先写临时文件再替换）"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"documents": self._documents}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.manifest_path)
+
+    def set_document(self, source: str, chunks_count: int, **extra):
+        """记录（或更新）一个来源文档"""
+        with self._lock:
+            entry = self._documents.get(source, {})
+            entry.update(extra)
+            entry["chunks_count"] = chunks_count
+            entry["updated_at"] = time.time()
+            self._documents[source] = entry
+
+    def remove_document(self, source: str):
+        """移除一个来源文档"""
+        with self._lock:
+            self._documents.pop(source, None)
+
+    def get_document(self, source: str) -> Optional[Dict]:
+        """获取来源文档的记录"""
+        with self._lock:
+            entry = self._documents.get(source)
+            return dict(entry) if entry else None
+
+    def documents(self) -> Dict[str, Dict]:
+        """全部来源文档记录的副本"""
+        with self._lock:
+            return {source: dict(entry) for source, entry in self._documents.items()}
+
+    @property
+    def total_chunks(self) -> int:
+        with self._lock:
+            return sum(entry.get("chunks_count", 0) for entry in self._documents.values())
+
+
+class DocumentManifestManager:
+    """管理所有集合的文档清单，每个集合只加载一次并常驻内存"""
+
+    def __init__(self, persist_directory: str):
+        """
+        Args:
+            persist_directory: 向量数据库存储路径，清单存放在其下的 manifests 子目录
+        """
+        self.manifest_directory = os.path.join(persist_directory, "manifests")
+        self._manifests: Dict[str, DocumentManifest] = {}
+        self._lock = threading.Lock()
+
+    def _manifest_path(self, collection_name: str) -> str:
+        return os.path.join(self.manifest_directory, f"{collection_name}.json")
+
+    def get(self, collection_name: str, loader: Optional[Callable[[], List[Dict]]] = None) -> DocumentManifest:
+        """
+        获取集合的文档清单
+
+        Args:
+            collection_name: 集合名称
+            loader: 磁盘上没有清单文件时调用，返回集合全部片段的元数据列表，用于一次性构建清单
+                    （兼容引入清单之前已经入库的集合）
+
+        Returns:
+            DocumentManifest 实例
+        """
+        with self._lock:
+            manifest = self._manifests.get(collection_name)
+            if manifest is not None:
+                return manifest
+
+            manifest = DocumentManifest(self._manifest_path(collection_name))
+            if manifest.exists():
+                manifest.load()
+            elif loader is not None:
+                counts: Dict[str, int] = {}
+                for metadata in loader():
+                    source = (metadata or {}).get('source', '未知文档')
+                    counts[source] = counts.get(source, 0) + 1
+                if counts:
+                    for source, count in counts.items():
+                        manifest.set_document(source, count)
+                    manifest.save()
+                    print(f"✓ 已为集合 {collection_name} 构建文档清单（{len(counts)} 个文档）")
+            self._manifests[collection_name] = manifest
+            return manifest
+
+    def drop(self, collection_name: str):
+        """删除集合的文档清单（内存与磁盘）"""
+        with self._lock:
+            self._manifests.pop(collection_name, None)
+            path = self._manifest_path(collection_name)
+            if os.path.exists(path):
+                os.remove(path)
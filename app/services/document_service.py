@@ -3,7 +3,11 @@
 负责文档上传、切片、向量化和存储到Chroma数据库
 """
 import os
-from typing import List, Dict
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Callable, Iterable, Iterator, List, Dict, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -12,86 +16,97 @@ load_dotenv()
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
-from transformers import AutoTokenizer
 # 导入Chroma - 优先使用新的langchain-chroma包
 try:
     from langchain_chroma import Chroma  # type: ignore
 except ImportError:
     # 如果新包不可用，则回退到旧版本
     from langchain_community.vectorstores import Chroma
-try:
-    from langchain_huggingface import HuggingFaceEmbeddings
-except ImportError:
-    # 兼容旧版本，如果langchain-huggingface未安装
-    try:
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-    except ImportError:
-        raise ImportError("Please install langchain-huggingface: pip install langchain-huggingface")
 from langchain_core.documents import Document
 
+from app.services.bm25_index import BM25IndexManager, BM25IndexRetriever
+from app.services.chroma_pool import get_chroma_client, VectorStoreCache
+from app.services.model_registry import model_registry
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.embedding_cache import EmbeddingCache
+from app.services.token_splitter import TokenAwareTextSplitter
+from app.services.document_manifest import DocumentManifestManager
+from app.services.upload_storage import file_sha256
+from app.services.data_lock import DataDirLock
+from app.services.text_normalizer import normalize_document
+from app.services.pdf_parser import ParallelPDFLoader, shutdown_pool as shutdown_pdf_pool
+
 
 class DocumentService:
     """文档处理服务类"""
     
     def __init__(self):
         """初始化文档服务"""
-        # 延迟初始化嵌入模型和文本分割器，仅在需要时才加载
-        self._embeddings = None
+        # 延迟初始化文本分割器，仅在需要时才加载
+        # 嵌入模型和分词器由进程内共享的模型注册表提供
         self._text_splitter = None
-        self._tokenizer = None
-        
-        # 从环境变量获取模型路径
-        self.model_path = os.getenv('MODEL_PATH', 'BAAI/bge-small-zh-v1.5')
-        
-        # 设置离线模式和关闭分词器并行警告
-        if os.getenv('HF_HUB_OFFLINE') == '1':
-            os.environ['HF_HUB_OFFLINE'] = '1'
-            os.environ['TRANSFORMERS_OFFLINE'] = '1'
-        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        self._embedding_pipeline = None
+        self._embedding_cache = None
+        self.model_path = model_registry.model_path
         
         # 向量数据库存储路径
         self.persist_directory = "./chroma_db"
         os.makedirs(self.persist_directory, exist_ok=True)
+        
+        # 数据目录写入锁：服务进程和命令行批量入库不能同时写入同一数据目录
+        self.data_lock = DataDirLock(self.persist_directory)
+        
+        # 向量库句柄 LRU 缓存（底层共享同一个 Chroma 客户端）
+        self._vectorstores = VectorStoreCache(
+            self._create_vectorstore,
+            max_size=int(os.getenv("VECTORSTORE_CACHE_SIZE", "16"))
+        )
+        
+        # BM25 倒排索引（按集合持久化，查询时常驻内存）
+        self.bm25_indexes = BM25IndexManager(self.persist_directory)
+        
+        # 文档清单（每个来源文档的片段数，入库和删除时维护）
+        self.manifests = DocumentManifestManager(self.persist_directory)
+        
+        # 集合版本号：每次上传或删除后递增，用于使问答缓存失效
+        self._collection_versions: Dict[str, int] = {}
+        self._versions_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """存储目录对应的长期存活 Chroma 客户端（进程内共享）"""
+        return get_chroma_client(self.persist_directory)
     
     @property
     def embeddings(self):
-        """懒加载嵌入模型 - 使用本地模型路径"""
-        if self._embeddings is None:
-            print(f"正在从本地路径加载嵌入模型: {self.model_path}")
-            
-            # 检查模型路径是否存在
-            if os.path.exists(self.model_path):
-                # 使用本地模型路径
-                self._embeddings = HuggingFaceEmbeddings(
-                    model_name=self.model_path,
-                    model_kwargs={'device': 'cpu'},  # 如果有GPU可改为'cuda'
-                    encode_kwargs={'normalize_embeddings': True}  # 归一化嵌入向量
-                )
-                print("✓ 本地模型加载成功")
-            else:
-                # 回退到在线下载模式
-                print(f"警告: 本地模型路径不存在 ({self.model_path})，将尝试从 Hugging Face 下载")
-                self._embeddings = HuggingFaceEmbeddings(
-                    model_name="BAAI/bge-small-zh-v1.5",
-                    model_kwargs={'device': 'cpu'}
-                )
-        return self._embeddings
+        """嵌入模型（进程内共享）"""
+        return model_registry.embeddings
     
     @property
     def tokenizer(self):
-        """懒加载 bge 原生分词器"""
-        if self._tokenizer is None:
-            print(f"正在加载 bge 分词器: {self.model_path}")
-            try:
-                if os.path.exists(self.model_path):
-                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-                else:
-                    print(f"警告: 本地模型路径不存在 ({self.model_path})，将尝试从 Hugging Face 下载")
-                    self._tokenizer = AutoTokenizer.from_pretrained("BAAI/bge-small-zh-v1.5")
-                print("✓ 分词器加载成功")
-            except Exception as e:
-                raise Exception(f"分词器加载失败：{str(e)}")
-        return self._tokenizer
+        """bge 原生分词器（进程内共享）"""
+        return model_registry.tokenizer
+    
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        """懒加载入库向量缓存（EMBED_CACHE_ENABLED=0 时为 None），不加载嵌入模型"""
+        if self._embedding_cache is None and os.getenv("EMBED_CACHE_ENABLED", "1") == "1":
+            self._embedding_cache = EmbeddingCache(
+                os.path.join(self.persist_directory, "embedding_cache.sqlite3"),
+                model_name=self.model_path
+            )
+        return self._embedding_cache
+    
+    @property
+    def embedding_pipeline(self):
+        """懒加载入库向量化管道（批量 + 可选多进程 + 向量缓存）"""
+        if self._embedding_pipeline is None:
+            self._embedding_pipeline = EmbeddingPipeline(
+                self.embeddings,
+                model_registry.embedding_model_spec(),
+                cache=self.embedding_cache
+            )
+        return self._embedding_pipeline
     
     def _bge_tokenizer(self, text: str) -> List[int]:
         """适配 bge-small-zh-v1.5 的 tokens 计算函数（与 LangChain 兼容）"""
@@ -102,18 +117,62 @@ class DocumentService:
         """懒加载文本分割器 - 使用语义感知的递归字符切分"""
         if self._text_splitter is None:
             print("正在初始化语义感知文本分割器...")
-            # RecursiveCharacterTextSplitter：按"强边界→弱边界"递归切分，完美适配中文
-            self._text_splitter = RecursiveCharacterTextSplitter(
-                # 自定义中文语义边界（优先级从高到低）
-                separators=["\n\n", "\n", "。", "！", "？", "；", "，", "、"],  # 空行→换行→句末标点→停顿标点
-                chunk_size=480,           # 单块最大 tokens（适配 bge，预留冗余）
-                chunk_overlap=80,         # 重叠窗口（16.7%，符合 10%-20% 建议值）
-                # 使用 bge 原生分词器计算长度，保证与模型编码一致
-                length_function=lambda x: len(self._bge_tokenizer(x)),
-            )
+            # 自定义中文语义边界（优先级从高到低）：空行→换行→句末标点→停顿标点
+            separators = ["\n\n", "\n", "。", "！", "？", "；", "，", "、"]
+            if getattr(self.tokenizer, "is_fast", False):
+                # 快速分词器：每页只编码一次，按 token 偏移量计算长度
+                self._text_splitter = TokenAwareTextSplitter(
+                    self.tokenizer,
+                    separators=separators,
+                    chunk_size=480,           # 单块最大 tokens（适配 bge，预留冗余）
+                    chunk_overlap=80,         # 重叠窗口（16.7%，符合 10%-20% 建议值）
+                )
+            else:
+                # RecursiveCharacterTextSplitter：按"强边界→弱边界"递归切分，完美适配中文
+                self._text_splitter = RecursiveCharacterTextSplitter(
+                    separators=separators,
+                    chunk_size=480,
+                    chunk_overlap=80,
+                    # 使用 bge 原生分词器计算长度，保证与模型编码一致
+                    length_function=lambda x: len(self._bge_tokenizer(x)),
+                )
             print("✓ 语义感知文本分割器初始化成功 (chunk_size=480, overlap=80)")
         return self._text_splitter
     
+    @staticmethod
+    def _get_loader(file_path: str):
+        """根据文件类型创建文档加载器"""
+        file_ext = Path(file_path).suffix.lower()
+        if file_ext == ".pdf":
+            # 加载PDF文档（配置了 PDF_PARSE_WORKERS 时按页码分片多进程解析）
+            if int(os.getenv("PDF_PARSE_WORKERS", "0")) > 1:
+                return ParallelPDFLoader(file_path)
+            return PyPDFLoader(file_path)
+        if file_ext == ".docx":
+            # 加载Word文档
+            return Docx2txtLoader(file_path)
+        if file_ext == ".txt":
+            # 加载文本文件
+            return TextLoader(file_path, encoding="utf-8")
+        raise ValueError(f"不支持的文件格式：{file_ext}")
+    
+    def iter_pages(self, file_path: str) -> Iterator[Document]:
+        """
+        逐页加载并清洗文档（基于 lazy_load，不会一次性读入全部页面）
+        
+        Args:
+            file_path: 文件路径
+            
+        Yields:
+            清洗后的单页 Document
+        """
+        try:
+            loader = self._get_loader(file_path)
+            for page in loader.lazy_load():
+                yield self._clean_documents([page])[0]
+        except Exception as e:
+            raise Exception(f"加载文档失败：{str(e)}")
+    
     def load_document(self, file_path: str) -> List[Document]:
         """
         根据文件类型加载文档
@@ -124,52 +183,16 @@ class DocumentService:
         Returns:
             Document对象列表
         """
-        file_ext = Path(file_path).suffix.lower()
-        
-        try:
-            if file_ext == ".pdf":
-                # 加载PDF文档
-                loader = PyPDFLoader(file_path)
-                documents = loader.load()
-            elif file_ext == ".docx":
-                # 加载Word文档
-                loader = Docx2txtLoader(file_path)
-                documents = loader.load()
-            elif file_ext == ".txt":
-                # 加载文本文件
-                loader = TextLoader(file_path, encoding="utf-8")
-                documents = loader.load()
-            else:
-                raise ValueError(f"不支持的文件格式：{file_ext}")
-            
-            # 对加载后的文档进行文本清洗
-            return self._clean_documents(documents)
-        
-        except Exception as e:
-            raise Exception(f"加载文档失败：{str(e)}")
+        return list(self.iter_pages(file_path))
     
     def _clean_documents(self, documents: List[Document]) -> List[Document]:
-        """清洗文档内容，处理 PDF 解析产生的异常空格等问题"""
-        import re
+        """
+        清洗文档内容，处理 PDF 解析产生的异常空格等问题
+        
+        清洗后写入 normalized_version 标记，切分出的片段继承该标记，检索时不再重复清洗
+        """
         for doc in documents:
-            content = doc.page_content
-            
-            # 1. 修复中文字符间的异常空格 (e.g., "中 文" -> "中文")
-            # 匹配两个中文字符之间的一个空格，并将其删除
-            # 使用 Unicode 范围匹配中文字符
-            content = re.sub(r'([\u4e00-\u9fa5])\s+([\u4e00-\u9fa5])', r'\1\2', content)
-            # 递归处理多次出现的空格
-            content = re.sub(r'([\u4e00-\u9fa5])\s+([\u4e00-\u9fa5])', r'\1\2', content)
-            
-            # 2. 修复中英文/数字之间的多余空格
-            content = re.sub(r'([\u4e00-\u9fa5])\s+([a-zA-Z0-9])', r'\1\2', content)
-            content = re.sub(r'([a-zA-Z0-9])\s+([\u4e00-\u9fa5])', r'\1\2', content)
-            
-            # 3. 清理多余的换行和空白符
-            content = re.sub(r'\n{3,}', '\n\n', content)
-            content = content.strip()
-            
-            doc.page_content = content
+            normalize_document(doc)
         return documents
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
@@ -182,12 +205,24 @@ class DocumentService:
         Returns:
             切分后的文档块列表
         """
-        try:
-            # 使用递归字符文本分割器进行切片
-            chunks = self.text_splitter.split_documents(documents)
-            return chunks
-        except Exception as e:
-            raise Exception(f"文档切片失败：{str(e)}")
+        return list(self.iter_chunks(documents))
+    
+    def iter_chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        逐页切分文档（分割器本身按文档独立切分，逐页处理与整体切分结果一致）
+        
+        Args:
+            pages: 页面迭代器
+            
+        Yields:
+            切分后的文档块
+        """
+        for page in pages:
+            try:
+                chunks = self.text_splitter.split_documents([page])
+            except Exception as e:
+                raise Exception(f"文档切片失败：{str(e)}")
+            yield from chunks
     
     async def process_document(
         self, 
@@ -196,6 +231,7 @@ class DocumentService:
     ) -> Dict:
         """
         处理文档的完整流程：加载 -> 切片 -> 向量化 -> 存储
+        （在线程池中执行，不阻塞事件循环）
         
         Args:
             file_path: 文件路径
@@ -204,50 +240,230 @@ class DocumentService:
         Returns:
             处理结果字典，包含切片数量等信息
         """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            lambda: self.ingest_document(file_path, collection_name)
+        )
+    
+    def ingest_document(
+        self,
+        file_path: str,
+        collection_name: str = "default",
+        progress_callback: Optional[Callable] = None,
+        content_hash: Optional[str] = None
+    ) -> Dict:
+        """
+        同步执行文档入库（供后台任务线程调用）
+        
+        Args:
+            file_path: 文件路径
+            collection_name: 向量数据库集合名称
+            progress_callback: 进度回调 (stage, chunks_processed=None, chunks_total=None)
+            content_hash: 文件内容的 SHA-256（上传时已边接收边计算；未提供时读取文件计算），记入文档清单
+            
+        Returns:
+            处理结果字典，包含切片数量等信息
+        """
+        def report(stage, **kwargs):
+            if progress_callback:
+                progress_callback(stage, **kwargs)
+        
         try:
-            # 1. 加载文档
-            print(f"正在加载文档：{file_path}")
-            documents = self.load_document(file_path)
-            
-            # 2. 文档切片
-            print(f"正在切分文档，共 {len(documents)} 页...")
-            chunks = self.split_documents(documents)
-            print(f"文档已切分为 {len(chunks)} 个片段")
-            
-            # 3. 向量化并存储到Chroma（追加模式）
-            print(f"正在向量化并存储到集合：{collection_name}")
-            vectorstore = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory,
-                collection_name=collection_name
+            # 流式处理：逐页加载 -> 清洗 -> 切片，新增片段攒满一批即向量化并写入，内存占用与文档页数无关
+            print(f"正在流式入库文档：{file_path} -> 集合 {collection_name}")
+            report("loading")
+            
+            # 先加载（或迁移构建）该集合的 BM25 索引，确保已有片段都在索引中
+            bm25_index = self.get_bm25_index(collection_name)
+            collection = self.client.get_or_create_collection(collection_name)
+            write_batch_size = self._write_batch_size()
+            
+            # 同一来源已入库的片段 ID：未变化的片段跳过向量化，入库结束后删除不再出现的片段
+            sources = set()
+            existing_ids = set()
+            
+            def track_source(source):
+                if source not in sources:
+                    sources.add(source)
+                    existing_ids.update(self.get_chunk_ids_by_source(collection_name, [source]))
+            
+            track_source(file_path)
+            
+            seen_ids = set()
+            occurrences = {}
+            source_counts = {}
+            pending_ids, pending_chunks = [], []
+            embed_stats = {"cache_hits": 0, "embedded": 0}
+            counters = {"pages": 0, "chunks": 0, "added": 0}
+            start = time.time()
+            
+            def flush():
+                if not pending_chunks:
+                    return
+                self._write_batch(collection, pending_ids, pending_chunks, embed_stats)
+                # 与 Chroma 写入同批保存：进程中途退出时，已写入向量库的片段也已在 BM25 索引中
+                bm25_index.add_documents(list(pending_ids), [chunk.page_content for chunk in pending_chunks])
+                bm25_index.save()
+                counters["added"] += len(pending_chunks)
+                pending_ids.clear()
+                pending_chunks.clear()
+            
+            for page in self.iter_pages(file_path):
+                counters["pages"] += 1
+                for chunk in self.iter_chunks([page]):
+                    chunk_id = self.make_chunk_id(chunk, occurrences)
+                    counters["chunks"] += 1
+                    source = chunk.metadata.get("source", file_path)
+                    track_source(source)
+                    source_counts[source] = source_counts.get(source, 0) + 1
+                    seen_ids.add(chunk_id)
+                    # 只跳过两处都已写入的片段；只在向量库中的片段（上次写入中途失败）重新写入
+                    if chunk_id in existing_ids and chunk_id in bm25_index:
+                        continue
+                    pending_ids.append(chunk_id)
+                    pending_chunks.append(chunk)
+                    if len(pending_chunks) >= write_batch_size:
+                        flush()
+                # chunks_total 为目前已切出的片段数，随页面推进增长
+                report(
+                    "embedding",
+                    chunks_processed=counters["chunks"] - len(pending_chunks),
+                    chunks_total=counters["chunks"]
+                )
+            flush()
+            
+            chunks_count = counters["chunks"]
+            added_count = counters["added"]
+            unchanged_count = chunks_count - added_count
+            elapsed = time.time() - start
+            chunks_per_second = added_count / elapsed if elapsed > 0 else 0.0
+            print(
+                f"✓ 共 {counters['pages']} 页，切分为 {chunks_count} 个片段，"
+                f"写入 {added_count} 个（{chunks_per_second:.1f} 片段/秒）"
             )
             
+            # 删除本次未出现的旧片段（新片段全部写入后再删除，处理过程中检索不会出现空窗）
+            report("indexing", chunks_processed=chunks_count, chunks_total=chunks_count)
+            removed_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in seen_ids]
+            print(f"片段对比：新增 {added_count}，删除 {len(removed_ids)}，未变化 {unchanged_count}")
+            if removed_ids:
+                self.delete_chunks(collection_name, removed_ids)
+            
             # 注意：Chroma 0.4.x以上版本会自动持久化，无需手动调用
             
-            # 4. 验证存储的实际数量
+            bm25_index.remove_documents(removed_ids)
+            bm25_index.save()
+            
+            # 更新文档清单（按来源记录片段数）
+            manifest = self.get_manifest(collection_name)
+            if content_hash is None:
+                content_hash = file_sha256(file_path)
+            for source in sources:
+                if source in source_counts:
+                    extra = {"content_hash": content_hash} if source == file_path else {}
+                    manifest.set_document(source, source_counts[source], **extra)
+                else:
+                    manifest.remove_document(source)
+            manifest.save()
+            
+            # 写入后使缓存的句柄失效，后续请求重新获取
+            self.invalidate_vectorstore(collection_name)
+            self.bump_collection_version(collection_name)
+            
+            # 验证存储的实际数量
             try:
-                import chromadb
-                client = chromadb.PersistentClient(path=self.persist_directory)
-                collection = client.get_collection(collection_name)
                 actual_count = collection.count()
                 print(f"✓ 实际存储片段数：{actual_count}")
             except Exception as e:
                 print(f"警告：无法验证实际数量：{str(e)}")
-                actual_count = len(chunks)
-            
-            # 5. 清理临时文件（可选）
-            # os.remove(file_path)
+                actual_count = chunks_count
             
             return {
                 "chunks_count": actual_count,  # 返回实际存储的数量
                 "collection_name": collection_name,
-                "status": "success"
+                "status": "success",
+                "pages": counters["pages"],
+                "chunks_added": added_count,
+                "chunks_removed": len(removed_ids),
+                "chunks_unchanged": unchanged_count,
+                "embed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(chunks_per_second, 2),
+                "embedding_cache_hits": embed_stats["cache_hits"],
+                "chunks_embedded": embed_stats["embedded"]
             }
         
         except Exception as e:
             raise Exception(f"处理文档失败：{str(e)}")
     
+    @staticmethod
+    def make_chunk_id(chunk: Document, occurrences: Dict[str, int]) -> str:
+        """
+        生成确定性的片段 ID：hash(来源) - hash(片段内容) - 同一来源中相同内容的出现序号
+        ID 不含片段位置：文档中间插入或删除一段时，其余未变化的片段 ID 不变，无需重新向量化
+        
+        同时写入元数据 chunk_id，便于检索结果按 ID 去重
+        
+        Args:
+            chunk: 片段
+            occurrences: 本次入库中已出现的 (来源, 内容) 计数，由调用方为每次入库创建并在各片段间共享
+        """
+        source = str(chunk.metadata.get("source", ""))
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+        key = f"{source_hash}-{content_hash}"
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        chunk_id = f"{key}-{occurrence}"
+        chunk.metadata["chunk_id"] = chunk_id
+        return chunk_id
+    
+    def get_chunk_ids_by_source(self, collection_name: str, sources) -> List[str]:
+        """获取集合中指定来源文档的全部片段 ID"""
+        collection = self.client.get_or_create_collection(collection_name)
+        ids = []
+        for source in sources:
+            data = collection.get(where={"source": source}, include=[])
+            ids.extend(data.get("ids", []))
+        return ids
+    
+    def delete_chunks(self, collection_name: str, ids: List[str]):
+        """从 Chroma 中批量删除片段"""
+        collection = self.client.get_or_create_collection(collection_name)
+        batch_size = self._write_batch_size()
+        for i in range(0, len(ids), batch_size):
+            collection.delete(ids=ids[i:i + batch_size])
+    
+    def invalidate_vectorstore(self, collection_name: str):
+        """集合写入后使缓存的向量库句柄失效，后续请求重新获取"""
+        self._vectorstores.invalidate(collection_name)
+    
+    def _write_batch_size(self) -> int:
+        """单次写入 Chroma 的片段数，不超过 Chroma 允许的最大批量"""
+        write_batch_size = int(os.getenv("CHROMA_WRITE_BATCH", "512"))
+        max_batch_size = getattr(self.client, "get_max_batch_size", None)
+        if max_batch_size:
+            write_batch_size = min(write_batch_size, max_batch_size())
+        return write_batch_size
+    
+    def _write_batch(self, collection, ids: List[str], chunks: List[Document], embed_stats: Dict):
+        """向量化一批片段并写入 Chroma（批大小由调用方控制）"""
+        texts = [chunk.page_content for chunk in chunks]
+        embeddings = self.embedding_pipeline.embed(texts, stats=embed_stats)
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            # Chroma 不接受空字典作为元数据
+            metadatas=[chunk.metadata or None for chunk in chunks]
+        )
+    
+    def shutdown(self):
+        """释放后台资源（向量化进程池和 PDF 解析进程池）"""
+        if self._embedding_pipeline is not None:
+            self._embedding_pipeline.shutdown()
+        shutdown_pdf_pool()
+    
     async def list_collections(self) -> List[str]:
         """
         列出所有已创建的集合
@@ -256,10 +472,7 @@ class DocumentService:
             集合名称列表
         """
         try:
-            # 获取Chroma客户端
-            import chromadb
-            client = chromadb.PersistentClient(path=self.persist_directory)
-            collections = client.list_collections()
+            collections = self.client.list_collections()
             return [col.name for col in collections]
         except Exception as e:
             raise Exception(f"获取集合列表失败：{str(e)}")
@@ -272,15 +485,37 @@ class DocumentService:
             collection_name: 要删除的集合名称
         """
         try:
-            import chromadb
-            client = chromadb.PersistentClient(path=self.persist_directory)
-            client.delete_collection(collection_name)
+            self.client.delete_collection(collection_name)
+            self._vectorstores.invalidate(collection_name)
+            self.bm25_indexes.drop(collection_name)
+            self.manifests.drop(collection_name)
+            self.bump_collection_version(collection_name)
         except Exception as e:
             raise Exception(f"删除集合失败：{str(e)}")
     
+    def get_collection_version(self, collection_name: str) -> int:
+        """获取集合当前版本号（进程内计数，集合内容变化后递增）"""
+        with self._versions_lock:
+            return self._collection_versions.get(collection_name, 0)
+    
+    def bump_collection_version(self, collection_name: str) -> int:
+        """递增集合版本号，返回新版本号"""
+        with self._versions_lock:
+            version = self._collection_versions.get(collection_name, 0) + 1
+            self._collection_versions[collection_name] = version
+            return version
+    
+    def _create_vectorstore(self, collection_name: str):
+        """基于共享客户端创建集合的向量库句柄"""
+        return Chroma(
+            client=self.client,
+            embedding_function=self.embeddings,
+            collection_name=collection_name
+        )
+    
     def get_vectorstore(self, collection_name: str = "default"):
         """
-        获取向量数据库实例
+        获取向量数据库实例（从 LRU 缓存中复用句柄）
         
         Args:
             collection_name: 集合名称
@@ -288,53 +523,68 @@ class DocumentService:
         Returns:
             Chroma向量数据库实例
         """
-        return Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embeddings,
-            collection_name=collection_name
+        return self._vectorstores.get(collection_name)
+    
+    def _load_bm25_corpus(self, collection_name: str):
+        """从 Chroma 读取集合中的全部片段正文，仅在 BM25 索引文件不存在时用于一次性构建"""
+        collection = self.client.get_or_create_collection(collection_name)
+        collection_data = collection.get(include=["documents"])
+        return collection_data.get('ids', []), collection_data.get('documents', [])
+    
+    def get_chunks_by_ids(self, collection_name: str, ids: List[str]) -> Dict[str, Document]:
+        """
+        按片段 ID 批量读取片段正文和元数据（BM25 检索命中后使用）
+        
+        Args:
+            collection_name: 集合名称
+            ids: 片段 ID 列表
+            
+        Returns:
+            {片段 ID: Document}，不包含集合中已不存在的片段
+        """
+        collection = self.client.get_or_create_collection(collection_name)
+        data = collection.get(ids=ids, include=["documents", "metadatas"])
+        metadatas = data.get('metadatas') or [None] * len(data.get('ids', []))
+        return {
+            chunk_id: Document(page_content=text or "", metadata=dict(metadata or {}), id=chunk_id)
+            for chunk_id, text, metadata in zip(data.get('ids', []), data.get('documents', []), metadatas)
+        }
+    
+    def get_bm25_index(self, collection_name: str = "default"):
+        """
+        获取集合的 BM25 索引（首次访问时从磁盘加载，之后常驻内存）
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            BM25Index 实例
+        """
+        return self.bm25_indexes.get(
+            collection_name,
+            loader=lambda: self._load_bm25_corpus(collection_name)
         )
     
     def get_bm25_retriever(self, collection_name: str = "default", k: int = 3):
         """
-        从 Chroma 中获取文档并初始化 BM25 检索器
+        获取基于持久化 BM25 索引的检索器
         
         Args:
             collection_name: 集合名称
             k: 检索结果数量
             
         Returns:
-            BM25Retriever 实例
+            BM25IndexRetriever 实例，集合为空时返回 None
         """
         try:
-            from langchain_community.retrievers import BM25Retriever
-            
-            vectorstore = self.get_vectorstore(collection_name)
-            # 获取所有文档内容用于构建 BM25 索引
-            # 注意：对于超大规模知识库，建议使用持久化的关键词检索引擎如 Elasticsearch
-            collection_data = vectorstore.get()
-            documents = collection_data.get('documents', [])
-            metadatas = collection_data.get('metadatas', [])
-            
-            if not documents:
+            index = self.get_bm25_index(collection_name)
+            if not len(index):
                 return None
-                
-            # 转换为 Document 对象列表
-            docs = [
-                Document(page_content=content, metadata=metadata)
-                for content, metadata in zip(documents, metadatas)
-            ]
-            
-            # 使用 jieba 进行中文分词以优化 BM25 效果
-            import jieba
-            def jieba_tokenizer(text):
-                return list(jieba.cut(text))
-                
-            retriever = BM25Retriever.from_documents(
-                docs, 
-                preprocess_func=jieba_tokenizer
+            return BM25IndexRetriever(
+                index,
+                fetch_documents=lambda ids: self.get_chunks_by_ids(collection_name, ids),
+                k=k
             )
-            retriever.k = k
-            return retriever
         except Exception as e:
             print(f"初始化 BM25 检索器失败：{str(e)}")
             return None
@@ -342,6 +592,7 @@ class DocumentService:
     def get_document_chunks(self, collection_name: str = "default", limit: int = 10, offset: int = 0):
         """
         获取指定集合中的文档片段内容（用于调试和查看）
+        分页在 Chroma 端完成，只读取当前页的片段（不读取向量）
         
         Args:
             collection_name: 集合名称
@@ -352,37 +603,35 @@ class DocumentService:
             包含文档片段信息的字典列表
         """
         try:
-            vectorstore = self.get_vectorstore(collection_name)
+            collection = self.client.get_or_create_collection(collection_name)
             
-            # 获取集合中的所有文档
-            # 注意：Chroma的get()方法返回格式可能因版本而异
             try:
-                # 尝试获取文档内容
-                collection_data = vectorstore.get()
-                
-                chunks = []
-                documents = collection_data.get('documents', [])
-                metadatas = collection_data.get('metadatas', [])
-                ids = collection_data.get('ids', [])
+                collection_data = collection.get(
+                    limit=limit,
+                    offset=offset,
+                    include=["documents", "metadatas"]
+                )
                 
-                # 应用偏移量和限制
-                start_idx = offset
-                end_idx = min(offset + limit, len(documents))
+                documents = collection_data.get('documents') or []
+                metadatas = collection_data.get('metadatas') or []
+                ids = collection_data.get('ids') or []
                 
-                for i in range(start_idx, end_idx):
-                    chunk_info = {
-                        "id": ids[i] if i < len(ids) else str(i + 1),
-                        "content": documents[i] if i < len(documents) else "",
-                        "metadata": metadatas[i] if i < len(metadatas) else {},
-                        "content_length": len(documents[i]) if i < len(documents) else 0,
+                chunks = []
+                for i, chunk_id in enumerate(ids):
+                    content = documents[i] if i < len(documents) else ""
+                    metadata = (metadatas[i] if i < len(metadatas) else None) or {}
+                    chunks.append({
+                        "id": chunk_id,
+                        "content": content,
+                        "metadata": metadata,
+                        "content_length": len(content),
                         # 添加文件名信息（如果存在）
-                        "source": metadatas[i].get('source', '未知') if i < len(metadatas) else '未知'
-                    }
-                    chunks.append(chunk_info)
+                        "source": metadata.get('source', '未知')
+                    })
                 
                 return {
                     "collection_name": collection_name,
-                    "total_chunks": len(documents),
+                    "total_chunks": collection.count(),
                     "returned_chunks": len(chunks),
                     "chunks": chunks
                 }
@@ -400,46 +649,81 @@ class DocumentService:
         except Exception as e:
             raise Exception(f"获取文档片段失败：{str(e)}")
     
-    def get_documents_list(self, collection_name: str = "default") -> Dict:
+    def _load_manifest_metadatas(self, collection_name: str) -> List[Dict]:
+        """从 Chroma 读取集合中全部片段的元数据，仅在清单文件不存在时用于一次性构建"""
+        collection = self.client.get_or_create_collection(collection_name)
+        return collection.get(include=["metadatas"]).get('metadatas') or []
+    
+    def get_manifest(self, collection_name: str = "default"):
+        """
+        获取集合的文档清单（首次访问时从磁盘加载，之后常驻内存）
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            DocumentManifest 实例
+        """
+        return self.manifests.get(
+            collection_name,
+            loader=lambda: self._load_manifest_metadatas(collection_name)
+        )
+    
+    def find_identical_document(self, collection_name: str, source: str, content_hash: str) -> Optional[Dict]:
+        """
+        查找集合中内容完全相同的已入库文档（来源相同且内容哈希一致）
+        
+        Args:
+            collection_name: 集合名称
+            source: 来源（上传文件的保存路径）
+            content_hash: 文件内容的 SHA-256
+            
+        Returns:
+            文档清单中的记录，没有则返回 None
+        """
+        entry = self.get_manifest(collection_name).get_document(source)
+        if entry and entry.get("content_hash") == content_hash:
+            return entry
+        return None
+    
+    def get_documents_list(
+        self,
+        collection_name: str = "default",
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict:
         """
         获取集合中所有文档的列表（按文件名分组）
+        片段数来自入库时维护的文档清单，无需扫描集合
         
         Args:
             collection_name: 集合名称
+            limit: 返回的文档数量限制（None 表示全部）
+            offset: 偏移量，用于分页
             
         Returns:
             文档列表信息
         """
         try:
-            vectorstore = self.get_vectorstore(collection_name)
-            collection_data = vectorstore.get()
-            
-            metadatas = collection_data.get('metadatas', [])
-            
-            # 按文件名统计片段数
-            documents_dict = {}
-            for metadata in metadatas:
-                source = metadata.get('source', '未知文档')
-                if source in documents_dict:
-                    documents_dict[source] += 1
-                else:
-                    documents_dict[source] = 1
+            manifest = self.get_manifest(collection_name)
+            documents = manifest.documents()
             
             # 转换为列表格式
             documents_list = [
                 {
                     "filename": filename,
-                    "chunks_count": count,
+                    "chunks_count": entry.get("chunks_count", 0),
                     "source_path": filename
                 }
-                for filename, count in documents_dict.items()
+                for filename, entry in documents.items()
             ]
+            end = None if limit is None else offset + limit
             
             return {
                 "collection_name": collection_name,
                 "total_documents": len(documents_list),
-                "total_chunks": len(metadatas),
-                "documents": documents_list
+                "total_chunks": manifest.total_chunks,
+                "documents": documents_list[offset:end]
             }
             
         except Exception as e:
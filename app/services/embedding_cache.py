@@ -0,0 +1,233 @@
+"""
+向量缓存
+- EmbeddingCache：以 (模型路径, 归一化后的片段文本) 的哈希为键持久化保存片段向量，
+  重新上传修改过的文档时，未变化的片段直接复用已有向量，无需再次向量化
+- QueryEmbeddingCache：查询向量的内存 LRU 缓存
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+def normalize_chunk_text(text: str) -> str:
+    """缓存键使用的文本归一化：Unicode NFC 规范化并去除首尾空白"""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+class EmbeddingCache:
+    """
+    基于 SQLite 的持久化向量缓存
+
+    - 向量以 float32 二进制存储
+    - 超过 max_entries 时按最近访问时间淘汰最久未使用的条目
+    """
+
+    def __init__(self, db_path: str, model_name: str, max_entries: Optional[int] = None):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            model_name: 嵌入模型名称或路径（参与缓存键计算，换模型后自动失效）
+            max_entries: 最大缓存条目数（默认读取 EMBED_CACHE_MAX_ENTRIES，缺省为 200000）
+        """
+        self.db_path = db_path
+        self.model_name = model_name
+        self.max_entries = max_entries or int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    def make_key(self, text: str) -> str:
+        """计算缓存键：sha256(模型路径 + 归一化文本)"""
+        payload = self.model_name + "\x00" + normalize_chunk_text(text)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, List[float]]:
+        """
+        批量查询缓存
+
+        Args:
+            texts: 片段文本列表
+
+        Returns:
+            {文本下标: 向量}，只包含命中的条目
+        """
+        keys = [self.make_key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite 单条语句的参数数量有限，分段查询
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        result = {i: found[key] for i, key in enumerate(keys) if key in found}
+        self.hits += len(result)
+        self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """
+        批量写入缓存
+
+        Args:
+            texts: 片段文本列表
+            vectors: 对应的向量列表
+        """
+        now = time.time()
+        rows = [
+            (self.make_key(text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出容量时淘汰最久未访问的条目，多淘汰 10% 以减少频繁淘汰（调用方需持有锁）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        to_delete = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (to_delete,)
+        )
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class QueryEmbeddingCache:
+    """
+    查询向量的内存 LRU 缓存（线程安全）
+    重复的问题不再重新计算向量，供向量检索和语义问答缓存共用
+
+    - QUERY_EMBEDDING_CACHE_SIZE：最大缓存条目数（默认 2048）
+    """
+
+    def __init__(self, embeddings_getter: Callable[[], object], max_entries: Optional[int] = None):
+        """
+        Args:
+            embeddings_getter: 返回嵌入模型的函数（延迟到首次未命中时才加载模型）
+            max_entries: 最大缓存条目数
+        """
+        self.embeddings_getter = embeddings_getter
+        self.max_entries = max_entries or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        """获取查询向量，命中缓存时直接返回"""
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        # 在锁外计算向量，避免阻塞其他查询
+        vector = self.embeddings_getter().embed_query(text)
+
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量获取查询向量，未命中的问题合并为一次 embed_documents 调用
+        （HuggingFaceEmbeddings 的 embed_query 即单条 embed_documents，结果一致）
+
+        Args:
+            texts: 问题列表
+
+        Returns:
+            向量列表（与输入顺序一致）
+        """
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        with self._lock:
+            for i, text in enumerate(texts):
+                vector = self._entries.get(text)
+                if vector is not None:
+                    self._entries.move_to_end(text)
+                    vectors[i] = vector
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings_getter().embed_documents(missing)))
+            with self._lock:
+                for text, vector in computed.items():
+                    self._entries[text] = vector
+                    self._entries.move_to_end(text)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
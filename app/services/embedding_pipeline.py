@@ -0,0 +1,191 @@
+"""
+入库向量化管道
+将片段按可配置的批大小分批向量化，可选地把批次分发到多进程并行计算，
+并统计向量化吞吐量（片段/秒）
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def set_torch_threads(num_threads: int):
+    """设置 torch 的 CPU 线程数（未安装 torch 时忽略）"""
+    if num_threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+# ---- 子进程内的模型（每个工作进程只加载一次） ----
+_worker_model = None
+_worker_normalize = False
+_worker_batch_size = 32
+
+
+def _init_worker(model_name: str, normalize: bool, batch_size: int, torch_threads: int):
+    """工作进程初始化：设置线程数并加载嵌入模型"""
+    global _worker_model, _worker_normalize, _worker_batch_size
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    set_torch_threads(torch_threads)
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+    _worker_normalize = normalize
+    _worker_batch_size = batch_size
+
+
+def _encode_in_worker(texts: List[str]) -> List[List[float]]:
+    """在工作进程中向量化一个批次"""
+    vectors = _worker_model.encode(
+        texts,
+        batch_size=_worker_batch_size,
+        normalize_embeddings=_worker_normalize,
+        show_progress_bar=False
+    )
+    return vectors.tolist()
+
+
+class EmbeddingPipeline:
+    """
+    批量向量化管道
+
+    - EMBED_BATCH_SIZE：每批片段数（默认 32）
+    - EMBED_PROCESSES：并行向量化的进程数（默认 0，即在当前进程中计算）
+    - EMBED_TORCH_THREADS：每个进程的 torch CPU 线程数（默认 0，即使用 torch 默认值）
+
+    配置了向量缓存时，命中缓存的片段不再送入模型计算
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        model_spec: Tuple[str, bool],
+        batch_size: Optional[int] = None,
+        num_processes: Optional[int] = None,
+        torch_threads: Optional[int] = None,
+        cache=None
+    ):
+        """
+        Args:
+            embeddings: 当前进程共享的 LangChain 嵌入模型（单进程模式使用）
+            model_spec: (模型名称或路径, 是否归一化)，多进程模式下子进程据此加载模型
+            batch_size: 每批片段数
+            num_processes: 并行进程数，0 或 1 表示不使用进程池
+            torch_threads: 每个进程的 torch 线程数
+            cache: EmbeddingCache 实例（可选）
+        """
+        self.embeddings = embeddings
+        self.model_spec = model_spec
+        self.batch_size = batch_size or int(os.getenv("EMBED_BATCH_SIZE", "32"))
+        self.num_processes = num_processes if num_processes is not None else int(os.getenv("EMBED_PROCESSES", "0"))
+        self.torch_threads = torch_threads if torch_threads is not None else int(os.getenv("EMBED_TORCH_THREADS", "0"))
+        self.cache = cache
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+        if self.num_processes <= 1:
+            set_torch_threads(self.torch_threads)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """懒创建进程池（使用 spawn，避免 fork 后 torch 线程状态异常）"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    model_name, normalize = self.model_spec
+                    print(f"正在启动向量化进程池（{self.num_processes} 个进程）...")
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.num_processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(model_name, normalize, self.batch_size, self.torch_threads)
+                    )
+        return self._pool
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def embed_batches(self, texts: List[str]) -> Iterator[List[List[float]]]:
+        """
+        按批次向量化，按原顺序逐批返回结果
+
+        Args:
+            texts: 待向量化的文本列表
+
+        Yields:
+            每个批次的向量列表
+        """
+        batches = self._batches(texts)
+        if self.num_processes > 1 and len(batches) > 1:
+            # 多进程：所有批次并行计算，map 保证按提交顺序返回
+            yield from self.pool.map(_encode_in_worker, batches)
+        else:
+            for batch in batches:
+                yield self.embeddings.embed_documents(batch)
+
+    def embed(
+        self,
+        texts: List[str],
+        progress_callback: Optional[Callable[[int], None]] = None,
+        stats: Optional[Dict] = None
+    ) -> List[List[float]]:
+        """
+        向量化全部文本（优先从缓存读取）
+
+        Args:
+            texts: 待向量化的文本列表
+            progress_callback: 每完成一批时以已完成数量调用
+            stats: 可选的统计字典，累加 cache_hits 和 embedded 数量
+
+        Returns:
+            向量列表（与输入顺序一致）
+        """
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        if self.cache is not None and texts:
+            for i, vector in self.cache.get_many(texts).items():
+                vectors[i] = vector
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        missing_texts = [texts[i] for i in missing]
+        cache_hits = len(texts) - len(missing)
+        if progress_callback and cache_hits:
+            progress_callback(cache_hits)
+
+        start = time.time()
+        done = 0
+        for batch_vectors in self.embed_batches(missing_texts):
+            batch_texts = missing_texts[done:done + len(batch_vectors)]
+            for vector in batch_vectors:
+                vectors[missing[done]] = vector
+                done += 1
+            if self.cache is not None:
+                self.cache.put_many(batch_texts, batch_vectors)
+            if progress_callback:
+                progress_callback(cache_hits + done)
+        elapsed = time.time() - start
+
+        if missing_texts and elapsed > 0:
+            print(
+                f"✓ 向量化 {len(missing_texts)} 个片段，耗时 {elapsed:.2f}s"
+                f"（{len(missing_texts) / elapsed:.1f} 片段/秒，缓存命中 {cache_hits} 个）"
+            )
+        elif cache_hits:
+            print(f"✓ {cache_hits} 个片段全部命中向量缓存")
+
+        if stats is not None:
+            stats["cache_hits"] = stats.get("cache_hits", 0) + cache_hits
+            stats["embedded"] = stats.get("embedded", 0) + len(missing_texts)
+        return vectors
+
+    def shutdown(self):
+        """关闭进程池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
@@ -0,0 +1,105 @@
+"""
+多路检索结果融合
+按片段 ID 累加各检索器的贡献，支持两种方法：
+- rrf：加权 Reciprocal Rank Fusion，score = Σ weight / (rank + k)
+- linear：各检索器分数先做 min-max 归一化，再按权重线性相加
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+FUSION_METHODS = ("rrf", "linear")
+
+
+def _sorted(fused: Dict[str, float]) -> Tuple[List[str], List[float]]:
+    """按分数降序排列；分数相同时保持首次出现的顺序"""
+    items = sorted(fused.items(), key=lambda x: x[1], reverse=True)
+    return [doc_id for doc_id, _ in items], [score for _, score in items]
+
+
+def rrf_fuse(
+    id_lists: Sequence[Sequence[str]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60
+) -> Tuple[List[str], List[float]]:
+    """
+    加权 RRF 融合
+
+    Args:
+        id_lists: 每个检索器按相关度排序的片段 ID 列表
+        weights: 每个检索器的权重（默认全为 1）
+        k: RRF 平滑常数
+
+    Returns:
+        (按融合分数降序排列的片段 ID 列表, 对应的融合分数)
+    """
+    if weights is None:
+        weights = [1.0] * len(id_lists)
+    fused: Dict[str, float] = {}
+    for ids, weight in zip(id_lists, weights):
+        for rank, doc_id in enumerate(ids):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (rank + k)
+    return _sorted(fused)
+
+
+def _min_max(scores: Sequence[float]) -> List[float]:
+    """min-max 归一化到 [0, 1]；所有分数相同时统一记为 1"""
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high - low < 1e-12:
+        return [1.0] * len(scores)
+    return [(score - low) / (high - low) for score in scores]
+
+
+def linear_fuse(
+    id_lists: Sequence[Sequence[str]],
+    score_lists: Sequence[Sequence[float]],
+    weights: Optional[Sequence[float]] = None
+) -> Tuple[List[str], List[float]]:
+    """
+    分数归一化后的加权线性融合（某一路没有召回的片段在该路记为 0 分）
+
+    Args:
+        id_lists: 每个检索器的片段 ID 列表
+        score_lists: 对应的原始分数（越大越相关）
+        weights: 每个检索器的权重（默认全为 1）
+
+    Returns:
+        (按融合分数降序排列的片段 ID 列表, 对应的融合分数)
+    """
+    if weights is None:
+        weights = [1.0] * len(id_lists)
+    fused: Dict[str, float] = {}
+    for ids, scores, weight in zip(id_lists, score_lists, weights):
+        for doc_id, score in zip(ids, _min_max(list(scores))):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * score
+    return _sorted(fused)
+
+
+def fuse(
+    method: str,
+    id_lists: Sequence[Sequence[str]],
+    score_lists: Optional[Sequence[Sequence[float]]] = None,
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60
+) -> Tuple[List[str], List[float]]:
+    """
+    按指定方法融合多路结果
+
+    Args:
+        method: "rrf" 或 "linear"（linear 需要 score_lists）
+        id_lists: 每个检索器的片段 ID 列表
+        score_lists: 每个检索器的原始分数
+        weights: 每个检索器的权重
+        k: RRF 平滑常数
+
+    Returns:
+        (片段 ID 列表, 融合分数)
+    """
+    if method == "linear":
+        if score_lists is None:
+            raise ValueError("linear 融合需要提供检索分数")
+        return linear_fuse(id_lists, score_lists, weights)
+    if method == "rrf":
+        return rrf_fuse(id_lists, weights, k)
+    raise ValueError(f"不支持的融合方法: {method}，可选 {', '.join(FUSION_METHODS)}")
@@ -0,0 +1,209 @@
+"""
+混合检索器
+多个子检索器（向量检索、BM25）在共享线程池中并发执行，每个检索器有独立的超时时间，
+超时或失败的检索器被跳过（降级为其余检索器的结果），不会拖住整个请求；
+注意超时只是不再等待：已在执行的任务无法取消（future.cancel() 对运行中的任务无效），
+线程会一直占用到检索返回。因此超时的任务会被记录下来，在它结束之前同一检索器不再提交新任务，
+每个检索器最多只有一个卡住的线程，不会因反复超时占满线程池；
+结果按片段 ID 融合（加权 RRF 或分数归一化后的线性融合，见 fusion.py）
+"""
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.fusion import fuse
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 超时后仍在执行的任务：键 -> Future
+_stalled: Dict[Hashable, Future] = {}
+_stalled_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """进程内共享的检索线程池（HYBRID_RETRIEVER_WORKERS，默认 8）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("HYBRID_RETRIEVER_WORKERS", "8")),
+                    thread_name_prefix="retriever"
+                )
+    return _executor
+
+
+def submit_unless_stalled(executor: ThreadPoolExecutor, key: Hashable, fn: Callable, *args) -> Optional[Future]:
+    """
+    提交任务；同一键上一次超时的任务仍在执行时不提交，返回 None
+
+    Args:
+        executor: 线程池
+        key: 任务键（同一检索器或同一集合使用相同的键）
+        fn: 任务函数
+
+    Returns:
+        Future，或 None（上一次超时的任务尚未结束）
+    """
+    with _stalled_lock:
+        stalled = _stalled.get(key)
+        if stalled is not None:
+            if not stalled.done():
+                return None
+            del _stalled[key]
+    return executor.submit(fn, *args)
+
+
+def mark_stalled(key: Hashable, future: Future):
+    """
+    记录超时的任务。future.cancel() 只能取消尚未开始的任务，
+    已在执行的任务会继续占用线程，记录后在它结束前同一键不再提交新任务
+    """
+    if future.cancel():
+        return
+    with _stalled_lock:
+        _stalled[key] = future
+
+
+def doc_key(doc: Document) -> str:
+    """
+    片段的融合键：优先使用片段 ID（Document.id 或 metadata["chunk_id"]），
+    历史数据没有 ID 时退化为内容哈希
+    """
+    chunk_id = doc.id or (doc.metadata or {}).get("chunk_id")
+    if chunk_id:
+        return chunk_id
+    return "content-" + hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def _invoke_with_scores(retriever, query: str) -> List[Tuple[Document, float]]:
+    """执行检索并返回 (文档, 分数)；检索器不提供分数时以负排名代替"""
+    if hasattr(retriever, "invoke_with_scores"):
+        return retriever.invoke_with_scores(query)
+    return [(doc, -float(rank)) for rank, doc in enumerate(retriever.invoke(query))]
+
+
+class HybridRetriever:
+    """
+    混合检索器：融合多个检索器的结果
+
+    默认使用加权 Reciprocal Rank Fusion (RRF)：
+    - 对每个检索器返回的文档列表，根据其排名位置计算倒数排名分数
+    - 公式：score = weight / (rank + k)，其中 k 是平滑常数（默认60）
+    - 将所有检索器对同一文档的分数相加，得到最终融合分数
+    - 按融合分数降序排列，返回去重后的文档列表
+    也可选择 linear：各检索器分数 min-max 归一化后按权重相加
+    """
+
+    def __init__(
+        self,
+        retrievers,
+        k=60,
+        timeout: Optional[float] = None,
+        weights: Optional[Sequence[float]] = None,
+        method: str = "rrf",
+        top_k: Optional[int] = None,
+        name: Optional[str] = None
+    ):
+        """
+        初始化混合检索器
+
+        Args:
+            retrievers: 检索器列表，如 [vector_retriever, bm25_retriever]
+            k: RRF 平滑常数，默认 60（论文推荐值）
+            timeout: 每个检索器的超时时间，单位秒（默认读取 HYBRID_RETRIEVER_TIMEOUT，缺省为 5）
+            weights: 每个检索器的融合权重（默认全为 1）
+            method: 融合方法，"rrf" 或 "linear"
+            top_k: 融合后保留的候选数量（默认全部保留）
+            name: 检索器组名称（如集合名），用于跟踪超时未结束的任务；
+                  每次检索都重新构建检索器时需要提供，否则按检索器实例跟踪
+        """
+        self.retrievers = retrievers
+        self.k = k
+        self.timeout = timeout if timeout is not None else float(os.getenv("HYBRID_RETRIEVER_TIMEOUT", "5"))
+        self.weights = list(weights) if weights is not None else None
+        self.method = method
+        self.top_k = top_k
+        self.name = name
+
+    def _task_key(self, index: int, retriever) -> Hashable:
+        """子检索器的任务键"""
+        if self.name is not None:
+            return ("retriever", self.name, index)
+        return ("retriever", id(retriever))
+
+    def retrieve_all(self, query: str) -> List[List[Tuple[Document, float]]]:
+        """
+        并发执行所有子检索器
+
+        Args:
+            query: 查询字符串
+
+        Returns:
+            每个检索器的 (文档, 分数) 列表（超时、失败或上一次超时仍未结束的检索器对应空列表）
+        """
+        executor = _get_executor()
+        start = time.time()
+        keys = [self._task_key(i, retriever) for i, retriever in enumerate(self.retrievers)]
+        futures = [
+            submit_unless_stalled(executor, key, _invoke_with_scores, retriever, query)
+            for key, retriever in zip(keys, self.retrievers)
+        ]
+
+        results: List[List[Tuple[Document, float]]] = []
+        for retriever, key, future in zip(self.retrievers, keys, futures):
+            name = type(retriever).__name__
+            if future is None:
+                print(f"[WARN] 检索器 {name} 上一次超时的检索仍未结束，已跳过")
+                results.append([])
+                continue
+            # 所有检索器同时开始执行，超时时间从提交时刻算起
+            remaining = max(0.0, self.timeout - (time.time() - start))
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                mark_stalled(key, future)
+                print(f"[WARN] 检索器 {name} 超时（{self.timeout}s），已跳过")
+                results.append([])
+            except Exception as e:
+                print(f"[WARN] 检索器 {name} 执行失败: {str(e)}")
+                results.append([])
+        return results
+
+    def fuse(self, results: List[List[Tuple[Document, float]]]) -> List[Document]:
+        """按片段 ID 融合多路结果"""
+        doc_map: Dict[str, Document] = {}
+        id_lists = []
+        score_lists = []
+        for pairs in results:
+            ids = []
+            for doc, _ in pairs:
+                key = doc_key(doc)
+                doc_map.setdefault(key, doc)
+                ids.append(key)
+            id_lists.append(ids)
+            score_lists.append([score for _, score in pairs])
+
+        fused_ids, _ = fuse(self.method, id_lists, score_lists, self.weights, self.k)
+        if self.top_k:
+            fused_ids = fused_ids[:self.top_k]
+        return [doc_map[key] for key in fused_ids]
+
+    def invoke(self, query: str) -> List[Document]:
+        """
+        执行混合检索
+
+        Args:
+            query: 查询字符串
+
+        Returns:
+            融合后的文档列表（已去重并按融合分数排序）
+        """
+        return self.fuse(self.retrieve_all(query))
@@ -0,0 +1,268 @@
+"""
+文档入库任务队列
+上传接口只负责保存文件并提交任务，解析、切片、向量化在有界线程池中后台执行，
+通过任务 ID 查询处理阶段、已处理片段数和吞吐量
+
+同一文件路径的任务串行执行：上传的临时文件由任务在开始执行时才替换为正式文件，
+前一个任务仍在读取该文件时，后提交的任务排队等待，不会覆盖正在解析的文件；
+批量任务占用其中全部文件的路径，与涉及相同文件的单文件任务同样按提交顺序串行
+"""
+import os
+import time
+import shutil
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.services.bulk_ingest import BulkIngestor
+from app.services.upload_storage import UploadSpooler
+
+
+class IngestionJob:
+    """单个文档入库任务的状态"""
+
+    def __init__(
+        self,
+        file_path: str,
+        collection_name: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.filename = filename or os.path.basename(file_path)
+        self.collection_name = collection_name
+
+        # 状态：queued -> running -> succeeded / failed
+        self.status = "queued"
+        # 阶段：queued / loading / embedding / indexing / done
+        self.stage = "queued"
+        self.chunks_total = 0
+        self.chunks_processed = 0
+        # 批量入库任务的文件进度
+        self.files_total: Optional[int] = None
+        self.files_processed = 0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update_progress(
+        self,
+        stage: str,
+        chunks_processed: Optional[int] = None,
+        chunks_total: Optional[int] = None,
+        files_processed: Optional[int] = None,
+        files_total: Optional[int] = None
+    ):
+        """进度回调，由 DocumentService / BulkIngestor 在各处理阶段调用"""
+        with self._lock:
+            self.stage = stage
+            if chunks_total is not None:
+                self.chunks_total = chunks_total
+            if chunks_processed is not None:
+                self.chunks_processed = chunks_processed
+            if files_total is not None:
+                self.files_total = files_total
+            if files_processed is not None:
+                self.files_processed = files_processed
+
+    def to_dict(self) -> Dict:
+        """转换为接口返回格式"""
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            throughput = self.chunks_processed / elapsed if elapsed > 0 else 0.0
+            data = {
+                "job_id": self.id,
+                "filename": self.filename,
+                "collection_name": self.collection_name,
+                "status": self.status,
+                "stage": self.stage,
+                "chunks_total": self.chunks_total,
+                "chunks_processed": self.chunks_processed,
+                "elapsed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(throughput, 2),
+                "result": self.result,
+                "error": self.error,
+            }
+            if self.files_total is not None:
+                data["files_total"] = self.files_total
+                data["files_processed"] = self.files_processed
+            return data
+
+
+class IngestionJobManager:
+    """入库任务管理器：有界线程池 + 内存中的任务表"""
+
+    def __init__(self, document_service, max_workers: Optional[int] = None, max_jobs: int = 1000):
+        """
+        Args:
+            document_service: DocumentService 实例
+            max_workers: 并发处理的任务数（默认读取 INGEST_WORKERS，缺省为 2）
+            max_jobs: 保留的任务记录上限，超出时淘汰最早完成的任务
+        """
+        self.document_service = document_service
+        self.max_workers = max_workers or int(os.getenv("INGEST_WORKERS", "2"))
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        # 已提交到线程池的任务占用的文件路径；等待中的任务按提交顺序排队，
+        # 路径与正在执行或排在前面的任务都不冲突时才提交
+        self._held: Set[str] = set()
+        self._waiting: List[Tuple[FrozenSet[str], Callable[[], None]]] = []
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        file_path: str,
+        collection_name: str = "default",
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        tmp_path: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        提交入库任务，立即返回（同一文件路径已有任务时排在其后执行）
+
+        Args:
+            file_path: 文件的正式保存路径
+            collection_name: 目标集合名称
+            filename: 原始文件名（用于展示）
+            content_hash: 文件内容的 SHA-256（上传时已计算）
+            tmp_path: 上传的临时文件，任务开始执行时替换为 file_path（为 None 表示文件已就位）
+
+        Returns:
+            IngestionJob 实例
+        """
+        job = IngestionJob(file_path, collection_name, filename, content_hash)
+
+        def work() -> Dict:
+            if tmp_path is not None:
+                UploadSpooler.commit(tmp_path, job.file_path)
+            return self.document_service.ingest_document(
+                file_path=job.file_path,
+                collection_name=job.collection_name,
+                progress_callback=job.update_progress,
+                content_hash=job.content_hash
+            )
+
+        keys = self._source_keys([file_path])
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+            self._schedule(keys, lambda: self._run(job, work, keys))
+        return job
+
+    def submit_bulk(
+        self,
+        files: List[str],
+        collection_name: str = "default",
+        name: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+        cleanup_dir: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        提交批量入库任务（目录或压缩包中的全部文件），立即返回
+
+        Args:
+            files: 文件路径列表
+            collection_name: 目标集合名称
+            name: 任务名称（目录名或压缩包名，用于展示）
+            sources: 与 files 一一对应的片段来源（默认即文件路径）
+            cleanup_dir: 任务结束后删除的目录（压缩包的临时解压目录）
+
+        Returns:
+            IngestionJob 实例
+        """
+        job = IngestionJob(name or "batch", collection_name, name)
+        job.files_total = len(files)
+        bulk = BulkIngestor(self.document_service)
+
+        def work() -> Dict:
+            try:
+                return bulk.run(files, job.collection_name, job.update_progress, sources=sources)
+            finally:
+                if cleanup_dir is not None:
+                    shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+        keys = self._source_keys(sources or files)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+            self._schedule(keys, lambda: self._run(job, work, keys))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """根据任务 ID 获取任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict(self):
+        """淘汰最早的已结束任务（调用方需持有锁）"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in list(self._jobs.keys()):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].status in ("succeeded", "failed"):
+                del self._jobs[job_id]
+
+    @staticmethod
+    def _source_keys(paths: Iterable[str]) -> FrozenSet[str]:
+        """任务涉及的文件路径（规范化后用于串行化）"""
+        return frozenset(os.path.normcase(os.path.abspath(path)) for path in paths)
+
+    def _schedule(self, keys: FrozenSet[str], task: Callable[[], None]):
+        """任务排队并尝试提交（调用方需持有锁）"""
+        self._waiting.append((keys, task))
+        self._dispatch()
+
+    def _dispatch(self):
+        """按提交顺序提交路径不冲突的等待任务（调用方需持有锁）"""
+        blocked = set(self._held)
+        waiting = []
+        for keys, task in self._waiting:
+            if keys & blocked:
+                waiting.append((keys, task))
+            else:
+                try:
+                    self._executor.submit(task)
+                except RuntimeError:
+                    # 线程池已关闭（服务退出中），排队的任务不再执行
+                    continue
+                self._held |= keys
+            # 排在后面的任务不能越过前面仍在等待的同路径任务
+            blocked |= keys
+        self._waiting = waiting
+
+    def _release(self, keys: FrozenSet[str]):
+        """任务结束：释放其占用的路径，提交因此可以执行的等待任务"""
+        with self._lock:
+            self._held -= keys
+            self._dispatch()
+
+    def _run(self, job: IngestionJob, work: Callable[[], Dict], keys: FrozenSet[str]):
+        """在工作线程中执行入库（keys 为任务占用的文件路径，结束后放行等待这些路径的任务）"""
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = work()
+            job.status = "succeeded"
+            job.update_progress("done")
+        except Exception as e:
+            print(f"[ERROR] 入库任务 {job.id} 失败：{str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._release(keys)
+
+    def shutdown(self, wait: bool = False):
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,214 @@
+"""
+异步 LLM 调用
+- 所有请求共享一个带连接池的 httpx.AsyncClient，不再为每次调用占用线程池线程
+- 信号量限制同时进行的 LLM 调用数，超出部分排队；排队也满时立即拒绝（接口返回 429）
+- 连接错误、超时、限流和 5xx 错误按指数退避 + 随机抖动重试
+"""
+import os
+import random
+import asyncio
+from typing import AsyncIterator, Dict, Optional
+
+
+class LLMSaturatedError(Exception):
+    """LLM 并发数和排队数都已达到上限"""
+
+
+def create_http_async_client(max_connections: Optional[int] = None, timeout: Optional[float] = None):
+    """
+    创建共享的异步 HTTP 客户端
+
+    Args:
+        max_connections: 连接池最大连接数（默认读取 LLM_MAX_CONNECTIONS，缺省为 20）
+        timeout: 读超时，单位秒
+
+    Returns:
+        httpx.AsyncClient 实例
+    """
+    import httpx
+
+    max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0
+        ),
+        timeout=httpx.Timeout(timeout or 60.0, connect=10.0)
+    )
+
+
+def _is_retryable(error: Exception) -> bool:
+    """连接错误、超时、限流和服务端 5xx 错误可以重试"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    try:
+        import httpx
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, (
+        httpx.TransportError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    ))
+
+
+class LLMClient:
+    """
+    带并发限制、排队背压和重试的异步 LLM 调用器
+
+    - LLM_MAX_CONCURRENCY：同时进行的 LLM 调用数（默认 8）
+    - LLM_MAX_QUEUE：等待并发名额的最大请求数，超出时拒绝（默认 32）
+    - LLM_TIMEOUT：单次调用超时，单位秒（默认 60）
+    - LLM_MAX_RETRIES：可重试错误的最大重试次数（默认 2）
+    - LLM_RETRY_BACKOFF：退避基数，单位秒，第 n 次重试等待 [0, base * 2^n] 内的随机时间（默认 0.5）
+    """
+
+    def __init__(
+        self,
+        chain,
+        http_client=None,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None
+    ):
+        """
+        Args:
+            chain: LangChain 可运行对象（提示词 | LLM），需支持 ainvoke / astream
+            http_client: 共享的 httpx.AsyncClient（关闭时一并关闭）
+            max_concurrency: 最大并发调用数
+            max_queue: 最大排队数
+            timeout: 单次调用超时
+            max_retries: 最大重试次数
+            retry_backoff: 退避基数
+        """
+        self.chain = chain
+        self.http_client = http_client
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("LLM_MAX_QUEUE", "32"))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "60"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.retry_backoff = retry_backoff if retry_backoff is not None else float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+
+        # 信号量在首次使用时创建，绑定到服务运行的事件循环
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @property
+    def saturated(self) -> bool:
+        """并发名额和排队名额是否都已用完"""
+        return self._pending >= self.max_concurrency + self.max_queue
+
+    def check_capacity(self):
+        """并发和排队都已满时拒绝（可在检索前调用，尽早放弃注定要排不上队的请求）"""
+        if self.saturated:
+            self.rejected += 1
+            raise LLMSaturatedError(
+                f"LLM 请求过多（并发 {self.max_concurrency}，排队 {self.max_queue}），请稍后重试"
+            )
+
+    def _admit(self):
+        """占用一个排队名额，已满时拒绝"""
+        self.check_capacity()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pending += 1
+
+    async def ainvoke(self, inputs: Dict):
+        """
+        调用 LLM（带排队、超时和重试）
+
+        Args:
+            inputs: 链的输入，如 {"context": ..., "question": ...}
+
+        Returns:
+            LLM 响应消息
+
+        Raises:
+            LLMSaturatedError: 并发和排队都已满
+            asyncio.TimeoutError: 重试后仍然超时
+        """
+        self._admit()
+        try:
+            async with self._semaphore:
+                self.active += 1
+                try:
+                    result = await self._invoke_with_retries(inputs)
+                    self.completed += 1
+                    return result
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    self.active -= 1
+        finally:
+            self._pending -= 1
+
+    async def _invoke_with_retries(self, inputs: Dict):
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(self.chain.ainvoke(inputs), timeout=self.timeout)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                # 指数退避 + 全随机抖动，避免大量请求同时重试
+                delay = random.uniform(0, self.retry_backoff * (2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                print(f"[WARN] LLM 调用失败（{type(e).__name__}），{delay:.2f}s 后第 {attempt} 次重试")
+                await asyncio.sleep(delay)
+
+    async def astream(self, inputs: Dict) -> AsyncIterator:
+        """
+        流式调用 LLM（占用并发名额直到流结束，不重试）
+
+        Args:
+            inputs: 链的输入
+
+        Yields:
+            LLM 输出的消息片段
+        """
+        self._admit()
+        try:
+            async with self._semaphore:
+                self.active += 1
+                try:
+                    async for chunk in self.chain.astream(inputs):
+                        yield chunk
+                    self.completed += 1
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    self.active -= 1
+        finally:
+            self._pending -= 1
+
+    async def aclose(self):
+        """关闭共享的 HTTP 客户端"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+    def stats(self) -> Dict:
+        """并发与重试统计"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": max(0, self._pending - self.active),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
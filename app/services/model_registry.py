@@ -0,0 +1,162 @@
+"""
+模型注册表
+进程内共享的嵌入模型、分词器和 Reranker 模型，
+避免多个服务实例各自加载一份模型权重
+"""
+import os
+import threading
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+from transformers import AutoTokenizer
+try:
+    from langchain_huggingface import HuggingFaceEmbeddings
+except ImportError:
+    # 兼容旧版本，如果langchain-huggingface未安装
+    try:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+    except ImportError:
+        raise ImportError("Please install langchain-huggingface: pip install langchain-huggingface")
+
+
+DEFAULT_MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+DEFAULT_RERANKER_NAME = "BAAI/bge-reranker-base"
+
+
+class ModelRegistry:
+    """模型注册表：所有模型懒加载，且在进程内只加载一次"""
+
+    def __init__(self):
+        """初始化模型注册表"""
+        self._embeddings = None
+        self._tokenizer = None
+        self._reranker = None
+        self._lock = threading.Lock()
+
+        # 从环境变量获取模型路径
+        self.model_path = os.getenv('MODEL_PATH', DEFAULT_MODEL_NAME)
+        self.reranker_model_path = os.getenv("RERANKER_MODEL_PATH", DEFAULT_RERANKER_NAME)
+
+        # 设置离线模式和关闭分词器并行警告
+        if os.getenv('HF_HUB_OFFLINE') == '1':
+            os.environ['HF_HUB_OFFLINE'] = '1'
+            os.environ['TRANSFORMERS_OFFLINE'] = '1'
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    @property
+    def embeddings(self):
+        """懒加载嵌入模型 - 使用本地模型路径"""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    self._embeddings = self._load_embeddings()
+        return self._embeddings
+
+    def embedding_model_spec(self):
+        """
+        嵌入模型的实际加载参数（供需要自行加载模型的子进程使用）
+
+        Returns:
+            (模型名称或路径, 是否归一化嵌入向量)
+        """
+        if os.path.exists(self.model_path):
+            return self.model_path, True
+        return DEFAULT_MODEL_NAME, False
+
+    def _load_embeddings(self):
+        print(f"正在从本地路径加载嵌入模型: {self.model_path}")
+
+        model_name, normalize = self.embedding_model_spec()
+        if normalize:
+            # 使用本地模型路径
+            embeddings = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={'device': 'cpu'},  # 如果有GPU可改为'cuda'
+                encode_kwargs={'normalize_embeddings': True}  # 归一化嵌入向量
+            )
+            print("✓ 本地模型加载成功")
+        else:
+            # 回退到在线下载模式
+            print(f"警告: 本地模型路径不存在 ({self.model_path})，将尝试从 Hugging Face 下载")
+            embeddings = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={'device': 'cpu'}
+            )
+        return embeddings
+
+    @property
+    def tokenizer(self):
+        """懒加载 bge 原生分词器"""
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    self._tokenizer = self._load_tokenizer()
+        return self._tokenizer
+
+    def _load_tokenizer(self):
+        print(f"正在加载 bge 分词器: {self.model_path}")
+        try:
+            if os.path.exists(self.model_path):
+                tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+            else:
+                print(f"警告: 本地模型路径不存在 ({self.model_path})，将尝试从 Hugging Face 下载")
+                tokenizer = AutoTokenizer.from_pretrained(DEFAULT_MODEL_NAME)
+            print("✓ 分词器加载成功")
+            return tokenizer
+        except Exception as e:
+            raise Exception(f"分词器加载失败：{str(e)}")
+
+    @property
+    def reranker(self):
+        """懒加载 Reranker 模型，加载失败时返回 False"""
+        if self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    self._reranker = self._load_reranker()
+        return self._reranker
+
+    def _load_reranker(self):
+        from app.services.reranker_engine import load_cross_encoder
+
+        backend = os.getenv("RERANKER_BACKEND", "torch")
+        onnx_file = os.getenv("RERANKER_ONNX_FILE") or None
+        max_length = int(os.getenv("RERANKER_MAX_LENGTH", "0")) or None
+        try:
+            print(f"正在加载 Reranker 模型: {self.reranker_model_path}（后端: {backend}）")
+
+            # 检查本地路径
+            if not os.path.exists(self.reranker_model_path):
+                print(f"警告: 本地 Reranker 路径不存在，将尝试在线下载: {self.reranker_model_path}")
+
+            try:
+                reranker = load_cross_encoder(self.reranker_model_path, backend, onnx_file, max_length)
+            except Exception as e:
+                if backend == "torch":
+                    raise
+                print(f"[WARN] {backend} 后端加载失败: {str(e)}，回退到 torch 后端")
+                reranker = load_cross_encoder(self.reranker_model_path, "torch", max_length=max_length)
+            print("✓ Reranker 模型加载成功")
+            return reranker
+        except Exception as e:
+            print(f"[WARN] Reranker 加载失败: {str(e)}，将跳过重排序步骤")
+            return False  # 标记为加载失败，避免重复尝试
+
+    def warmup(self, include_reranker: bool = True):
+        """
+        预加载所有模型，并各执行一次推理以完成初始化
+
+        Args:
+            include_reranker: 是否同时预加载 Reranker 模型
+        """
+        print("正在预热模型...")
+        self.tokenizer.encode("预热", add_special_tokens=False)
+        self.embeddings.embed_query("预热")
+        if include_reranker and self.reranker:
+            self.reranker.predict([["预热", "预热"]])
+        print("✓ 模型预热完成")
+
+
+# 进程内共享的模型注册表
+model_registry = ModelRegistry()
@@ -0,0 +1,195 @@
+"""
+多进程 PDF 解析
+PyPDFLoader 的文本提取是纯 Python 实现，只能用满一个 CPU 核心。
+ParallelPDFLoader 把同一个 PDF 的页码区间分片交给进程池并行提取，
+再按页码顺序重新组装，输出的 Document（文本与 source / page / page_label 等元数据）与 PyPDFLoader 一致
+
+可单独运行基准测试：python -m app.services.pdf_parser --file static/文档2.pdf --repeat 40
+"""
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(num_workers: int) -> ProcessPoolExecutor:
+    """懒创建进程内共享的解析进程池（使用 spawn，避免 fork 后 torch 线程状态异常）"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != num_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            print(f"正在启动 PDF 解析进程池（{num_workers} 个进程）...")
+            _pool = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_workers = num_workers
+        return _pool
+
+
+def shutdown_pool():
+    """关闭解析进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def _parse_page_range(args: Tuple[str, int, int, str]) -> List[str]:
+    """在工作进程中提取一个页码区间 [start, end) 的文本"""
+    import pypdf
+
+    file_path, start, end, extraction_mode = args
+    reader = pypdf.PdfReader(file_path)
+    return [
+        reader.pages[i].extract_text(extraction_mode=extraction_mode).strip()
+        for i in range(start, end)
+    ]
+
+
+class ParallelPDFLoader:
+    """
+    分片并行的 PDF 加载器（接口与 PyPDFLoader 的 lazy_load / load 相同）
+
+    - PDF_PARSE_WORKERS：解析进程数（默认 0，即使用 PyPDFLoader 单进程解析）
+    - PDF_PARSE_PAGES_PER_TASK：每个分片的页数（默认 0，即按进程数自动划分，每个进程约 4 个分片）
+
+    页数少于 min_pages 时直接单进程解析，避免进程间传输的开销超过收益
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        num_workers: Optional[int] = None,
+        pages_per_task: Optional[int] = None,
+        min_pages: int = 8,
+        extraction_mode: str = "plain"
+    ):
+        """
+        Args:
+            file_path: PDF 文件路径
+            num_workers: 解析进程数
+            pages_per_task: 每个分片的页数
+            min_pages: 启用并行解析的最少页数
+            extraction_mode: pypdf 文本提取模式（与 PyPDFLoader 默认值一致）
+        """
+        self.file_path = str(file_path)
+        self.num_workers = num_workers if num_workers is not None else int(os.getenv("PDF_PARSE_WORKERS", "0"))
+        self.pages_per_task = pages_per_task if pages_per_task is not None else int(
+            os.getenv("PDF_PARSE_PAGES_PER_TASK", "0")
+        )
+        self.min_pages = min_pages
+        self.extraction_mode = extraction_mode
+
+    def _shards(self, start: int, total_pages: int) -> List[Tuple[int, int]]:
+        """把 [start, total_pages) 划分为连续的页码区间"""
+        remaining = total_pages - start
+        size = self.pages_per_task or max(1, -(-remaining // (self.num_workers * 4)))
+        return [(i, min(i + size, total_pages)) for i in range(start, total_pages, size)]
+
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        按页码顺序逐页返回 Document
+
+        第一页由 PyPDFLoader 在当前进程解析，其元数据作为模板，
+        其余页面分片并行提取文本后套用模板，只替换 page / page_label
+        """
+        import pypdf
+        from langchain_community.document_loaders import PyPDFLoader
+
+        reader = pypdf.PdfReader(self.file_path)
+        total_pages = len(reader.pages)
+        if self.num_workers <= 1 or total_pages < self.min_pages:
+            yield from PyPDFLoader(self.file_path, extraction_mode=self.extraction_mode).lazy_load()
+            return
+
+        page_labels = reader.page_labels
+        first = next(iter(PyPDFLoader(self.file_path, extraction_mode=self.extraction_mode).lazy_load()))
+        template = {key: value for key, value in first.metadata.items() if key not in ("page", "page_label")}
+        yield first
+
+        shards = self._shards(1, total_pages)
+        tasks = [(self.file_path, start, end, self.extraction_mode) for start, end in shards]
+        # map 按提交顺序返回结果：分片并行解析，调用方仍按页码顺序逐页消费
+        for (start, _), texts in zip(shards, _get_pool(self.num_workers).map(_parse_page_range, tasks)):
+            for offset, text in enumerate(texts):
+                page_number = start + offset
+                yield Document(
+                    page_content=text,
+                    metadata={**template, "page": page_number, "page_label": page_labels[page_number]}
+                )
+
+    def load(self) -> List[Document]:
+        """一次性加载全部页面"""
+        return list(self.lazy_load())
+
+
+def _make_benchmark_pdf(file_path: str, repeat: int, output_path: str) -> int:
+    """把样例 PDF 重复 repeat 次拼成一个大文件，返回总页数"""
+    import pypdf
+
+    writer = pypdf.PdfWriter()
+    for _ in range(repeat):
+        writer.append(file_path)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+    return len(writer.pages)
+
+
+def benchmark(file_path: str, repeat: int = 40, workers: Tuple[int, ...] = (2, 4)):
+    """
+    解析速度基准：对比 PyPDFLoader 单进程解析与不同进程数的并行解析
+
+    Args:
+        file_path: 样例 PDF
+        repeat: 样例重复次数（模拟页数较多的文档）
+        workers: 要测试的进程数
+    """
+    import tempfile
+    from langchain_community.document_loaders import PyPDFLoader
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "benchmark.pdf")
+        total_pages = _make_benchmark_pdf(file_path, repeat, pdf_path)
+        print(f"样例：{file_path} × {repeat} = {total_pages} 页，CPU 核心数 {os.cpu_count()}")
+
+        start = time.perf_counter()
+        reference = PyPDFLoader(pdf_path).load()
+        baseline = time.perf_counter() - start
+        print(f"  PyPDFLoader：      {baseline:6.2f}s（{total_pages / baseline:6.1f} 页/秒）")
+
+        for num_workers in workers:
+            loader = ParallelPDFLoader(pdf_path, num_workers=num_workers)
+            # 预热：启动进程池不计入耗时
+            list(_get_pool(num_workers).map(_parse_page_range, [(pdf_path, 0, 1, "plain")] * num_workers))
+            start = time.perf_counter()
+            documents = loader.load()
+            elapsed = time.perf_counter() - start
+            assert [d.page_content for d in documents] == [d.page_content for d in reference], "并行解析文本不一致"
+            assert [d.metadata for d in documents] == [d.metadata for d in reference], "并行解析元数据不一致"
+            print(
+                f"  并行 {num_workers} 进程：     {elapsed:6.2f}s（{total_pages / elapsed:6.1f} 页/秒，"
+                f"加速 {baseline / elapsed:.2f}x）"
+            )
+        shutdown_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并行 PDF 解析基准测试")
+    parser.add_argument("--file", default="static/文档2.pdf", help="样例 PDF")
+    parser.add_argument("--repeat", type=int, default=40, help="样例重复次数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="要测试的进程数")
+    args = parser.parse_args()
+    benchmark(args.file, repeat=args.repeat, workers=tuple(args.workers))
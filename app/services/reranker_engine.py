@@ -0,0 +1,423 @@
+"""
+Reranker 推理引擎
+- 待打分的 (问题, 片段) 对按长度排序后分批送入 CrossEncoder，减少同一批内的 padding；
+  批量问答时多个问题的 (问题, 片段) 对合并为一次推理
+- 批大小、torch 线程数、最大 token 长度均可配置
+- 按 (问题, 片段 ID) 缓存分数，重复问题不再重新打分
+- 可选加载 ONNX Runtime 导出（含 int8 量化）模型，降低 CPU 推理延迟
+- 自适应模式：各检索器结果已高度一致或分数差距明显时跳过或缩小重排序
+
+精度与延迟对比（当前 torch fp32 路径 vs 配置的后端）：
+    python -m app.services.reranker_engine --collection default --backend onnx
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.embedding_pipeline import set_torch_threads
+from app.services.hybrid_retriever import doc_key
+
+
+RERANKER_BACKENDS = ("torch", "onnx")
+
+
+def load_cross_encoder(
+    model_path: str,
+    backend: str = "torch",
+    onnx_file: Optional[str] = None,
+    max_length: Optional[int] = None
+):
+    """
+    加载 CrossEncoder 模型
+
+    Args:
+        model_path: 模型名称或本地路径
+        backend: "torch" 或 "onnx"（需要 sentence-transformers>=4.1 与 onnxruntime）
+        onnx_file: ONNX 模型文件（相对模型目录），如 int8 量化导出 "onnx/model_qint8_avx512_vnni.onnx"；
+                   不指定时由 sentence-transformers 自动导出 fp32 ONNX 模型
+        max_length: 输入的最大 token 数，超出部分截断
+
+    Returns:
+        CrossEncoder 实例
+    """
+    from sentence_transformers import CrossEncoder
+
+    if backend not in RERANKER_BACKENDS:
+        raise ValueError(f"不支持的 Reranker 后端: {backend}，可选 {', '.join(RERANKER_BACKENDS)}")
+
+    kwargs = {"device": "cpu"}
+    if max_length:
+        kwargs["max_length"] = max_length
+    if backend == "onnx":
+        kwargs["backend"] = "onnx"
+        if onnx_file:
+            kwargs["model_kwargs"] = {"file_name": onnx_file}
+    return CrossEncoder(model_path, **kwargs)
+
+
+class RerankerEngine:
+    """
+    带分数缓存的批量重排序引擎（线程安全）
+
+    - RERANK_BATCH_SIZE：每批 (问题, 片段) 对数量（默认 16）
+    - RERANK_TORCH_THREADS：torch CPU 线程数（默认 0，即不修改）
+    - RERANK_CACHE_SIZE：分数缓存的最大条目数（默认 4096，设为 0 关闭）
+    """
+
+    def __init__(
+        self,
+        model_getter: Callable[[], object],
+        batch_size: Optional[int] = None,
+        torch_threads: Optional[int] = None,
+        cache_size: Optional[int] = None
+    ):
+        """
+        Args:
+            model_getter: 返回 CrossEncoder 模型的函数（加载失败时返回 False）
+            batch_size: 每批数量
+            torch_threads: torch 线程数
+            cache_size: 分数缓存条目数
+        """
+        self.model_getter = model_getter
+        self.batch_size = batch_size or int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.torch_threads = torch_threads if torch_threads is not None else int(os.getenv("RERANK_TORCH_THREADS", "0"))
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads_applied = False
+
+        self.cache_hits = 0
+        self.pairs_scored = 0
+        self.predict_seconds = 0.0
+
+    @property
+    def model(self):
+        model = self.model_getter()
+        if model and not self._threads_applied:
+            set_torch_threads(self.torch_threads)
+            self._threads_applied = True
+        return model
+
+    def predict_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        不经过缓存直接打分：按片段长度排序后分批推理，再还原为输入顺序
+
+        Args:
+            pairs: (问题, 片段文本) 列表，可以来自不同问题
+
+        Returns:
+            分数列表（与输入顺序一致）
+        """
+        if not pairs:
+            return []
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        sorted_pairs = [[pairs[i][0], pairs[i][1]] for i in order]
+
+        start = time.perf_counter()
+        sorted_scores = self.model.predict(sorted_pairs, batch_size=self.batch_size, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        # 统计计数与分数缓存共用一把锁，并发请求的累加不会丢失
+        with self._lock:
+            self.predict_seconds += elapsed
+            self.pairs_scored += len(pairs)
+
+        scores = [0.0] * len(pairs)
+        for i, score in zip(order, sorted_scores):
+            scores[i] = float(score)
+        return scores
+
+    def predict(self, query: str, texts: List[str]) -> List[float]:
+        """不经过缓存，对同一问题的多个片段打分"""
+        return self.predict_pairs([(query, text) for text in texts])
+
+    def score_batch(self, queries: List[str], doc_lists: List[List[Document]]) -> List[List[float]]:
+        """
+        计算多个问题的文档分数（优先读取缓存，所有未命中的 (问题, 片段) 对合并为一次推理）
+
+        Args:
+            queries: 问题列表
+            doc_lists: 每个问题的候选文档
+
+        Returns:
+            每个问题的分数列表（与对应 docs 顺序一致）
+        """
+        keys = [[(query, doc_key(doc)) for doc in docs] for query, docs in zip(queries, doc_lists)]
+        scores: List[List[Optional[float]]] = [[None] * len(docs) for docs in doc_lists]
+        if self.cache_size > 0:
+            with self._lock:
+                for q, row in enumerate(keys):
+                    for i, key in enumerate(row):
+                        cached = self._scores.get(key)
+                        if cached is not None:
+                            self._scores.move_to_end(key)
+                            scores[q][i] = cached
+                            self.cache_hits += 1
+
+        missing = [(q, i) for q, row in enumerate(scores) for i, score in enumerate(row) if score is None]
+        if missing:
+            computed = self.predict_pairs([(queries[q], doc_lists[q][i].page_content) for q, i in missing])
+            for (q, i), score in zip(missing, computed):
+                scores[q][i] = score
+            if self.cache_size > 0:
+                with self._lock:
+                    for (q, i), score in zip(missing, computed):
+                        self._scores[keys[q][i]] = score
+                        self._scores.move_to_end(keys[q][i])
+                    while len(self._scores) > self.cache_size:
+                        self._scores.popitem(last=False)
+        return scores
+
+    def score(self, query: str, docs: List[Document]) -> List[float]:
+        """
+        计算文档分数（优先读取缓存）
+
+        Args:
+            query: 问题
+            docs: 候选文档
+
+        Returns:
+            分数列表（与 docs 顺序一致）
+        """
+        return self.score_batch([query], [docs])[0]
+
+    def rerank_batch(self, queries: List[str], doc_lists: List[List[Document]], top_n: int = 3) -> List[List[Document]]:
+        """
+        批量重排序多个问题的候选文档（分数写入 metadata["rerank_score"]）
+
+        Args:
+            queries: 问题列表
+            doc_lists: 每个问题的候选文档
+            top_n: 每个问题保留的数量
+
+        Returns:
+            每个问题重排序后的文档列表；模型不可用或推理失败时按原顺序截取
+        """
+        if not self.model:
+            return [docs[:top_n] for docs in doc_lists]
+        try:
+            results = []
+            for docs, scores in zip(doc_lists, self.score_batch(queries, doc_lists)):
+                for doc, score in zip(docs, scores):
+                    doc.metadata["rerank_score"] = score
+                reranked = sorted(docs, key=lambda x: x.metadata["rerank_score"], reverse=True)
+                results.append(reranked[:top_n])
+            return results
+        except Exception as e:
+            print(f"重排序失败: {str(e)}")
+            return [docs[:top_n] for docs in doc_lists]
+
+    def rerank(self, query: str, docs: List[Document], top_n: int = 3) -> List[Document]:
+        """
+        重排序并截取前 top_n 个文档（分数写入 metadata["rerank_score"]）
+
+        Args:
+            query: 问题
+            docs: 候选文档
+            top_n: 保留数量
+
+        Returns:
+            重排序后的文档列表；模型不可用或推理失败时按原顺序截取
+        """
+        if not docs:
+            return docs[:top_n]
+        return self.rerank_batch([query], [docs], top_n=top_n)[0]
+
+    def clear(self):
+        """清空分数缓存"""
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict:
+        """分数缓存和推理统计"""
+        with self._lock:
+            size = len(self._scores)
+            cache_hits = self.cache_hits
+            pairs_scored = self.pairs_scored
+            predict_seconds = self.predict_seconds
+        return {
+            "size": size,
+            "max_entries": self.cache_size,
+            "cache_hits": cache_hits,
+            "pairs_scored": pairs_scored,
+            "batch_size": self.batch_size,
+            "ms_per_pair": round(predict_seconds / pairs_scored * 1000, 2) if pairs_scored else 0.0,
+        }
+
+
+class AdaptiveRerankPolicy:
+    """
+    自适应重排序策略：根据各检索器前 top_n 的一致程度和分数差距决定重排序规模
+
+    - RERANK_ADAPTIVE：设为 1 启用（默认 0，始终完整重排序）
+    - RERANK_SKIP_AGREEMENT：各检索器前 top_n 重合比例达到该值时跳过重排序（默认 1.0，即完全一致）
+    - RERANK_SHRINK_AGREEMENT：重合比例达到该值时只对融合后的前 2 * top_n 个候选重排序（默认 0.67）
+    - RERANK_SKIP_MARGIN：每个检索器第 top_n 名与第 top_n + 1 名的归一化分数差都不小于该值时跳过（默认 0，不启用）
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        skip_agreement: Optional[float] = None,
+        shrink_agreement: Optional[float] = None,
+        skip_margin: Optional[float] = None
+    ):
+        self.enabled = enabled if enabled is not None else os.getenv("RERANK_ADAPTIVE", "0") == "1"
+        self.skip_agreement = skip_agreement if skip_agreement is not None else float(os.getenv("RERANK_SKIP_AGREEMENT", "1.0"))
+        self.shrink_agreement = shrink_agreement if shrink_agreement is not None else float(os.getenv("RERANK_SHRINK_AGREEMENT", "0.67"))
+        self.skip_margin = skip_margin if skip_margin is not None else float(os.getenv("RERANK_SKIP_MARGIN", "0"))
+
+        self._lock = threading.Lock()
+        self.counters = {"full": 0, "shrunk": 0, "skipped": 0}
+
+    @staticmethod
+    def agreement(retriever_results: List[List[Tuple[Document, float]]], top_n: int) -> Optional[float]:
+        """各检索器前 top_n 的重合比例；少于两个检索器有结果时返回 None"""
+        top_sets = [
+            {doc_key(doc) for doc, _ in pairs[:top_n]}
+            for pairs in retriever_results if pairs
+        ]
+        if len(top_sets) < 2 or top_n <= 0:
+            return None
+        return len(set.intersection(*top_sets)) / top_n
+
+    @staticmethod
+    def margin(pairs: List[Tuple[Document, float]], top_n: int) -> Optional[float]:
+        """第 top_n 名与第 top_n + 1 名的分数差（按该检索器的分数范围归一化）"""
+        if len(pairs) <= top_n or top_n <= 0:
+            return None
+        scores = [score for _, score in pairs]
+        spread = max(scores) - min(scores)
+        if spread <= 0:
+            return 0.0
+        return (scores[top_n - 1] - scores[top_n]) / spread
+
+    def decide(self, retriever_results: Optional[List[List[Tuple[Document, float]]]], candidates_count: int, top_n: int) -> Tuple[str, int]:
+        """
+        决定重排序规模
+
+        Args:
+            retriever_results: 各检索器的 (文档, 分数) 列表（非混合检索时为 None）
+            candidates_count: 融合后的候选数量
+            top_n: 最终保留数量
+
+        Returns:
+            (模式 "full" / "shrunk" / "skipped", 需要重排序的候选数量)
+        """
+        mode, count = "full", candidates_count
+        if self.enabled and retriever_results:
+            agreement = self.agreement(retriever_results, top_n)
+            margins = [self.margin(pairs, top_n) for pairs in retriever_results if pairs]
+            decisive_margin = (
+                self.skip_margin > 0 and margins
+                and all(m is not None and m >= self.skip_margin for m in margins)
+            )
+            if (agreement is not None and agreement >= self.skip_agreement) or decisive_margin:
+                mode, count = "skipped", 0
+            elif agreement is not None and agreement >= self.shrink_agreement and candidates_count > 2 * top_n:
+                mode, count = "shrunk", 2 * top_n
+
+        with self._lock:
+            self.counters[mode] += 1
+        return mode, count
+
+    def stats(self) -> Dict:
+        """各模式的次数和跳过比例"""
+        with self._lock:
+            counters = dict(self.counters)
+        total = sum(counters.values())
+        return {
+            "enabled": self.enabled,
+            **counters,
+            "skip_rate": round(counters["skipped"] / total, 4) if total else 0.0,
+        }
+
+
+def _rank_overlap(a: List[int], b: List[int], n: int) -> float:
+    """前 n 名的重合比例"""
+    return len(set(a[:n]) & set(b[:n])) / n if n else 1.0
+
+
+def benchmark(collection_name: str, queries: List[str], backend: str, onnx_file: Optional[str], candidates: int, top_n: int):
+    """
+    对比当前路径（torch fp32、单次 predict 全部候选）与引擎配置的后端
+
+    Args:
+        collection_name: 用于取候选片段的集合
+        queries: 问题列表
+        backend: 待评估的后端
+        onnx_file: ONNX 模型文件
+        candidates: 每个问题的候选数
+        top_n: 计算前 top_n 名重合率
+    """
+    from app.services.document_service import DocumentService
+    from app.services.model_registry import model_registry
+
+    document_service = DocumentService()
+    vectorstore = document_service.get_vectorstore(collection_name)
+    cases = [(q, [d.page_content for d in vectorstore.similarity_search(q, k=candidates)]) for q in queries]
+    cases = [(q, texts) for q, texts in cases if texts]
+    if not cases:
+        print(f"集合 {collection_name} 中没有可用的候选片段")
+        return
+
+    max_length = int(os.getenv("RERANKER_MAX_LENGTH", "0")) or None
+    baseline = load_cross_encoder(model_registry.reranker_model_path, "torch")
+    candidate = load_cross_encoder(model_registry.reranker_model_path, backend, onnx_file, max_length)
+    engine = RerankerEngine(lambda: candidate, cache_size=0)
+
+    # 预热
+    baseline.predict([[cases[0][0], cases[0][1][0]]])
+    engine.predict(cases[0][0], cases[0][1][:1])
+
+    baseline_time = engine_time = 0.0
+    overlaps, max_diff = [], 0.0
+    for query, texts in cases:
+        start = time.perf_counter()
+        base_scores = [float(s) for s in baseline.predict([[query, t] for t in texts])]
+        baseline_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_scores = engine.predict(query, texts)
+        engine_time += time.perf_counter() - start
+
+        base_rank = sorted(range(len(texts)), key=lambda i: base_scores[i], reverse=True)
+        new_rank = sorted(range(len(texts)), key=lambda i: new_scores[i], reverse=True)
+        overlaps.append(_rank_overlap(base_rank, new_rank, min(top_n, len(texts))))
+        max_diff = max(max_diff, max(abs(a - b) for a, b in zip(base_scores, new_scores)))
+
+    n = len(cases)
+    print(f"{n} 个问题，每个问题最多 {candidates} 个候选：")
+    print(f"  当前路径（torch fp32）：{baseline_time / n * 1000:8.1f} ms/问题")
+    print(f"  引擎（{backend}，batch={engine.batch_size}）：{engine_time / n * 1000:8.1f} ms/问题")
+    print(f"  Top-{top_n} 重合率：{sum(overlaps) / n:.3f}，最大分数差：{max_diff:.4f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reranker 精度与延迟对比")
+    parser.add_argument("--collection", default="default", help="取候选片段的集合名称")
+    parser.add_argument("--queries", help="问题文件（每行一个问题），不指定时取集合中片段的开头作为问题")
+    parser.add_argument("--backend", default=os.getenv("RERANKER_BACKEND", "onnx"), choices=RERANKER_BACKENDS)
+    parser.add_argument("--onnx-file", default=os.getenv("RERANKER_ONNX_FILE"))
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=50, help="最多使用的问题数")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            query_list = [line.strip() for line in f if line.strip()]
+    else:
+        from app.services.document_service import DocumentService
+        sample = DocumentService().client.get_collection(args.collection).get(
+            limit=args.limit, include=["documents"]
+        )
+        query_list = [text[:40] for text in sample["documents"] if text]
+
+    benchmark(args.collection, query_list[:args.limit], args.backend, args.onnx_file, args.candidates, args.top_n)
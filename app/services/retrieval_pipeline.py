@@ -0,0 +1,305 @@
+"""
+检索管道
+将 混合检索 -> Rerank 重排序 -> 文本清洗 -> 上下文拼接 封装为可复用对象，
+每个集合构建一次并缓存，每个问题只执行一次检索流程；
+多集合问答时各集合并发检索，全局融合后统一重排序
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.fusion import rrf_fuse
+from app.services.hybrid_retriever import HybridRetriever, doc_key, mark_stalled, submit_unless_stalled
+from app.services.text_normalizer import normalized_documents
+
+
+_collection_executor: Optional[ThreadPoolExecutor] = None
+_collection_executor_lock = threading.Lock()
+
+
+def _get_collection_executor() -> ThreadPoolExecutor:
+    """
+    多集合并发检索的线程池
+    与子检索器线程池分开：集合任务会等待子检索器任务完成，共用一个池在集合较多时可能互相占满
+    """
+    global _collection_executor
+    if _collection_executor is None:
+        with _collection_executor_lock:
+            if _collection_executor is None:
+                _collection_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("MULTI_COLLECTION_WORKERS", "8")),
+                    thread_name_prefix="collection"
+                )
+    return _collection_executor
+
+
+class VectorRetriever:
+    """向量检索器：查询向量由外部提供（可经过缓存），再按向量检索 Chroma"""
+
+    def __init__(self, vectorstore, embed_query: Callable[[str], List[float]], k: int = 5):
+        """
+        Args:
+            vectorstore: Chroma 向量库实例
+            embed_query: 计算查询向量的函数
+            k: 检索结果数量
+        """
+        self.vectorstore = vectorstore
+        self.embed_query = embed_query
+        self.k = k
+
+    def invoke(self, query: str) -> List[Document]:
+        embedding = self.embed_query(query)
+        return self.vectorstore.similarity_search_by_vector(embedding, k=self.k)
+
+    def invoke_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        """返回 (文档, 分数)，Chroma 返回的是距离，取负数使分数越大越相关"""
+        embedding = self.embed_query(query)
+        pairs = self.vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=self.k)
+        return [(doc, -distance) for doc, distance in pairs]
+
+
+class RetrievalResult:
+    """一次检索的结果：候选文档、重排序后的文档和拼接好的提示词上下文"""
+
+    def __init__(self, candidates: List[Document], docs: List[Document], context: str):
+        self.candidates = candidates
+        self.docs = docs
+        self.context = context
+
+    @property
+    def sources(self) -> List[str]:
+        """去重后的来源列表"""
+        return list(set(doc.metadata.get("source", "未知来源") for doc in self.docs))
+
+
+class RetrievalPipeline:
+    """单个集合的检索管道"""
+
+    def __init__(
+        self,
+        document_service,
+        collection_name: str,
+        rerank_func: Optional[Callable] = None,
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+        vector_k: int = 5,
+        bm25_k: int = 5,
+        top_n: int = 3,
+        rrf_k: int = 60,
+        fusion: str = "rrf",
+        weights: Optional[Sequence[float]] = None,
+        candidate_k: Optional[int] = None
+    ):
+        """
+        Args:
+            document_service: DocumentService 实例，用于获取向量库和 BM25 索引
+            collection_name: 集合名称
+            rerank_func: 重排序函数 (query, docs, top_n, retriever_results) -> docs，
+                         retriever_results 为各检索器的 (文档, 分数) 列表（非混合检索时为 None）
+            embed_query: 计算查询向量的函数（默认使用嵌入模型直接计算）
+            vector_k: 向量检索返回数量
+            bm25_k: BM25 检索返回数量
+            top_n: 重排序后保留的文档数量
+            rrf_k: RRF 平滑常数
+            fusion: 融合方法，"rrf" 或 "linear"
+            weights: (向量检索权重, BM25 权重)
+            candidate_k: 融合后送入重排序的候选数量（默认全部）
+        """
+        self.document_service = document_service
+        self.collection_name = collection_name
+        self.rerank_func = rerank_func
+        self.embed_query = embed_query
+        self.vector_k = vector_k
+        self.bm25_k = bm25_k
+        self.top_n = top_n
+        self.rrf_k = rrf_k
+        self.fusion = fusion
+        self.weights = weights
+        self.candidate_k = candidate_k
+
+    def _build_retrievers(self):
+        """获取向量检索器和混合检索器（BM25 索引为空时退化为纯向量检索）"""
+        vectorstore = self.document_service.get_vectorstore(self.collection_name)
+        embed_query = self.embed_query or self.document_service.embeddings.embed_query
+        vector_retriever = VectorRetriever(vectorstore, embed_query, k=self.vector_k)
+        bm25_retriever = self.document_service.get_bm25_retriever(self.collection_name, k=self.bm25_k)
+
+        if bm25_retriever:
+            retriever = HybridRetriever(
+                retrievers=[vector_retriever, bm25_retriever],
+                k=self.rrf_k,
+                weights=self.weights,
+                method=self.fusion,
+                top_k=self.candidate_k,
+                name=self.collection_name
+            )
+        else:
+            retriever = vector_retriever
+        return vector_retriever, retriever
+
+    @staticmethod
+    def _clean_docs(docs: List[Document]) -> List[Document]:
+        """清洗检索到的片段：入库时已清洗的片段直接使用，历史存量片段返回清洗后的副本"""
+        return normalized_documents(docs)
+
+    @staticmethod
+    def format_docs(docs: List[Document]) -> str:
+        """将文档拼接为提示词上下文"""
+        return "\n\n".join(doc.page_content for doc in docs)
+
+    def retrieve(self, question: str) -> Tuple[List[Document], Optional[List]]:
+        """
+        混合检索候选文档（不重排序）
+
+        Args:
+            question: 用户问题
+
+        Returns:
+            (融合后的候选文档, 各检索器的 (文档, 分数) 列表或 None)
+        """
+        vector_retriever, retriever = self._build_retrievers()
+
+        # 保留各检索器的原始结果，供自适应重排序判断一致性
+        retriever_results = None
+        try:
+            if isinstance(retriever, HybridRetriever):
+                retriever_results = retriever.retrieve_all(question)
+                candidates = retriever.fuse(retriever_results)
+            else:
+                candidates = retriever.invoke(question)
+        except Exception as e:
+            print(f"[ERROR] 检索候选文档失败：{str(e)}")
+            # 降级到纯向量检索
+            candidates = vector_retriever.invoke(question)
+        return candidates, retriever_results
+
+    def run(self, question: str) -> RetrievalResult:
+        """
+        执行一次完整检索：混合检索 -> 重排序 -> 清洗 -> 拼接上下文
+
+        Args:
+            question: 用户问题
+
+        Returns:
+            RetrievalResult 实例
+        """
+        # 1. 检索相关文档候选集
+        candidates, retriever_results = self.retrieve(question)
+
+        # 2. Rerank 重排序
+        if self.rerank_func:
+            docs = self.rerank_func(question, candidates, top_n=self.top_n, retriever_results=retriever_results)
+        else:
+            docs = candidates[:self.top_n]
+
+        # 3. 清洗并拼接上下文
+        docs = self._clean_docs(docs)
+        return RetrievalResult(candidates, docs, self.format_docs(docs))
+
+
+class MultiCollectionPipeline:
+    """
+    多集合检索管道：各集合的混合检索并发执行（每个集合有独立超时），
+    各集合的候选列表再做一次全局 RRF 融合，最后统一重排序
+
+    - MULTI_COLLECTION_WORKERS：并发检索集合的线程数（默认 8）
+    - MULTI_COLLECTION_TIMEOUT：每个集合的检索超时，单位秒（默认 8），超时的集合被跳过
+
+    超时的集合检索无法中途取消，会继续占用线程直到返回；在它结束之前该集合不再提交新的检索
+    """
+
+    def __init__(
+        self,
+        pipelines: List[RetrievalPipeline],
+        rerank_func: Optional[Callable] = None,
+        top_n: int = 3,
+        candidate_k: Optional[int] = None,
+        rrf_k: int = 60,
+        timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            pipelines: 各集合的检索管道
+            rerank_func: 重排序函数
+            top_n: 重排序后保留的文档数量
+            candidate_k: 全局融合后送入重排序的候选数量（默认全部）
+            rrf_k: RRF 平滑常数
+            timeout: 每个集合的检索超时
+        """
+        self.pipelines = pipelines
+        self.rerank_func = rerank_func
+        self.top_n = top_n
+        self.candidate_k = candidate_k
+        self.rrf_k = rrf_k
+        self.timeout = timeout if timeout is not None else float(os.getenv("MULTI_COLLECTION_TIMEOUT", "8"))
+
+    def _retrieve_all(self, question: str) -> List[List[Document]]:
+        """并发检索所有集合，超时、失败或上一次超时仍未结束的集合返回空列表"""
+        executor = _get_collection_executor()
+        start = time.time()
+        keys = [("collection", pipeline.collection_name) for pipeline in self.pipelines]
+        futures = [
+            submit_unless_stalled(executor, key, pipeline.retrieve, question)
+            for key, pipeline in zip(keys, self.pipelines)
+        ]
+
+        results: List[List[Document]] = []
+        for pipeline, key, future in zip(self.pipelines, keys, futures):
+            if future is None:
+                print(f"[WARN] 集合 {pipeline.collection_name} 上一次超时的检索仍未结束，已跳过")
+                results.append([])
+                continue
+            remaining = max(0.0, self.timeout - (time.time() - start))
+            try:
+                candidates, _ = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                mark_stalled(key, future)
+                print(f"[WARN] 集合 {pipeline.collection_name} 检索超时（{self.timeout}s），已跳过")
+                candidates = []
+            except Exception as e:
+                print(f"[WARN] 集合 {pipeline.collection_name} 检索失败: {str(e)}")
+                candidates = []
+            for doc in candidates:
+                doc.metadata["collection"] = pipeline.collection_name
+            results.append(candidates)
+        return results
+
+    def run(self, question: str) -> RetrievalResult:
+        """
+        执行一次多集合检索：并发检索 -> 全局融合 -> 重排序 -> 清洗 -> 拼接上下文
+
+        Args:
+            question: 用户问题
+
+        Returns:
+            RetrievalResult 实例
+        """
+        results = self._retrieve_all(question)
+
+        # 全局融合：每个集合的候选列表作为一路排名
+        doc_map = {}
+        id_lists = []
+        for candidates in results:
+            ids = []
+            for doc in candidates:
+                key = doc_key(doc)
+                doc_map.setdefault(key, doc)
+                ids.append(key)
+            id_lists.append(ids)
+        fused_ids, _ = rrf_fuse(id_lists, k=self.rrf_k)
+        if self.candidate_k:
+            fused_ids = fused_ids[:self.candidate_k]
+        candidates = [doc_map[key] for key in fused_ids]
+
+        # 各集合的排名不可直接比较一致性，始终完整重排序
+        if self.rerank_func:
+            docs = self.rerank_func(question, candidates, top_n=self.top_n)
+        else:
+            docs = candidates[:self.top_n]
+
+        docs = RetrievalPipeline._clean_docs(docs)
+        return RetrievalResult(candidates, docs, RetrievalPipeline.format_docs(docs))
+
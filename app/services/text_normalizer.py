@@ -0,0 +1,75 @@
+"""
+文本规范化
+入库和检索共用的中文空白清洗，正则只编译一次：
+- 删除中文与中文、中文与英文/数字之间的空白（PDF 解析常见的 "中 文" -> "中文"）
+- 三个及以上连续换行压缩为两个，去掉首尾空白
+
+入库时清洗后在片段元数据中写入 normalized_version，检索时已清洗过的片段直接跳过
+"""
+import re
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+
+# 规范化规则的版本号：规则变化时递增，旧版本清洗的片段会在检索时重新清洗
+NORMALIZER_VERSION = 1
+VERSION_KEY = "normalized_version"
+
+_CJK = r"\u4e00-\u9fa5"
+
+# 只看空白两侧的字符：中文-中文、中文-英文/数字、英文/数字-中文，一次扫描完成
+_SPACE_PATTERN = re.compile(
+    rf"(?<=[{_CJK}])\s+(?=[{_CJK}a-zA-Z0-9])|(?<=[a-zA-Z0-9])\s+(?=[{_CJK}])"
+)
+_NEWLINES_PATTERN = re.compile(r"\n{3,}")
+
+
+def normalize_text(text: str) -> str:
+    """
+    清洗一段文本
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        清洗后的文本
+    """
+    text = _SPACE_PATTERN.sub("", text)
+    text = _NEWLINES_PATTERN.sub("\n\n", text)
+    return text.strip()
+
+
+def is_normalized(metadata: Dict) -> bool:
+    """片段是否已按当前规则清洗过"""
+    return bool(metadata) and metadata.get(VERSION_KEY) == NORMALIZER_VERSION
+
+
+def normalize_document(doc: Document) -> Document:
+    """清洗文档内容并写入版本标记（原地修改，供入库时使用）"""
+    doc.page_content = normalize_text(doc.page_content)
+    doc.metadata[VERSION_KEY] = NORMALIZER_VERSION
+    return doc
+
+
+def normalized_documents(docs: List[Document]) -> List[Document]:
+    """
+    检索结果清洗：已清洗的片段原样返回，其余片段返回清洗后的副本，不修改传入的文档
+
+    Args:
+        docs: 检索到的文档列表
+
+    Returns:
+        清洗后的文档列表（顺序不变）
+    """
+    result = []
+    for doc in docs:
+        if is_normalized(doc.metadata):
+            result.append(doc)
+        else:
+            result.append(Document(
+                page_content=normalize_text(doc.page_content),
+                metadata=doc.metadata,
+                id=doc.id
+            ))
+    return result
@@ -0,0 +1,170 @@
+"""
+基于 token 偏移量的文本分割器
+每页文本只用快速分词器编码一次，借助 offset_mapping 以二分查找计算任意区间的 token 数，
+切分规则与 RecursiveCharacterTextSplitter（keep_separator=True）保持一致，
+避免在每个候选片段和每次合并时重复调用分词器
+"""
+import copy
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+class _TokenizedText:
+    """一页文本及其 token 起始偏移量"""
+
+    def __init__(self, text: str, token_starts: List[int]):
+        self.text = text
+        self.token_starts = token_starts
+
+    def token_count(self, start: int, end: int) -> int:
+        """区间 [start, end) 内起始的 token 数量"""
+        return bisect_left(self.token_starts, end) - bisect_left(self.token_starts, start)
+
+
+class TokenAwareTextSplitter:
+    """
+    按 token 预算切分文本的递归分割器
+
+    - 按分隔符从强到弱递归切分（分隔符保留在下一段开头）
+    - 小于 chunk_size 的片段按 chunk_size / chunk_overlap 合并
+    - 所有长度均以 bge 分词器的 token 数计算
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        separators: Optional[List[str]] = None,
+        chunk_size: int = 480,
+        chunk_overlap: int = 80
+    ):
+        """
+        Args:
+            tokenizer: HuggingFace 快速分词器（需支持 return_offsets_mapping）
+            separators: 分隔符列表（优先级从高到低）
+            chunk_size: 单块最大 tokens
+            chunk_overlap: 相邻块的重叠 tokens
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) 不能大于 chunk_size ({chunk_size})")
+        self.tokenizer = tokenizer
+        self.separators = separators or ["\n\n", "\n", " ", ""]
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def _tokenize(self, texts: List[str]) -> List[_TokenizedText]:
+        """批量编码（快速分词器在 Rust 端并行处理整批文本）"""
+        if not texts:
+            return []
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )
+        return [
+            _TokenizedText(text, [start for start, _ in offsets])
+            for text, offsets in zip(texts, encoded["offset_mapping"])
+        ]
+
+    def _split_by_separator(self, text: str, start: int, end: int, separator: str) -> List[Tuple[int, int]]:
+        """按分隔符切分区间，分隔符保留在下一段开头，并去掉空区间"""
+        if separator == "":
+            return [(i, i + 1) for i in range(start, end)]
+        bounds = [start]
+        pos = text.find(separator, start, end)
+        while pos != -1:
+            bounds.append(pos)
+            pos = text.find(separator, pos + len(separator), end)
+        bounds.append(end)
+        return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+    @staticmethod
+    def _join(tokenized: _TokenizedText, spans: List[Tuple[int, int]]) -> Optional[str]:
+        """相邻区间在原文中连续，直接取首尾之间的文本"""
+        text = tokenized.text[spans[0][0]:spans[-1][1]].strip()
+        return text or None
+
+    def _merge_spans(self, tokenized: _TokenizedText, spans: List[Tuple[int, int]], lengths: List[int]) -> List[str]:
+        """将小区间合并为不超过 chunk_size 的块，并保留 chunk_overlap 的重叠"""
+        chunks = []
+        current: List[Tuple[int, int]] = []
+        current_lengths: List[int] = []
+        total = 0
+        for span, length in zip(spans, lengths):
+            if total + length > self.chunk_size and current:
+                chunk = self._join(tokenized, current)
+                if chunk is not None:
+                    chunks.append(chunk)
+                # 从头部移除区间，直到剩余部分满足重叠要求
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= current_lengths[0]
+                    current = current[1:]
+                    current_lengths = current_lengths[1:]
+            current.append(span)
+            current_lengths.append(length)
+            total += length
+        if current:
+            chunk = self._join(tokenized, current)
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    def _split_span(self, tokenized: _TokenizedText, start: int, end: int, separators: List[str]) -> List[str]:
+        """递归切分区间 [start, end)"""
+        text = tokenized.text
+
+        # 选择区间中出现的第一个分隔符
+        separator = separators[-1]
+        remaining: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        final_chunks: List[str] = []
+        good_spans: List[Tuple[int, int]] = []
+        good_lengths: List[int] = []
+        for span in self._split_by_separator(text, start, end, separator):
+            length = tokenized.token_count(*span)
+            if length < self.chunk_size:
+                good_spans.append(span)
+                good_lengths.append(length)
+                continue
+            if good_spans:
+                final_chunks.extend(self._merge_spans(tokenized, good_spans, good_lengths))
+                good_spans, good_lengths = [], []
+            if not remaining:
+                # 没有更弱的分隔符：与 RecursiveCharacterTextSplitter 一致，原样保留整段
+                final_chunks.append(text[span[0]:span[1]])
+            else:
+                final_chunks.extend(self._split_span(tokenized, span[0], span[1], remaining))
+        if good_spans:
+            final_chunks.extend(self._merge_spans(tokenized, good_spans, good_lengths))
+        return final_chunks
+
+    def split_text(self, text: str) -> List[str]:
+        """切分单段文本"""
+        tokenized = self._tokenize([text])[0]
+        return self._split_span(tokenized, 0, len(text), self.separators)
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        切分文档列表（所有页面一次性批量编码）
+
+        Args:
+            documents: 原始文档列表
+
+        Returns:
+            切分后的文档块列表，元数据复制自所属页面
+        """
+        tokenized_pages = self._tokenize([doc.page_content for doc in documents])
+        chunks = []
+        for doc, tokenized in zip(documents, tokenized_pages):
+            for text in self._split_span(tokenized, 0, len(tokenized.text), self.separators):
+                chunks.append(Document(page_content=text, metadata=copy.deepcopy(doc.metadata)))
+        return chunks
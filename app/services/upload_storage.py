@@ -0,0 +1,102 @@
+"""
+上传文件落盘
+按固定大小分块读取上传内容，边读边计算 SHA-256 并写入临时文件，
+文件 I/O 放到线程池执行，不阻塞事件循环；整个文件不会一次性读入内存
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+from typing import BinaryIO, Optional, Tuple
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小上限"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"文件大小超过上限（{max_bytes} 字节）")
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算已有文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadSpooler:
+    """
+    上传文件分块落盘
+
+    - UPLOAD_CHUNK_SIZE：每次读取和写入的字节数（默认 1 MB）
+    - UPLOAD_MAX_BYTES：单个文件大小上限，超出时拒绝（默认 200 MB，0 表示不限制）
+    """
+
+    def __init__(self, chunk_size: Optional[int] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            chunk_size: 分块大小（字节）
+            max_bytes: 文件大小上限（字节）
+        """
+        self.chunk_size = chunk_size or int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("UPLOAD_MAX_BYTES", str(200 * 1024 * 1024))
+        )
+
+    def check_size(self, size: Optional[int]):
+        """请求已声明文件大小时提前拒绝超限文件"""
+        if self.max_bytes and size is not None and size > self.max_bytes:
+            raise UploadTooLargeError(self.max_bytes)
+
+    async def spool(self, upload, file_path: str) -> Tuple[str, int, str]:
+        """
+        把上传内容分块写入 file_path 旁的临时文件
+
+        Args:
+            upload: FastAPI UploadFile（或任何带 async read(size) 的对象）
+            file_path: 最终保存路径，临时文件为 file_path 加随机后缀（同名文件并发上传互不干扰）
+
+        Returns:
+            (临时文件路径, 文件字节数, SHA-256 十六进制摘要)
+
+        Raises:
+            UploadTooLargeError: 文件超过大小上限（临时文件已删除）
+        """
+        loop = asyncio.get_running_loop()
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+
+        f: BinaryIO = await loop.run_in_executor(None, open, tmp_path, "wb")
+        try:
+            while True:
+                block = await upload.read(self.chunk_size)
+                if not block:
+                    break
+                size += len(block)
+                if self.max_bytes and size > self.max_bytes:
+                    raise UploadTooLargeError(self.max_bytes)
+                digest.update(block)
+                await loop.run_in_executor(None, f.write, block)
+        except BaseException:
+            await loop.run_in_executor(None, f.close)
+            await loop.run_in_executor(None, self.discard, tmp_path)
+            raise
+        await loop.run_in_executor(None, f.close)
+        return tmp_path, size, digest.hexdigest()
+
+    @staticmethod
+    def commit(tmp_path: str, file_path: str):
+        """临时文件原子替换为最终文件"""
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def discard(tmp_path: str):
+        """删除临时文件"""
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
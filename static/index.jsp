@@ -468,10 +468,13 @@
                         
                 const result = await response.json();
                         
-                if (response.ok) {
-                    uploadStatus.innerHTML = `<div class="success">文档上传成功<br>已切分为 ${result.chunks_count} 个片段</div>`;
-                    // 显示查看片段按钮
+                if (response.ok && result.status === 'unchanged') {
+                    // 内容与已入库的文档完全相同，服务端未创建入库任务
+                    uploadStatus.innerHTML = `<div class="success">文档内容未变化，无需重新处理<br>已有 ${result.chunks_count} 个片段</div>`;
                     document.getElementById('viewChunksSection').style.display = 'block';
+                } else if (response.ok) {
+                    // 上传成功后轮询后台入库任务进度
+                    await pollIngestionJob(result.job_id);
                 } else {
                     uploadStatus.innerHTML = `<div class="error">上传失败：${result.detail || '未知错误'}</div>`;
                 }
@@ -479,6 +482,39 @@
                 uploadStatus.innerHTML = `<div class="error">上传出错：${error.message}</div>`;
             }
         }
+        
+        // 轮询入库任务状态，直到处理完成或失败
+        async function pollIngestionJob(jobId) {
+            const stageNames = {
+                queued: '排队中',
+                loading: '正在解析文档',
+                embedding: '正在向量化',
+                indexing: '正在更新索引',
+                done: '处理完成'
+            };
+            while (true) {
+                const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+                const job = await response.json();
+                if (!response.ok) {
+                    uploadStatus.innerHTML = `<div class="error">查询进度失败：${job.detail || '未知错误'}</div>`;
+                    return;
+                }
+                if (job.status === 'succeeded') {
+                    const r = job.result;
+                    uploadStatus.innerHTML = `<div class="success">文档上传成功<br>已切分为 ${r.chunks_count} 个片段<br>新增 ${r.chunks_added}，删除 ${r.chunks_removed}，未变化 ${r.chunks_unchanged}</div>`;
+                    // 显示查看片段按钮
+                    document.getElementById('viewChunksSection').style.display = 'block';
+                    return;
+                }
+                if (job.status === 'failed') {
+                    uploadStatus.innerHTML = `<div class="error">处理失败：${job.error || '未知错误'}</div>`;
+                    return;
+                }
+                const progress = job.chunks_total > 0 ? `（${job.chunks_processed}/${job.chunks_total} 个片段）` : '';
+                uploadStatus.innerHTML = `<div class="loading">${stageNames[job.stage] || job.stage}${progress}...</div>`;
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+        }
                 
         // 打开新页面查看文档片段
         function openChunksViewerPage() {
@@ -538,7 +574,8 @@
             sourcesArea.style.display = 'none';
             
             try {
-                const response = await fetch(`${API_BASE}/ask`, {
+                // 使用流式接口：先收到来源，再逐步渲染生成的答案
+                const response = await fetch(`${API_BASE}/ask/stream`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json'
@@ -549,19 +586,50 @@
                     })
                 });
                 
-                const result = await response.json();
+                if (!response.ok) {
+                    const result = await response.json();
+                    answerContent.innerHTML = `<div class="error">问答失败：${result.detail || '未知错误'}</div>`;
+                    return;
+                }
                 
-                if (response.ok) {
-                    answerContent.textContent = result.answer;
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder('utf-8');
+                let buffer = '';
+                let answer = '';
+                
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
                     
-                    if (result.sources && result.sources.length > 0) {
-                        sourcesList.innerHTML = result.sources.map(source => 
-                            `<div class="source-item">${source}</div>`
-                        ).join('');
-                        sourcesArea.style.display = 'block';
+                    // SSE 事件以空行分隔
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const rawEvent = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+                        
+                        let eventName = 'message';
+                        let data = '';
+                        for (const line of rawEvent.split('\n')) {
+                            if (line.startsWith('event: ')) eventName = line.slice(7);
+                            else if (line.startsWith('data: ')) data += line.slice(6);
+                        }
+                        const payload = data ? JSON.parse(data) : {};
+                        
+                        if (eventName === 'sources') {
+                            if (payload.sources && payload.sources.length > 0) {
+                                sourcesList.innerHTML = payload.sources.map(source => 
+                                    `<div class="source-item">${source}</div>`
+                                ).join('');
+                                sourcesArea.style.display = 'block';
+                            }
+                        } else if (eventName === 'token') {
+                            answer += payload.content;
+                            answerContent.textContent = answer;
+                        } else if (eventName === 'error') {
+                            answerContent.innerHTML = `<div class="error">问答失败：${payload.message || '未知错误'}</div>`;
+                        }
                     }
-                } else {
-                    answerContent.innerHTML = `<div class="error">问答失败：${result.detail || '未知错误'}</div>`;
                 }
             } catch (error) {
                 answerContent.innerHTML = `<div class="error">请求出错：${error.message}</div>`;
@@ -0,0 +1,133 @@
+"""
+测试公共夹具
+嵌入模型和分词器用确定性的假模型代替（不下载、不加载模型权重），
+Chroma、BM25 索引和文档清单都写入每个测试自己的临时目录
+"""
+import hashlib
+import math
+import os
+import re
+import sys
+import time
+
+import pytest
+
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+# 中文单字、英文/数字串、其余单个标点各算一个 token（空白不算）
+_TOKEN_PATTERN = re.compile(r"[一-龥]|[A-Za-z0-9]+|[^\sA-Za-z0-9一-龥]")
+
+
+class FakeTokenizer:
+    """接口与 HuggingFace 快速分词器一致的简易分词器"""
+
+    is_fast = True
+
+    def encode(self, text, add_special_tokens=False):
+        return [hash(m.group()) % 30000 for m in _TOKEN_PATTERN.finditer(text)]
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        single = isinstance(texts, str)
+        batch = [texts] if single else texts
+        offsets = [[(m.start(), m.end()) for m in _TOKEN_PATTERN.finditer(text)] for text in batch]
+        ids = [[0] * len(item) for item in offsets]
+        result = {"input_ids": ids[0] if single else ids}
+        if return_offsets_mapping:
+            result["offset_mapping"] = offsets[0] if single else offsets
+        return result
+
+
+def fake_vector(text, dim=32):
+    """词袋哈希向量（归一化），相同文本得到相同向量"""
+    vector = [0.0] * dim
+    for m in _TOKEN_PATTERN.finditer(text):
+        vector[int(hashlib.md5(m.group().encode("utf-8")).hexdigest(), 16) % dim] += 1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class FakeEmbeddings:
+    """LangChain 嵌入模型接口，记录调用次数"""
+
+    def __init__(self):
+        self.documents_embedded = 0
+        self.queries_embedded = 0
+
+    def embed_documents(self, texts):
+        self.documents_embedded += len(texts)
+        return [fake_vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.queries_embedded += 1
+        return fake_vector(text)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """把进程内共享的模型注册表替换为假模型（Reranker 视为不可用）"""
+    from app.services.model_registry import model_registry
+
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(model_registry, "_embeddings", embeddings)
+    monkeypatch.setattr(model_registry, "_tokenizer", FakeTokenizer())
+    monkeypatch.setattr(model_registry, "_reranker", False)
+    return embeddings
+
+
+@pytest.fixture
+def document_service(fake_models, tmp_path, monkeypatch):
+    """在临时目录中工作的 DocumentService（单进程向量化和解析）"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EMBED_PROCESSES", "0")
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "0")
+    from app.services.document_service import DocumentService
+
+    from app.services import chroma_pool
+    from chromadb.api.client import SharedSystemClient
+
+    service = DocumentService()
+    yield service
+    service.shutdown()
+    # Chroma 按传入的（相对）路径缓存客户端，切换工作目录后需要清空，下一个测试才会打开自己的数据目录
+    chroma_pool._clients.clear()
+    SharedSystemClient.clear_system_cache()
+
+
+@pytest.fixture
+def api(fake_models, tmp_path, monkeypatch):
+    """
+    在临时目录中启动的 FastAPI 应用（TestClient，执行生命周期）
+    app.main 在导入时创建服务实例，每个测试重新导入
+    """
+    from fastapi.testclient import TestClient
+    from app.services import chroma_pool
+    from chromadb.api.client import SharedSystemClient
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "static").mkdir()
+    monkeypatch.setenv("EMBED_PROCESSES", "0")
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "0")
+    monkeypatch.setenv("WARMUP_MODELS", "0")
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    sys.modules.pop("app.main", None)
+    import app.main as main
+
+    with TestClient(main.app) as client:
+        client.main = main
+        yield client
+    main.ingestion_jobs.shutdown(wait=True)
+    sys.modules.pop("app.main", None)
+    chroma_pool._clients.clear()
+    SharedSystemClient.clear_system_cache()
+
+
+def wait_for_job(client, job_id, timeout=30):
+    """轮询 /api/jobs/{job_id} 直到任务结束，返回任务状态"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"任务 {job_id} 未在 {timeout}s 内结束")
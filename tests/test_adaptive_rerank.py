@@ -0,0 +1,84 @@
+"""自适应重排序：各检索器结果一致时跳过 Cross-Encoder，部分一致时只重排序靠前的候选"""
+import pytest
+from langchain_core.documents import Document
+
+from app.services.model_registry import model_registry
+from app.services.qa_service import QAService
+from tests.test_reranker_engine import FakeCrossEncoder
+
+
+def doc(chunk_id):
+    return Document(page_content=chunk_id * (ord(chunk_id) - ord("a") + 1), metadata={"chunk_id": chunk_id})
+
+
+def ranked(*chunk_ids):
+    return [(doc(chunk_id), -float(rank)) for rank, chunk_id in enumerate(chunk_ids)]
+
+
+@pytest.fixture
+def cross_encoder(monkeypatch):
+    model = FakeCrossEncoder()
+    monkeypatch.setattr(model_registry, "_reranker", model)
+    return model
+
+
+@pytest.fixture
+def qa_service(document_service, cross_encoder, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setenv("RERANK_ADAPTIVE", "1")
+    monkeypatch.setenv("RERANK_SKIP_AGREEMENT", "1.0")
+    monkeypatch.setenv("RERANK_SHRINK_AGREEMENT", "0.5")
+    return QAService(document_service=document_service)
+
+
+def test_agreeing_retrievers_skip_the_model(qa_service, cross_encoder):
+    candidates = [doc(c) for c in "abcdef"]
+
+    docs = qa_service._rerank_documents("问题", candidates, top_n=2, retriever_results=[ranked("a", "b"), ranked("b", "a")])
+
+    assert docs == candidates[:2]
+    assert cross_encoder.calls == []
+    assert qa_service.cache_stats()["rerank_adaptive"]["skipped"] == 1
+
+
+def test_partial_agreement_reranks_only_leading_candidates(qa_service, cross_encoder):
+    candidates = [doc(c) for c in "abcdef"]
+
+    docs = qa_service._rerank_documents("问题", candidates, top_n=2, retriever_results=[ranked("a", "b"), ranked("a", "c")])
+
+    # 只有融合排序前 2 * top_n 个候选送入模型（分数为片段长度）
+    assert sorted(cross_encoder.calls[0]) == sorted(d.page_content for d in candidates[:4])
+    assert [d.metadata["chunk_id"] for d in docs] == ["d", "c"]
+
+
+def test_disagreeing_retrievers_rerank_every_candidate(qa_service, cross_encoder):
+    candidates = [doc(c) for c in "abcdef"]
+
+    docs = qa_service._rerank_documents("问题", candidates, top_n=2, retriever_results=[ranked("a", "b"), ranked("c", "d")])
+
+    assert len(cross_encoder.calls[0]) == 6
+    assert [d.metadata["chunk_id"] for d in docs] == ["f", "e"]
+
+
+def test_disabled_policy_always_calls_the_model(document_service, cross_encoder, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setenv("RERANK_ADAPTIVE", "0")
+    qa_service = QAService(document_service=document_service)
+
+    qa_service._rerank_documents("问题", [doc("a"), doc("b")], top_n=1, retriever_results=[ranked("a"), ranked("a")])
+
+    assert len(cross_encoder.calls) == 1
+
+
+def test_pipeline_passes_retriever_results_to_the_policy(qa_service, cross_encoder, tmp_path):
+    for i, text in enumerate(["检索片段一。", "检索片段二。", "检索片段三。"]):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(text, encoding="utf-8")
+        qa_service.document_service.ingest_document(str(path))
+
+    result = qa_service.get_pipeline("default").run("检索片段")
+
+    # 集合只有三个片段，向量检索和 BM25 的前 3 名完全一致，不调用模型
+    assert len(result.docs) == 3
+    assert cross_encoder.calls == []
+    assert qa_service.cache_stats()["rerank_adaptive"]["skipped"] == 1
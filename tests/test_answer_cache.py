@@ -0,0 +1,110 @@
+"""问答缓存：精确匹配（归一化问题）和语义匹配（问题向量），按集合版本和 TTL 失效"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.answer_cache import AnswerCache, normalize_question
+from app.services.qa_service import QAService
+from app.services.retrieval_pipeline import RetrievalPipeline
+
+
+RESULT = {"answer": "答案", "sources": ["a.txt"]}
+
+
+def embed(text):
+    # 两个维度：问题里有“检索”的落在第一维，其余落在第二维
+    return [1.0, 0.05] if "检索" in text else [0.0, 1.0]
+
+
+def test_normalization_ignores_width_case_spacing_and_trailing_punctuation():
+    assert normalize_question("  什么是  RAG？？ ") == normalize_question("什么是 rag") == "什么是 rag"
+    assert normalize_question("ＡＢＣ!") == "abc"
+
+
+def test_exact_hit_returns_a_copy():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0)
+    cache.put("default", 1, "什么是RAG？", RESULT)
+
+    cached, _ = cache.get("default", 1, "什么是rag")
+    cached["answer"] = "被修改"
+
+    assert cache.get("default", 1, "什么是RAG")[0] == RESULT
+    assert cache.stats()["exact_hits"] == 2
+
+
+def test_semantic_hit_requires_similarity_above_threshold():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.9)
+    cache.put("default", 1, "混合检索是什么", RESULT, embedding=embed("混合检索是什么"))
+
+    hit, vector = cache.get("default", 1, "介绍一下混合检索", embed_func=embed)
+    miss, _ = cache.get("default", 1, "怎么部署", embed_func=embed)
+
+    assert hit == RESULT and vector == embed("检索")
+    assert miss is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_entries_expire_and_do_not_cross_versions(monkeypatch):
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.9)
+    cache.put("default", 1, "混合检索", RESULT, embedding=embed("混合检索"))
+
+    assert cache.get("default", 2, "混合检索", embed_func=embed)[0] is None
+    assert cache.get("other", 1, "混合检索", embed_func=embed)[0] is None
+
+    now = time.time()
+    monkeypatch.setattr("app.services.answer_cache.time.time", lambda: now + 61)
+    assert cache.get("default", 1, "混合检索", embed_func=embed)[0] is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0)
+    cache.put("default", 1, "一", RESULT)
+    cache.put("default", 1, "二", RESULT)
+    cache.get("default", 1, "一")
+    cache.put("default", 1, "三", RESULT)
+
+    assert cache.get("default", 1, "二")[0] is None
+    assert cache.get("default", 1, "一")[0] == RESULT
+
+
+@pytest.fixture
+def qa_service(document_service, tmp_path, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    path = tmp_path / "guide.txt"
+    path.write_text("混合检索同时使用向量检索和关键词检索。", encoding="utf-8")
+    document_service.ingest_document(str(path))
+    return QAService(document_service=document_service)
+
+
+def test_repeated_question_is_answered_from_cache_until_collection_changes(qa_service, tmp_path, monkeypatch):
+    retrievals = []
+    retrieve = RetrievalPipeline.retrieve
+    monkeypatch.setattr(RetrievalPipeline, "retrieve", lambda self, q: retrievals.append(q) or retrieve(self, q))
+
+    first = asyncio.run(qa_service.answer_question("什么是混合检索？"))
+    second = asyncio.run(qa_service.answer_question("什么是混合检索"))
+    assert second == first
+    assert len(retrievals) == 1
+
+    other = tmp_path / "new.txt"
+    other.write_text("新文档。", encoding="utf-8")
+    qa_service.document_service.ingest_document(str(other))
+    asyncio.run(qa_service.answer_question("什么是混合检索"))
+    assert len(retrievals) == 2
+
+
+def test_fallback_answer_after_llm_failure_is_not_cached(qa_service):
+    class FailingClient:
+        def check_capacity(self):
+            pass
+
+        async def ainvoke(self, inputs):
+            raise RuntimeError("服务不可用")
+
+    qa_service.llm = object()
+    qa_service.llm_client = FailingClient()
+
+    asyncio.run(qa_service.answer_question("混合检索"))
+
+    assert qa_service.answer_cache.stats()["size"] == 0
@@ -0,0 +1,94 @@
+"""批量问答：解析 JSONL、整批检索与逐个检索结果一致、按输入顺序返回并复用问答缓存"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.batch_qa import BatchQARunner, parse_jsonl
+from app.services.qa_service import QAService
+
+
+TEXTS = {
+    "vector.txt": "向量检索把问题和片段编码为向量，按余弦相似度查找。",
+    "bm25.txt": "关键词检索使用 BM25 打分，适合专有名词。",
+    "rerank.txt": "重排序使用 Cross-Encoder 对候选片段重新打分。",
+}
+
+
+def test_parse_jsonl_accepts_objects_and_strings_and_skips_blank_lines():
+    items = parse_jsonl(['{"question": "甲", "id": 1}', "", '"乙"', '{"question": "丙", "collection_name": "c"}'])
+
+    assert items == [{"question": "甲", "id": 1}, {"question": "乙"}, {"question": "丙", "collection_name": "c"}]
+
+
+@pytest.mark.parametrize("line, message", [("{坏的", "第 2 行不是合法的 JSON"), ('{"id": 1}', "第 2 行缺少 question 字段")])
+def test_parse_jsonl_reports_the_offending_line(line, message):
+    with pytest.raises(ValueError, match=message):
+        parse_jsonl(['"好的"', line])
+
+
+@pytest.fixture
+def qa_service(document_service, tmp_path, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    for name, text in TEXTS.items():
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        document_service.ingest_document(str(path))
+    return QAService(document_service=document_service)
+
+
+def run_batch(runner, items):
+    async def run():
+        return [result async for result in runner.run(items)]
+    return asyncio.run(run())
+
+
+def test_batch_retrieval_matches_single_question_pipeline(qa_service):
+    questions = ["向量检索", "BM25 关键词", "重排序打分"]
+
+    batch = BatchQARunner(qa_service).retrieve_batch("default", questions)
+
+    pipeline = qa_service.get_pipeline("default")
+    for question, result in zip(questions, batch):
+        assert result.context == pipeline.run(question).context
+
+
+def test_results_keep_input_order_across_chunks(qa_service):
+    runner = BatchQARunner(qa_service, chunk_size=2)
+    items = [{"question": "向量检索", "id": "a"}, {"question": "  "}, {"question": "重排序"}, {"question": "BM25"}]
+
+    results = run_batch(runner, items)
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["id"] == "a"
+    assert results[1]["error"] == "问题不能为空"
+    assert all("answer" in r for r in results if r["index"] != 1)
+
+
+def test_repeated_questions_are_served_from_answer_cache(qa_service):
+    asyncio.run(qa_service.answer_question("向量检索"))
+    runner = BatchQARunner(qa_service, chunk_size=1)
+
+    results = run_batch(runner, [{"question": "向量检索"}, {"question": "重排序"}, {"question": "重排序"}])
+
+    assert [r["cached"] for r in results] == [True, False, True]
+    assert results[1]["answer"] == results[2]["answer"]
+
+
+def test_batch_endpoint_streams_ndjson(api):
+    lines = '{"question": "问题一", "id": 7}\n\n"问题二"\n'
+
+    response = api.post("/api/ask/batch", files={"file": ("q.jsonl", lines.encode("utf-8"))})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["index"], r["question"]) for r in results] == [(0, "问题一"), (1, "问题二")]
+    assert results[0]["id"] == 7
+
+
+def test_batch_endpoint_rejects_malformed_file(api):
+    response = api.post("/api/ask/batch", files={"file": ("q.jsonl", b'{"question": "ok"}\nnot json\n')})
+
+    assert response.status_code == 400
+    assert "第 2 行" in response.json()["detail"]
@@ -0,0 +1,166 @@
+"""BM25 索引：评分与 rank_bm25 一致、增量持久化、崩溃后的恢复"""
+import json
+import sqlite3
+import threading
+
+import pytest
+from rank_bm25 import BM25Okapi
+
+from app.services.bm25_index import BM25Index, BM25IndexManager, jieba_tokenizer
+
+
+CORPUS = {
+    "a": "向量数据库用于存储文档片段的嵌入向量",
+    "b": "BM25 是一种基于词频的关键词检索算法",
+    "c": "混合检索融合向量检索和关键词检索的结果",
+    "d": "文档切片后写入向量数据库和关键词索引",
+}
+
+
+def build(tmp_path, docs=CORPUS):
+    index = BM25Index(str(tmp_path / "bm25" / "default.sqlite3"))
+    index.add_documents(list(docs), list(docs.values()))
+    return index
+
+
+def stored_rows(index):
+    with sqlite3.connect(index.index_path) as conn:
+        return {doc_id: json.loads(tf) for doc_id, tf in conn.execute("SELECT id, tf FROM docs")}
+
+
+def test_scores_match_rank_bm25(tmp_path):
+    index = build(tmp_path)
+    reference = BM25Okapi([jieba_tokenizer(text) for text in CORPUS.values()])
+    query = "向量检索"
+
+    expected = dict(zip(CORPUS, reference.get_scores(jieba_tokenizer(query))))
+    for doc_id, score in index.search(query, k=4):
+        assert score == pytest.approx(expected[doc_id])
+
+
+def test_reload_restores_identical_rankings(tmp_path):
+    index = build(tmp_path)
+    index.save()
+    index.close()
+
+    reloaded = BM25Index(index.index_path)
+    reloaded.load()
+
+    assert len(reloaded) == len(CORPUS)
+    for query in ("向量数据库", "关键词检索算法"):
+        assert [doc_id for doc_id, _ in reloaded.search(query)] == [doc_id for doc_id, _ in index.search(query)]
+
+
+def test_save_writes_only_changed_documents(tmp_path):
+    index = build(tmp_path)
+    index.save()
+    # 直接改写磁盘上未变化片段的行：增量保存不应重写它
+    with sqlite3.connect(index.index_path) as conn:
+        conn.execute("UPDATE docs SET tf = ? WHERE id = 'a'", (json.dumps({"标记": 1}),))
+
+    index.add_documents(["e"], ["新增的片段"])
+    index.remove_documents(["b"])
+    index.save()
+
+    rows = stored_rows(index)
+    assert set(rows) == {"a", "c", "d", "e"}
+    assert rows["a"] == {"标记": 1}
+
+
+def test_save_without_changes_is_a_no_op(tmp_path):
+    index = build(tmp_path)
+    index.save()
+    index.close()
+    mtime = (tmp_path / "bm25" / "default.sqlite3").stat().st_mtime_ns
+
+    index.save()
+
+    assert (tmp_path / "bm25" / "default.sqlite3").stat().st_mtime_ns == mtime
+
+
+def test_manager_loads_other_collections_while_one_is_building(tmp_path):
+    manager = BM25IndexManager(str(tmp_path))
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        building.set()
+        assert release.wait(5)
+        return ["a"], [CORPUS["a"]]
+
+    worker = threading.Thread(target=manager.get, args=("big",), kwargs={"loader": slow_loader})
+    worker.start()
+    try:
+        assert building.wait(5)
+        # 冷加载大集合期间，其他集合的获取不被阻塞
+        loaded = []
+        other = threading.Thread(target=lambda: loaded.append(manager.get("small", loader=lambda: (["b"], [CORPUS["b"]]))))
+        other.start()
+        other.join(1)
+        assert len(loaded) == 1 and len(loaded[0]) == 1
+    finally:
+        release.set()
+        worker.join(5)
+    assert len(manager.get("big")) == 1
+
+
+def test_manager_builds_each_collection_once(tmp_path):
+    manager = BM25IndexManager(str(tmp_path))
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return list(CORPUS), list(CORPUS.values())
+
+    threads = [threading.Thread(target=manager.get, args=("default",), kwargs={"loader": loader}) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(manager.get("default")) == len(CORPUS)
+
+
+def long_document(paragraphs):
+    return "\n\n".join(f"第{i}段：" + "关键词检索与向量检索的混合排序。" * 30 for i in range(paragraphs))
+
+
+def test_ingest_persists_bm25_with_every_chroma_batch(document_service, tmp_path, monkeypatch):
+    monkeypatch.setenv("CHROMA_WRITE_BATCH", "2")
+    path = tmp_path / "doc.txt"
+    path.write_text(long_document(8), encoding="utf-8")
+
+    original = document_service._write_batch
+    batches = []
+
+    def failing_write(collection, ids, chunks, embed_stats):
+        if len(batches) == 1:
+            raise RuntimeError("进程中途退出")
+        batches.append(list(ids))
+        return original(collection, ids, chunks, embed_stats)
+
+    monkeypatch.setattr(document_service, "_write_batch", failing_write)
+    with pytest.raises(Exception, match="进程中途退出"):
+        document_service.ingest_document(str(path))
+
+    index = document_service.get_bm25_index("default")
+    assert set(stored_rows(index)) == set(batches[0])
+
+
+def test_reingest_rewrites_chunks_missing_from_bm25(document_service, tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text(long_document(4), encoding="utf-8")
+    first = document_service.ingest_document(str(path))
+    index = document_service.get_bm25_index("default")
+    ids = document_service.get_chunk_ids_by_source("default", [str(path)])
+    assert first["chunks_added"] == len(ids) > 1
+
+    # 模拟上次写入 Chroma 后、保存 BM25 前进程退出：向量库中有片段，索引中没有
+    index.remove_documents(ids[:1])
+    index.save()
+    second = document_service.ingest_document(str(path))
+
+    assert second["chunks_added"] == 1
+    assert second["chunks_unchanged"] == len(ids) - 1
+    assert all(chunk_id in index for chunk_id in ids)
@@ -0,0 +1,166 @@
+"""批量入库：压缩包解压的安全检查"""
+import os
+import zipfile
+
+import pytest
+
+from app.services import bulk_ingest
+from app.services.bulk_ingest import collect_files, extract_archive
+
+
+def make_zip(path, entries):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_extract_keeps_supported_documents_only(tmp_path):
+    zip_path = make_zip(tmp_path / "docs.zip", {"a/one.txt": "一", "two.pdf": b"%PDF", "image.png": b"x"})
+    dest = tmp_path / "out"
+
+    files = extract_archive(zip_path, str(dest))
+
+    assert files == sorted([os.path.normpath(str(dest / "a" / "one.txt")), os.path.normpath(str(dest / "two.pdf"))])
+    assert not (dest / "image.png").exists()
+
+
+def test_extract_rejects_path_traversal(tmp_path):
+    zip_path = make_zip(tmp_path / "evil.zip", {"../escape.txt": "x"})
+
+    with pytest.raises(ValueError, match="路径不合法"):
+        extract_archive(zip_path, str(tmp_path / "out"))
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_extract_rejects_declared_size_over_cap(tmp_path):
+    # 高压缩比的条目：压缩包很小，解压后远大于上限
+    zip_path = make_zip(tmp_path / "bomb.zip", {"big.txt": "0" * 100_000})
+    assert os.path.getsize(zip_path) < 1000
+
+    with pytest.raises(ValueError, match="大小超过上限"):
+        extract_archive(zip_path, str(tmp_path / "out"), max_bytes=10_000)
+    assert not (tmp_path / "out" / "big.txt").exists()
+
+
+def test_extract_aborts_when_written_bytes_exceed_cap(tmp_path, monkeypatch):
+    # 头部记录的大小可以伪造：解压前的检查通过后，按实际写入的字节数中止并清理
+    zip_path = make_zip(tmp_path / "liar.zip", {"a.txt": "a" * 3000, "b.txt": "b" * 3000})
+    monkeypatch.setattr(bulk_ingest, "_declared_size", lambda entries: 0)
+
+    with pytest.raises(ValueError, match="大小超过上限"):
+        extract_archive(zip_path, str(tmp_path / "out"), max_bytes=4000)
+    assert not (tmp_path / "out" / "a.txt").exists()
+    assert not (tmp_path / "out" / "b.txt").exists()
+
+
+def test_extract_rejects_too_many_entries(tmp_path):
+    zip_path = make_zip(tmp_path / "many.zip", {f"{i}.txt": "x" for i in range(5)})
+
+    with pytest.raises(ValueError, match="文档数超过上限"):
+        extract_archive(zip_path, str(tmp_path / "out"), max_files=4)
+
+
+def test_extract_rejects_non_zip(tmp_path):
+    path = tmp_path / "fake.zip"
+    path.write_bytes(b"not a zip")
+
+    with pytest.raises(ValueError, match="不是合法的 zip"):
+        extract_archive(str(path), str(tmp_path / "out"))
+
+
+def test_collect_files_walks_directory_in_sorted_order(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "2.txt").write_text("x")
+    (tmp_path / "1.docx").write_bytes(b"x")
+    (tmp_path / "skip.md").write_text("x")
+
+    assert collect_files(str(tmp_path)) == [str(tmp_path / "1.docx"), str(tmp_path / "b" / "2.txt")]
+
+
+def test_collect_files_rejects_unsupported_path(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("x")
+
+    with pytest.raises(ValueError, match="不支持的路径"):
+        collect_files(str(path))
+
+
+@pytest.fixture
+def in_process_bulk(document_service, monkeypatch):
+    """批量入库在当前进程中执行：解析用测试的文档服务，向量化用假模型"""
+    from concurrent.futures import ThreadPoolExecutor
+    from tests.conftest import fake_vector
+
+    monkeypatch.setattr(bulk_ingest, "_worker_service", document_service)
+    monkeypatch.setattr(bulk_ingest, "_encode_in_worker", lambda texts: [fake_vector(t) for t in texts])
+    monkeypatch.setattr(bulk_ingest.BulkIngestor, "_create_pool", lambda self: ThreadPoolExecutor(max_workers=1))
+    return document_service
+
+
+def write_docs(root, docs):
+    files = []
+    for name, text in docs.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        files.append(str(path))
+    return files
+
+
+def test_bulk_run_records_logical_sources(in_process_bulk, tmp_path):
+    service = in_process_bulk
+    docs = {"a.txt": "第一份文档的内容。", "sub/b.txt": "第二份文档的内容。"}
+    sources = [os.path.join("uploads", "批量", "a.txt"), os.path.join("uploads", "批量", "sub", "b.txt")]
+
+    first = write_docs(tmp_path / ".batch-1", docs)
+    stats = bulk_ingest.BulkIngestor(service, num_workers=1).run(first, "default", sources=sources)
+    assert stats["files_ingested"] == 2
+
+    manifest = service.get_manifest("default")
+    assert sorted(manifest.documents()) == sorted(sources)
+
+    # 同名压缩包再次上传时解压到另一个临时目录，按逻辑来源对比内容，未变化的文件全部跳过
+    second = write_docs(tmp_path / ".batch-2", docs)
+    stats = bulk_ingest.BulkIngestor(service, num_workers=1).run(second, "default", sources=sources)
+    assert stats["files_skipped"] == 2
+    assert stats["chunks_added"] == 0
+
+
+def test_submit_bulk_removes_cleanup_dir_when_job_ends(in_process_bulk, tmp_path):
+    from app.services.ingest_jobs import IngestionJobManager
+
+    extract_dir = tmp_path / ".batch-x"
+    files = write_docs(extract_dir, {"a.txt": "内容。"})
+    manager = IngestionJobManager(in_process_bulk, max_workers=1)
+    try:
+        job = manager.submit_bulk(
+            files,
+            name="x.zip",
+            sources=[os.path.join("uploads", "x", "a.txt")],
+            cleanup_dir=str(extract_dir)
+        )
+    finally:
+        manager.shutdown(wait=True)
+
+    assert job.status == "succeeded"
+    assert not extract_dir.exists()
+
+
+def test_bulk_rewrites_chunks_missing_from_bm25(in_process_bulk, tmp_path):
+    service = in_process_bulk
+    files = write_docs(tmp_path / "docs", {"a.txt": "第一段内容。\n\n" + "第二段内容。" * 200})
+    bulk_ingest.BulkIngestor(service, num_workers=1).run(files, "default")
+    ids = service.get_chunk_ids_by_source("default", files)
+    assert len(ids) > 1
+
+    # 模拟合并写入 Chroma 后、提交 BM25 索引和清单前进程退出
+    index = service.get_bm25_index("default")
+    index.remove_documents(ids[:1])
+    index.save()
+    service.get_manifest("default").remove_document(files[0])
+
+    stats = bulk_ingest.BulkIngestor(service, num_workers=1).run(files, "default")
+
+    assert stats["chunks_added"] == 1
+    assert all(chunk_id in index for chunk_id in ids)
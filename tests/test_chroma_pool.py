@@ -0,0 +1,70 @@
+"""Chroma 连接池：每个目录一个客户端，集合句柄按 LRU 复用"""
+import os
+
+from app.services.chroma_pool import VectorStoreCache, get_chroma_client
+
+
+def test_client_is_shared_per_directory(document_service, tmp_path):
+    relative = get_chroma_client("./chroma_db")
+
+    assert get_chroma_client(os.path.join(str(tmp_path), "chroma_db")) is relative
+    assert document_service.client is relative
+
+
+def counting_cache(max_size):
+    created = []
+
+    def factory(name):
+        created.append(name)
+        return object()
+
+    return VectorStoreCache(factory, max_size=max_size), created
+
+
+def test_handles_are_created_once_and_reused():
+    cache, created = counting_cache(max_size=4)
+
+    first = cache.get("a")
+
+    assert cache.get("a") is first
+    assert created == ["a"]
+
+
+def test_least_recently_used_handle_is_evicted():
+    cache, created = counting_cache(max_size=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+
+    cache.get("a")
+    cache.get("b")
+
+    assert created == ["a", "b", "c", "b"]
+
+
+def test_invalidate_and_clear_drop_handles():
+    cache, created = counting_cache(max_size=4)
+    cache.get("a")
+    cache.get("b")
+
+    cache.invalidate("a")
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    cache.get("b")
+
+    assert created == ["a", "b", "a", "b"]
+
+
+def test_ingest_invalidates_cached_vectorstore(document_service, tmp_path):
+    handle = document_service.get_vectorstore("default")
+    assert document_service.get_vectorstore("default") is handle
+
+    path = tmp_path / "doc.txt"
+    path.write_text("新上传的文档内容。", encoding="utf-8")
+    document_service.ingest_document(str(path))
+
+    refreshed = document_service.get_vectorstore("default")
+    assert refreshed is not handle
+    assert refreshed.similarity_search_by_vector([0.0] * 31 + [1.0], k=1)
@@ -0,0 +1,51 @@
+"""文档入库：确定性片段 ID 与重复上传时的片段对比"""
+from langchain_core.documents import Document
+
+from app.services.document_service import DocumentService
+
+
+def paragraphs(*names):
+    return "\n\n".join(f"{name}：" + f"这是{name}的内容，介绍检索系统的一个方面。" * 20 for name in names)
+
+
+def test_chunk_id_depends_on_source_content_and_occurrence():
+    occurrences = {}
+    first = DocumentService.make_chunk_id(Document(page_content="重复", metadata={"source": "a.txt"}), occurrences)
+    second = DocumentService.make_chunk_id(Document(page_content="重复", metadata={"source": "a.txt"}), occurrences)
+    other_source = DocumentService.make_chunk_id(Document(page_content="重复", metadata={"source": "b.txt"}), occurrences)
+
+    assert len({first, second, other_source}) == 3
+    assert first.endswith("-0") and second.endswith("-1") and other_source.endswith("-0")
+    # 新一次入库重新计数：相同内容得到相同的 ID
+    chunk = Document(page_content="重复", metadata={"source": "a.txt"})
+    assert DocumentService.make_chunk_id(chunk, {}) == first
+    assert chunk.metadata["chunk_id"] == first
+
+
+def test_reupload_of_unchanged_document_writes_nothing(document_service, fake_models, tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text(paragraphs("甲", "乙", "丙"), encoding="utf-8")
+    first = document_service.ingest_document(str(path))
+    embedded = fake_models.documents_embedded
+
+    second = document_service.ingest_document(str(path))
+
+    assert first["chunks_added"] > 0
+    assert second["chunks_added"] == 0
+    assert second["chunks_removed"] == 0
+    assert fake_models.documents_embedded == embedded
+
+
+def test_inserting_a_paragraph_keeps_later_chunk_ids(document_service, tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text(paragraphs("甲", "乙", "丙", "丁"), encoding="utf-8")
+    document_service.ingest_document(str(path))
+    before = set(document_service.get_chunk_ids_by_source("default", [str(path)]))
+
+    path.write_text(paragraphs("新", "甲", "乙", "丙", "丁"), encoding="utf-8")
+    result = document_service.ingest_document(str(path))
+    after = set(document_service.get_chunk_ids_by_source("default", [str(path)]))
+
+    assert result["chunks_added"] == 1
+    assert result["chunks_removed"] == 0
+    assert before < after
@@ -0,0 +1,74 @@
+"""片段向量缓存：按模型和归一化文本命中，持久化并按最近访问淘汰"""
+import time
+
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_pipeline import EmbeddingPipeline
+from tests.conftest import FakeEmbeddings, fake_vector
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "cache.sqlite3"), "bge-small")
+
+
+def test_hits_survive_reopen_and_ignore_surrounding_whitespace(cache, tmp_path):
+    cache.put_many(["片段一", "片段二"], [fake_vector("片段一"), fake_vector("片段二")])
+
+    reopened = EmbeddingCache(cache.db_path, "bge-small")
+    found = reopened.get_many(["  片段二\n", "片段三", "片段一"])
+
+    assert set(found) == {0, 2}
+    assert found[0] == pytest.approx(fake_vector("片段二"), abs=1e-6)
+    assert reopened.stats()["hits"] == 2 and reopened.stats()["misses"] == 1
+
+
+def test_changing_the_model_invalidates_entries(cache):
+    cache.put_many(["片段"], [fake_vector("片段")])
+
+    assert EmbeddingCache(cache.db_path, "bge-large").get_many(["片段"]) == {}
+
+
+def test_least_recently_accessed_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), "bge-small", max_entries=10)
+    texts = [f"片段{i}" for i in range(10)]
+    cache.put_many(texts, [fake_vector(t) for t in texts])
+    time.sleep(0.01)
+    cache.get_many(texts[:2])
+
+    cache.put_many(["新片段"], [fake_vector("新片段")])
+
+    # 超出容量后淘汰到 90%：最近访问过的和刚写入的片段保留
+    assert cache.stats()["size"] == 9
+    assert set(cache.get_many(texts[:2] + ["新片段"])) == {0, 1, 2}
+
+
+def test_pipeline_only_embeds_cache_misses(cache):
+    embeddings = FakeEmbeddings()
+    pipeline = EmbeddingPipeline(embeddings, ("bge-small", True), batch_size=4, num_processes=0, cache=cache)
+    pipeline.embed(["甲", "乙"])
+    stats = {}
+
+    vectors = pipeline.embed(["甲", "丙", "乙"], stats=stats)
+
+    assert embeddings.documents_embedded == 3
+    assert stats == {"cache_hits": 2, "embedded": 1}
+    assert vectors[1] == fake_vector("丙")
+
+
+def test_same_chunks_under_another_source_reuse_cached_vectors(document_service, fake_models, tmp_path):
+    paragraphs = [f"第{i}段。" + "内容" * 300 for i in range(3)]
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    document_service.ingest_document(str(path))
+
+    # 片段 ID 随来源变化需要重新写入，但向量按内容命中缓存，不再计算
+    other = tmp_path / "copy.txt"
+    other.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    embedded = fake_models.documents_embedded
+    result = document_service.ingest_document(str(other))
+
+    assert result["chunks_added"] > 0
+    assert result["embedding_cache_hits"] == result["chunks_added"]
+    assert fake_models.documents_embedded == embedded
@@ -0,0 +1,85 @@
+"""批量向量化管道：分批、保持顺序、进度回调与多进程分发"""
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import embedding_pipeline
+from app.services.embedding_pipeline import EmbeddingPipeline
+from tests.conftest import fake_vector
+
+
+class BatchRecordingEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [fake_vector(text) for text in texts]
+
+
+TEXTS = [f"片段{i}" for i in range(7)]
+
+
+def test_texts_are_embedded_in_batches_and_keep_order():
+    embeddings = BatchRecordingEmbeddings()
+    pipeline = EmbeddingPipeline(embeddings, ("model", True), batch_size=3, num_processes=0)
+    progress = []
+
+    vectors = pipeline.embed(TEXTS, progress_callback=progress.append)
+
+    assert [len(batch) for batch in embeddings.batches] == [3, 3, 1]
+    assert vectors == [fake_vector(text) for text in TEXTS]
+    assert progress == [3, 6, 7]
+
+
+def test_stats_accumulate_across_calls():
+    pipeline = EmbeddingPipeline(BatchRecordingEmbeddings(), ("model", True), batch_size=4, num_processes=0)
+    stats = {}
+
+    pipeline.embed(TEXTS[:3], stats=stats)
+    pipeline.embed(TEXTS[3:], stats=stats)
+
+    assert stats == {"cache_hits": 0, "embedded": 7}
+
+
+def test_multiple_batches_are_spread_over_the_process_pool(monkeypatch):
+    encoded = []
+
+    def encode_in_worker(texts):
+        encoded.append(list(texts))
+        return [fake_vector(text) for text in texts]
+
+    embeddings = BatchRecordingEmbeddings()
+    pipeline = EmbeddingPipeline(embeddings, ("model", True), batch_size=2, num_processes=2)
+    monkeypatch.setattr(embedding_pipeline, "_encode_in_worker", encode_in_worker)
+    pipeline._pool = ThreadPoolExecutor(max_workers=2)
+    try:
+        vectors = pipeline.embed(TEXTS)
+    finally:
+        pipeline.shutdown()
+
+    assert embeddings.batches == []
+    assert sorted(len(batch) for batch in encoded) == [1, 2, 2, 2]
+    assert vectors == [fake_vector(text) for text in TEXTS]
+
+
+def test_single_batch_stays_in_process_even_with_pool_configured():
+    embeddings = BatchRecordingEmbeddings()
+    pipeline = EmbeddingPipeline(embeddings, ("model", True), batch_size=32, num_processes=4)
+
+    pipeline.embed(TEXTS)
+
+    assert embeddings.batches == [TEXTS]
+    assert pipeline._pool is None
+
+
+def test_ingest_embeds_new_chunks_in_configured_batches(document_service, fake_models, tmp_path, monkeypatch):
+    calls = []
+    original = fake_models.embed_documents
+    monkeypatch.setattr(fake_models, "embed_documents", lambda texts: calls.append(len(texts)) or original(texts))
+    document_service.embedding_pipeline.batch_size = 2
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\n".join(f"第{i}段。" + "内容" * 300 for i in range(5)), encoding="utf-8")
+
+    result = document_service.ingest_document(str(path))
+
+    assert sum(calls) == result["chunks_embedded"] == result["chunks_added"]
+    assert len(calls) > 1 and max(calls) <= 2
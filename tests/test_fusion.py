@@ -0,0 +1,64 @@
+"""多路检索结果融合：加权 RRF 与归一化线性融合"""
+import pytest
+
+from app.services.fusion import fuse, linear_fuse, rrf_fuse
+
+
+def test_rrf_sums_reciprocal_ranks():
+    ids, scores = rrf_fuse([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert ids == ["b", "a", "d", "c"]
+    assert scores[0] == pytest.approx(1 / 61 + 1 / 60)
+    assert scores[1] == pytest.approx(1 / 60)
+
+
+def test_rrf_weights_scale_each_retriever():
+    ids, scores = rrf_fuse([["a"], ["b"]], weights=[1.0, 2.0], k=1)
+
+    assert ids == ["b", "a"]
+    assert scores == pytest.approx([2.0, 1.0])
+
+
+def test_rrf_ties_keep_first_occurrence_order():
+    # 两路排名互换，融合分数相同：按首次出现的顺序（第一路）排列
+    ids, _ = rrf_fuse([["a", "b"], ["b", "a"]])
+
+    assert ids == ["a", "b"]
+
+
+def test_rrf_handles_empty_results():
+    assert rrf_fuse([[], []]) == ([], [])
+    assert rrf_fuse([]) == ([], [])
+
+
+def test_linear_normalizes_each_retriever_before_weighting():
+    # 向量检索分数范围很小、BM25 分数范围很大：归一化后两路贡献相当
+    ids, scores = linear_fuse(
+        [["a", "b", "c"], ["c", "a"]],
+        [[-0.1, -0.2, -0.3], [20.0, 5.0]],
+        weights=[1.0, 0.5]
+    )
+
+    assert dict(zip(ids, scores)) == pytest.approx({"a": 1.0, "b": 0.5, "c": 0.5})
+    assert ids[0] == "a"
+
+
+def test_linear_treats_equal_scores_as_one():
+    ids, scores = linear_fuse([["a", "b"]], [[3.0, 3.0]])
+
+    assert ids == ["a", "b"]
+    assert scores == [1.0, 1.0]
+
+
+def test_fuse_dispatches_by_method():
+    id_lists = [["a", "b"], ["b"]]
+
+    assert fuse("rrf", id_lists, k=10) == rrf_fuse(id_lists, k=10)
+    assert fuse("linear", id_lists, [[2.0, 1.0], [0.5]]) == linear_fuse(id_lists, [[2.0, 1.0], [0.5]])
+
+
+def test_fuse_rejects_unknown_method_and_missing_scores():
+    with pytest.raises(ValueError, match="不支持的融合方法"):
+        fuse("max", [["a"]])
+    with pytest.raises(ValueError, match="需要提供检索分数"):
+        fuse("linear", [["a"]])
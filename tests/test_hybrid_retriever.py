@@ -0,0 +1,113 @@
+"""混合检索：子检索器并发执行，超时或失败的检索器降级跳过，卡住的检索器不重复占用线程"""
+import threading
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services import hybrid_retriever
+from app.services.hybrid_retriever import HybridRetriever, doc_key
+
+
+def doc(chunk_id, text=None):
+    return Document(page_content=text or chunk_id, metadata={"chunk_id": chunk_id})
+
+
+class StaticRetriever:
+    def __init__(self, docs, delay=0.0, error=None):
+        self.docs = docs
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, query):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return list(self.docs)
+
+
+class BlockingRetriever:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def invoke(self, query):
+        self.calls += 1
+        self.release.wait(10)
+        return [doc("slow")]
+
+
+@pytest.fixture(autouse=True)
+def clean_stalled():
+    yield
+    hybrid_retriever._stalled.clear()
+
+
+def test_results_are_fused_by_chunk_id():
+    vector = StaticRetriever([doc("a"), doc("b")])
+    bm25 = StaticRetriever([doc("b"), doc("c")])
+
+    docs = HybridRetriever([vector, bm25], timeout=5).invoke("问题")
+
+    assert [doc_key(d) for d in docs] == ["b", "a", "c"]
+
+
+def test_retrievers_run_concurrently():
+    retrievers = [StaticRetriever([doc(str(i))], delay=0.3) for i in range(2)]
+
+    start = time.time()
+    HybridRetriever(retrievers, timeout=5).invoke("问题")
+
+    assert time.time() - start < 0.55
+
+
+def test_failing_retriever_is_skipped():
+    retriever = HybridRetriever([StaticRetriever([], error=RuntimeError("坏了")), StaticRetriever([doc("a")])], timeout=5)
+
+    assert [doc_key(d) for d in retriever.invoke("问题")] == ["a"]
+
+
+def test_timed_out_retriever_degrades_and_is_not_resubmitted_until_it_finishes():
+    slow = BlockingRetriever()
+    fast = StaticRetriever([doc("a")])
+    retriever = HybridRetriever([slow, fast], timeout=0.2, name="default")
+
+    start = time.time()
+    assert [doc_key(d) for d in retriever.invoke("问题")] == ["a"]
+    assert time.time() - start < 1
+
+    # 上一次的检索还卡着：同一检索器不再提交新任务
+    assert [doc_key(d) for d in retriever.invoke("问题")] == ["a"]
+    assert slow.calls == 1
+
+    slow.release.set()
+    hybrid_retriever._stalled[("retriever", "default", 0)].result(timeout=5)
+    assert "slow" in [doc_key(d) for d in retriever.invoke("问题")]
+    assert slow.calls == 2
+
+
+def test_submit_unless_stalled_skips_only_the_stalled_key():
+    executor = hybrid_retriever._get_executor()
+    started, gate = threading.Event(), threading.Event()
+    future = executor.submit(lambda: started.set() or gate.wait(10))
+    started.wait(5)
+    hybrid_retriever.mark_stalled("stuck", future)
+
+    assert hybrid_retriever.submit_unless_stalled(executor, "stuck", lambda: 1) is None
+    assert hybrid_retriever.submit_unless_stalled(executor, "other", lambda: 1).result() == 1
+
+    gate.set()
+    future.result(timeout=5)
+    assert hybrid_retriever.submit_unless_stalled(executor, "stuck", lambda: 2).result() == 2
+    assert "stuck" not in hybrid_retriever._stalled
+
+
+def test_top_k_and_weights_are_applied():
+    vector = StaticRetriever([doc("a"), doc("b")])
+    bm25 = StaticRetriever([doc("c"), doc("d")])
+
+    docs = HybridRetriever([vector, bm25], timeout=5, weights=[1.0, 2.0], top_k=2).invoke("问题")
+
+    assert [doc_key(d) for d in docs] == ["c", "d"]
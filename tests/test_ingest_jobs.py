@@ -0,0 +1,216 @@
+"""入库任务队列：后台处理与进度查询，涉及相同文件的任务按提交顺序串行执行"""
+import threading
+
+import pytest
+
+from app.services import ingest_jobs
+from app.services.ingest_jobs import IngestionJobManager
+from tests.conftest import wait_for_job
+
+
+class BlockingService:
+    """ingest_document 阻塞到测试放行，记录执行顺序和并发度"""
+
+    def __init__(self):
+        self.order = []
+        self.gates = {}
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def gate(self, name):
+        return self.gates.setdefault(name, threading.Event())
+
+    def work(self, name):
+        with self._lock:
+            self.order.append(name)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            assert self.gate(name).wait(5)
+        finally:
+            with self._lock:
+                self.running -= 1
+        return {"name": name}
+
+    def ingest_document(self, file_path, collection_name, progress_callback=None, content_hash=None):
+        return self.work(content_hash)
+
+
+class FakeBulkIngestor:
+    def __init__(self, service):
+        self.service = service
+
+    def run(self, files, collection_name, progress_callback=None, sources=None):
+        return self.service.work("bulk")
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(ingest_jobs, "BulkIngestor", FakeBulkIngestor)
+    service = BlockingService()
+    manager = IngestionJobManager(service, max_workers=4)
+    yield manager
+    for gate in service.gates.values():
+        gate.set()
+    manager.shutdown(wait=True)
+
+
+def wait_started(service, count):
+    for _ in range(500):
+        if len(service.order) >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"只有 {service.order} 开始执行")
+
+
+def finish(job, service, name):
+    service.gate(name).set()
+    for _ in range(500):
+        if job.status in ("succeeded", "failed"):
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"任务 {name} 未结束")
+
+
+def test_same_path_jobs_run_in_submission_order(manager, tmp_path):
+    service = manager.document_service
+    path = str(tmp_path / "a.txt")
+    first = manager.submit(path, content_hash="first")
+    second = manager.submit(path, content_hash="second")
+    other = manager.submit(str(tmp_path / "b.txt"), content_hash="other")
+
+    wait_started(service, 2)
+    assert sorted(service.order) == ["first", "other"]
+    assert second.status == "queued"
+
+    finish(first, service, "first")
+    wait_started(service, 3)
+    assert service.order[-1] == "second"
+    finish(second, service, "second")
+    finish(other, service, "other")
+    assert service.max_running == 2
+
+
+def test_bulk_job_waits_for_single_job_on_one_of_its_files(manager, tmp_path):
+    service = manager.document_service
+    a, b = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    single = manager.submit(a, content_hash="single")
+    wait_started(service, 1)
+
+    bulk = manager.submit_bulk([a, b], name="batch")
+    threading.Event().wait(0.05)
+    assert bulk.status == "queued"
+
+    finish(single, service, "single")
+    wait_started(service, 2)
+    finish(bulk, service, "bulk")
+    assert service.order == ["single", "bulk"]
+    assert bulk.status == "succeeded"
+
+
+def test_single_job_waits_for_bulk_job_by_logical_source(manager, tmp_path):
+    service = manager.document_service
+    source = str(tmp_path / "uploads" / "batch" / "a.txt")
+    bulk = manager.submit_bulk([str(tmp_path / ".batch-1" / "a.txt")], name="batch.zip", sources=[source])
+    wait_started(service, 1)
+
+    single = manager.submit(source, content_hash="single")
+    unrelated = manager.submit(str(tmp_path / "c.txt"), content_hash="unrelated")
+    wait_started(service, 2)
+    assert service.order == ["bulk", "unrelated"]
+    assert single.status == "queued"
+
+    finish(bulk, service, "bulk")
+    wait_started(service, 3)
+    finish(single, service, "single")
+    finish(unrelated, service, "unrelated")
+    assert service.order[-1] == "single"
+
+
+def test_later_job_does_not_overtake_waiting_job_on_same_path(manager, tmp_path):
+    service = manager.document_service
+    a, b = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    first = manager.submit(a, content_hash="first")
+    wait_started(service, 1)
+    bulk = manager.submit_bulk([a, b], name="batch")
+    # b 当前空闲，但批量任务先提交且在等待 b，后提交的任务不能越过它
+    late = manager.submit(b, content_hash="late")
+    threading.Event().wait(0.05)
+    assert late.status == "queued"
+
+    finish(first, service, "first")
+    wait_started(service, 2)
+    finish(bulk, service, "bulk")
+    wait_started(service, 3)
+    finish(late, service, "late")
+    assert service.order == ["first", "bulk", "late"]
+
+
+def test_upload_is_committed_when_job_starts(tmp_path):
+    committed = []
+
+    class Service:
+        def ingest_document(self, file_path, collection_name, progress_callback=None, content_hash=None):
+            committed.append(open(file_path, encoding="utf-8").read())
+            return {}
+
+    tmp = tmp_path / "a.txt.part"
+    tmp.write_text("新内容", encoding="utf-8")
+    manager = IngestionJobManager(Service(), max_workers=1)
+    job = manager.submit(str(tmp_path / "a.txt"), tmp_path=str(tmp))
+    manager.shutdown(wait=True)
+
+    assert job.status == "succeeded"
+    assert committed == ["新内容"]
+    assert not tmp.exists()
+
+
+def test_failed_job_records_error():
+    class Service:
+        def ingest_document(self, file_path, collection_name, progress_callback=None, content_hash=None):
+            progress_callback("loading")
+            raise ValueError("无法解析")
+
+    manager = IngestionJobManager(Service(), max_workers=1)
+    job = manager.submit("a.txt")
+    manager.shutdown(wait=True)
+
+    data = job.to_dict()
+    assert data["status"] == "failed"
+    assert data["stage"] == "loading"
+    assert "无法解析" in data["error"]
+
+
+def test_only_finished_jobs_are_evicted(manager, tmp_path):
+    service = manager.document_service
+    manager.max_jobs = 2
+    running = manager.submit(str(tmp_path / "a.txt"), content_hash="running")
+    wait_started(service, 1)
+    done = manager.submit(str(tmp_path / "b.txt"), content_hash="done")
+    finish(done, service, "done")
+
+    newest = manager.submit(str(tmp_path / "c.txt"), content_hash="newest")
+
+    assert manager.get(done.id) is None
+    assert manager.get(running.id) is running
+    assert manager.get(newest.id) is newest
+
+
+def test_upload_returns_job_and_reports_progress(api):
+    response = api.post(
+        "/api/upload",
+        files={"file": ("notes.txt", "后台入库的文档内容。".encode("utf-8"), "text/plain")}
+    )
+
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] in ("queued", "running")
+    job = wait_for_job(api, body["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["stage"] == "done"
+    assert job["chunks_total"] == job["chunks_processed"] == job["result"]["chunks_count"] == 1
+
+
+def test_unknown_job_returns_404(api):
+    assert api.get("/api/jobs/missing").status_code == 404
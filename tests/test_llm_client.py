@@ -0,0 +1,144 @@
+"""LLM 调用：并发上限、排队满时拒绝（接口返回 429）、可重试错误按指数退避 + 抖动重试"""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services import llm_client
+from app.services.llm_client import LLMClient, LLMSaturatedError
+
+
+class Reply:
+    content = "答案"
+
+
+class GatedChain:
+    """调用在 gate 打开前一直挂起，记录同时进行的调用数"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.running = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await self.gate.wait()
+            return Reply()
+        finally:
+            self.running -= 1
+
+
+class FlakyChain:
+    """前几次调用抛出给定错误，之后成功"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return Reply()
+
+
+def rate_limit_error():
+    response = httpx.Response(429, request=httpx.Request("POST", "https://api.deepseek.com/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """记录退避区间，不真正等待"""
+    bounds = []
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: bounds.append((low, high)) or 0.0)
+    return bounds
+
+
+def test_calls_beyond_concurrency_limit_wait_for_a_slot():
+    async def run():
+        chain = GatedChain()
+        client = LLMClient(chain, max_concurrency=2, max_queue=10)
+        tasks = [asyncio.create_task(client.ainvoke({})) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        assert client.stats()["active"] == 2 and client.stats()["queued"] == 3
+        chain.gate.set()
+        await asyncio.gather(*tasks)
+        return chain, client
+
+    chain, client = asyncio.run(run())
+
+    assert chain.peak == 2
+    assert client.stats()["completed"] == 5
+
+
+def test_requests_are_rejected_once_the_queue_is_full():
+    async def run():
+        chain = GatedChain()
+        client = LLMClient(chain, max_concurrency=1, max_queue=1)
+        tasks = [asyncio.create_task(client.ainvoke({})) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(LLMSaturatedError):
+            client.check_capacity()
+        with pytest.raises(LLMSaturatedError):
+            await client.ainvoke({})
+        chain.gate.set()
+        await asyncio.gather(*tasks)
+        client.check_capacity()
+        return client
+
+    assert asyncio.run(run()).stats()["rejected"] == 2
+
+
+def test_rate_limits_and_timeouts_are_retried_with_growing_jittered_backoff(delays):
+    chain = FlakyChain([rate_limit_error(), asyncio.TimeoutError()])
+    client = LLMClient(chain, max_retries=2, retry_backoff=0.5)
+
+    assert asyncio.run(client.ainvoke({})).content == "答案"
+
+    assert chain.calls == 3
+    assert delays == [(0, 0.5), (0, 1.0)]
+    assert client.stats()["retries"] == 2
+
+
+def test_slow_call_times_out_and_gives_up_after_max_retries(delays):
+    class SlowChain:
+        calls = 0
+
+        async def ainvoke(self, inputs):
+            self.calls += 1
+            await asyncio.sleep(1)
+
+    chain = SlowChain()
+    client = LLMClient(chain, timeout=0.05, max_retries=1, retry_backoff=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client.ainvoke({}))
+
+    assert chain.calls == 2
+    assert client.stats()["failed"] == 1
+
+
+def test_non_retryable_errors_fail_immediately(delays):
+    chain = FlakyChain([ValueError("参数错误")])
+    client = LLMClient(chain, max_retries=3)
+
+    with pytest.raises(ValueError):
+        asyncio.run(client.ainvoke({}))
+
+    assert chain.calls == 1 and delays == []
+
+
+def test_ask_returns_429_when_llm_is_saturated(api):
+    client = LLMClient(GatedChain(), max_concurrency=1, max_queue=0)
+    client._pending = 1
+    api.main.qa_service.llm = object()
+    api.main.qa_service.llm_client = client
+
+    response = api.post("/api/ask", json={"question": "问题"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
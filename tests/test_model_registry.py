@@ -0,0 +1,62 @@
+"""模型注册表：模型懒加载，进程内只加载一次并在各服务间共享"""
+import threading
+import time
+
+from app.services.model_registry import DEFAULT_MODEL_NAME, ModelRegistry, model_registry
+from app.services.document_service import DocumentService
+from app.services.qa_service import QAService
+
+
+def test_concurrent_access_loads_embeddings_once(monkeypatch):
+    registry = ModelRegistry()
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        time.sleep(0.05)
+        return object()
+
+    monkeypatch.setattr(registry, "_load_embeddings", slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.embeddings)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_failed_reranker_load_is_not_retried(monkeypatch):
+    registry = ModelRegistry()
+    attempts = []
+
+    def failing_loader(*args, **kwargs):
+        attempts.append(1)
+        raise OSError("模型文件不存在")
+
+    monkeypatch.setattr("app.services.reranker_engine.load_cross_encoder", failing_loader)
+
+    assert registry.reranker is False
+    assert registry.reranker is False
+    assert len(attempts) == 1
+
+
+def test_embedding_model_spec_falls_back_to_hub_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path / "missing"))
+    assert ModelRegistry().embedding_model_spec() == (DEFAULT_MODEL_NAME, False)
+
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path))
+    assert ModelRegistry().embedding_model_spec() == (str(tmp_path), True)
+
+
+def test_services_share_the_registry_models(document_service, fake_models, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    qa_service = QAService(document_service=document_service)
+
+    assert document_service.embeddings is fake_models
+    assert document_service.tokenizer is model_registry.tokenizer
+    qa_service.query_embeddings.embed_query("问题")
+    assert fake_models.queries_embedded == 1
+    assert DocumentService().embeddings is document_service.embeddings
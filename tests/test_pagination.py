@@ -0,0 +1,73 @@
+"""分页查询：片段在 Chroma 端分页，文档列表来自文档清单"""
+import pytest
+
+from app.services.document_manifest import DocumentManifestManager
+
+
+@pytest.fixture
+def three_documents(document_service, tmp_path):
+    paths = []
+    for name, paragraphs in (("a.txt", 1), ("b.txt", 2), ("c.txt", 3)):
+        path = tmp_path / name
+        path.write_text("\n\n".join(f"{name}第{i}段。" + "内容" * 300 for i in range(paragraphs)), encoding="utf-8")
+        document_service.ingest_document(str(path))
+        paths.append(str(path))
+    return paths
+
+
+def test_chunk_pages_cover_the_collection_without_overlap(document_service, three_documents):
+    total = document_service.get_document_chunks(limit=1)["total_chunks"]
+    seen = []
+    for offset in range(0, total, 2):
+        page = document_service.get_document_chunks(limit=2, offset=offset)
+        assert page["returned_chunks"] == len(page["chunks"]) <= 2
+        seen.extend(chunk["id"] for chunk in page["chunks"])
+
+    assert len(seen) == len(set(seen)) == total
+    assert all(chunk["source"] in three_documents for chunk in page["chunks"])
+
+
+def test_chunk_page_does_not_load_the_whole_collection(document_service, three_documents, monkeypatch):
+    collection = document_service.client.get_or_create_collection("default")
+    calls = []
+    original = type(collection).get
+
+    def recording_get(self, *args, **kwargs):
+        calls.append(kwargs)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(type(collection), "get", recording_get)
+    document_service.get_document_chunks(limit=2, offset=1)
+
+    assert [(call.get("limit"), call.get("offset")) for call in calls] == [(2, 1)]
+    assert "embeddings" not in calls[0]["include"]
+
+
+def test_documents_list_pages_the_manifest(document_service, three_documents):
+    full = document_service.get_documents_list()
+    page = document_service.get_documents_list(limit=1, offset=1)
+
+    assert full["total_documents"] == page["total_documents"] == 3
+    assert full["total_chunks"] == document_service.get_document_chunks(limit=1)["total_chunks"]
+    assert [doc["filename"] for doc in page["documents"]] == [full["documents"][1]["filename"]]
+
+
+def test_manifest_is_rebuilt_from_chroma_when_missing(document_service, three_documents):
+    counts = {doc["filename"]: doc["chunks_count"] for doc in document_service.get_documents_list()["documents"]}
+
+    rebuilt = DocumentManifestManager(document_service.persist_directory + "-empty").get(
+        "default", loader=lambda: document_service._load_manifest_metadatas("default")
+    )
+
+    assert {source: entry["chunks_count"] for source, entry in rebuilt.documents().items()} == counts
+
+
+def test_chunks_endpoint_caps_page_size(api, monkeypatch):
+    requested = []
+    monkeypatch.setattr(
+        api.main.document_service, "get_document_chunks",
+        lambda collection_name, limit, offset: requested.append((limit, offset)) or {"chunks": []}
+    )
+
+    assert api.get("/api/chunks/default", params={"limit": 500, "offset": 20}).status_code == 200
+    assert requested == [(50, 20)]
@@ -0,0 +1,61 @@
+"""并行 PDF 解析：按页码分片多进程提取，重新组装后的文本和元数据与 PyPDFLoader 一致"""
+from pathlib import Path
+
+import pytest
+from langchain_community.document_loaders import PyPDFLoader
+
+from app.services import pdf_parser
+from app.services.document_service import DocumentService
+from app.services.pdf_parser import ParallelPDFLoader
+
+
+SAMPLE_PDF = str(Path(__file__).resolve().parent.parent / "static" / "文档2.pdf")
+
+
+@pytest.fixture(scope="module")
+def long_pdf(tmp_path_factory):
+    """样例 PDF 重复 3 次（15 页），超过启用并行解析的最少页数"""
+    path = str(tmp_path_factory.mktemp("pdf") / "long.pdf")
+    pdf_parser._make_benchmark_pdf(SAMPLE_PDF, 3, path)
+    yield path
+    pdf_parser.shutdown_pool()
+
+
+def as_tuples(documents):
+    return [(doc.page_content, doc.metadata) for doc in documents]
+
+
+def test_parallel_parse_matches_pypdf_loader(long_pdf):
+    expected = PyPDFLoader(long_pdf).load()
+
+    documents = ParallelPDFLoader(long_pdf, num_workers=2, pages_per_task=4).load()
+
+    assert len(documents) == 15
+    assert as_tuples(documents) == as_tuples(expected)
+
+
+def test_short_documents_are_parsed_in_process(monkeypatch):
+    monkeypatch.setattr(pdf_parser, "_get_pool", lambda n: pytest.fail("短文档不应启动进程池"))
+
+    documents = ParallelPDFLoader(SAMPLE_PDF, num_workers=4).load()
+
+    assert as_tuples(documents) == as_tuples(PyPDFLoader(SAMPLE_PDF).load())
+
+
+@pytest.mark.parametrize("workers, pages_per_task, total, expected", [
+    (2, 0, 20, [(1, 4), (4, 7), (7, 10), (10, 13), (13, 16), (16, 19), (19, 20)]),
+    (4, 5, 12, [(1, 6), (6, 11), (11, 12)]),
+])
+def test_shards_cover_remaining_pages_contiguously(workers, pages_per_task, total, expected):
+    loader = ParallelPDFLoader("unused.pdf", num_workers=workers, pages_per_task=pages_per_task)
+
+    assert loader._shards(1, total) == expected
+
+
+def test_worker_setting_selects_the_parallel_loader(monkeypatch):
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "0")
+    assert isinstance(DocumentService._get_loader(SAMPLE_PDF), PyPDFLoader)
+
+    monkeypatch.setenv("PDF_PARSE_WORKERS", "3")
+    loader = DocumentService._get_loader(SAMPLE_PDF)
+    assert isinstance(loader, ParallelPDFLoader) and loader.num_workers == 3
@@ -0,0 +1,67 @@
+"""问答服务：多集合问答缓存的作用域、检索管道缓存"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.answer_cache import AnswerCache
+from app.services.qa_service import QAService
+
+
+class Versions:
+    def __init__(self, **versions):
+        self.versions = versions
+
+    def get_collection_version(self, name):
+        return self.versions.get(name, 0)
+
+
+def scope(names, **versions):
+    return QAService.cache_scope(SimpleNamespace(document_service=Versions(**versions)), names)
+
+
+def test_scope_key_does_not_confuse_names_containing_separator():
+    assert scope(["a+b"])[0] != scope(["a", "b"])[0]
+
+
+def test_scope_is_independent_of_collection_order():
+    assert scope(["b", "a"], a=1, b=2) == scope(["a", "b"], a=1, b=2)
+
+
+def test_scope_version_changes_when_versions_shift_between_collections():
+    # 版本之和相同（3），但集合 a 和 b 各自都变化过：不能命中旧缓存
+    assert scope(["a", "b"], a=2, b=1)[1] != scope(["a", "b"], a=1, b=2)[1]
+
+
+def test_cached_answer_is_invalidated_when_any_collection_changes():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60)
+    key, version = scope(["a", "b"], a=1, b=1)
+    cache.put(key, version, "问题", {"answer": "答案"})
+
+    assert cache.get(key, version, "问题")[0] == {"answer": "答案"}
+    assert cache.get(*scope(["a", "b"], a=1, b=2), "问题")[0] is None
+    assert cache.get(*scope(["a"], a=1), "问题")[0] is None
+
+
+@pytest.fixture
+def qa_service(document_service, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setenv("PIPELINE_CACHE_SIZE", "2")
+    return QAService(document_service=document_service)
+
+
+def test_pipelines_are_cached_per_collection_with_lru_bound(qa_service):
+    first = qa_service.get_pipeline("a")
+    assert qa_service.get_pipeline("a") is first
+
+    qa_service.get_pipeline("b")
+    qa_service.get_pipeline("c")
+
+    assert qa_service.get_pipeline("a") is not first
+
+
+def test_deleted_collection_pipeline_is_dropped(qa_service):
+    pipeline = qa_service.get_pipeline("a")
+
+    qa_service.forget_collection("a")
+
+    assert qa_service.get_pipeline("a") is not pipeline
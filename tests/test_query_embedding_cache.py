@@ -0,0 +1,77 @@
+"""查询向量缓存：重复问题不再计算向量，容量有界，批量计算合并未命中的问题"""
+import pytest
+
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.qa_service import QAService
+from tests.conftest import FakeEmbeddings, fake_vector
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
+
+
+def test_repeated_query_is_embedded_once(embeddings):
+    cache = QueryEmbeddingCache(lambda: embeddings, max_entries=10)
+
+    assert cache.embed_query("问题") == cache.embed_query("问题") == fake_vector("问题")
+
+    assert embeddings.queries_embedded == 1
+    assert cache.stats() == {"size": 1, "max_entries": 10, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_least_recently_used_query_is_evicted(embeddings):
+    cache = QueryEmbeddingCache(lambda: embeddings, max_entries=2)
+    cache.embed_query("一")
+    cache.embed_query("二")
+    cache.embed_query("一")
+    cache.embed_query("三")
+
+    cache.embed_query("一")
+    assert embeddings.queries_embedded == 3
+    cache.embed_query("二")
+    assert embeddings.queries_embedded == 4
+
+
+def test_size_comes_from_environment(embeddings, monkeypatch):
+    monkeypatch.setenv("QUERY_EMBEDDING_CACHE_SIZE", "7")
+
+    assert QueryEmbeddingCache(lambda: embeddings).max_entries == 7
+
+
+def test_model_is_not_loaded_until_first_miss():
+    loads = []
+    cache = QueryEmbeddingCache(lambda: loads.append(1) or FakeEmbeddings())
+
+    assert loads == []
+    cache.embed_query("问题")
+    assert loads == [1]
+
+
+def test_batch_embeds_distinct_misses_in_one_call_and_keeps_order(embeddings):
+    cache = QueryEmbeddingCache(lambda: embeddings, max_entries=10)
+    cache.embed_query("甲")
+
+    vectors = cache.embed_queries(["乙", "甲", "乙", "丙"])
+
+    assert vectors == [fake_vector(text) for text in ["乙", "甲", "乙", "丙"]]
+    assert embeddings.documents_embedded == 2
+    assert cache.embed_query("丙") == fake_vector("丙")
+    assert embeddings.queries_embedded == 1
+
+
+def test_vector_retrieval_reuses_cached_query_embedding(document_service, tmp_path, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    path = tmp_path / "guide.txt"
+    path.write_text("向量检索使用查询向量。关键词检索使用 BM25。", encoding="utf-8")
+    document_service.ingest_document(str(path))
+    embeddings = document_service.embeddings
+    qa_service = QAService(document_service=document_service)
+    pipeline = qa_service.get_pipeline("default")
+
+    first = pipeline.retrieve("向量检索")
+    second = pipeline.retrieve("向量检索")
+
+    assert [doc.page_content for doc in second[0]] == [doc.page_content for doc in first[0]]
+    assert embeddings.queries_embedded == 1
+    assert qa_service.query_embeddings.stats()["hits"] == 1
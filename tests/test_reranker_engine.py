@@ -0,0 +1,106 @@
+"""Reranker 引擎：按长度分批、分数缓存、并发统计与自适应策略"""
+import threading
+
+from langchain_core.documents import Document
+
+from app.services.reranker_engine import AdaptiveRerankPolicy, RerankerEngine
+
+
+class FakeCrossEncoder:
+    """分数为片段长度，记录每次推理收到的输入"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        self.calls.append([text for _, text in pairs])
+        return [float(len(text)) for _, text in pairs]
+
+
+def doc(text, chunk_id):
+    return Document(page_content=text, metadata={"chunk_id": chunk_id})
+
+
+def test_predict_sorts_by_length_and_restores_input_order():
+    model = FakeCrossEncoder()
+    engine = RerankerEngine(lambda: model, cache_size=0)
+
+    scores = engine.predict("问题", ["三个字", "一", "两个"])
+
+    assert model.calls == [["一", "两个", "三个字"]]
+    assert scores == [3.0, 1.0, 2.0]
+
+
+def test_score_batch_merges_queries_and_reuses_cached_scores():
+    model = FakeCrossEncoder()
+    engine = RerankerEngine(lambda: model, cache_size=10)
+    docs = [doc("甲", "1"), doc("乙乙", "2")]
+
+    engine.score_batch(["问题一", "问题二"], [docs, docs[:1]])
+    assert len(model.calls) == 1 and len(model.calls[0]) == 3
+
+    assert engine.score("问题一", docs) == [1.0, 2.0]
+    assert len(model.calls) == 1
+    assert engine.stats()["cache_hits"] == 2
+
+
+def test_score_cache_evicts_least_recently_used():
+    model = FakeCrossEncoder()
+    engine = RerankerEngine(lambda: model, cache_size=2)
+
+    engine.score("问题", [doc("甲", "1"), doc("乙", "2")])
+    engine.score("问题", [doc("甲", "1")])
+    engine.score("问题", [doc("丙", "3")])
+    engine.score("问题", [doc("甲", "1"), doc("乙", "2")])
+
+    assert model.calls[-1] == ["乙"]
+
+
+def test_counters_are_exact_under_concurrency():
+    engine = RerankerEngine(FakeCrossEncoder, cache_size=0)
+    threads = [
+        threading.Thread(target=lambda: [engine.predict("问题", ["a", "b"]) for _ in range(200)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert engine.stats()["pairs_scored"] == 8 * 200 * 2
+
+
+def test_rerank_falls_back_to_original_order_without_model():
+    engine = RerankerEngine(lambda: False)
+    docs = [doc("甲", "1"), doc("乙乙", "2"), doc("丙丙丙", "3")]
+
+    assert engine.rerank("问题", docs, top_n=2) == docs[:2]
+
+
+def test_rerank_orders_by_score_and_records_it():
+    engine = RerankerEngine(FakeCrossEncoder)
+    docs = [doc("甲", "1"), doc("乙乙乙", "2"), doc("丙丙", "3")]
+
+    reranked = engine.rerank("问题", docs, top_n=2)
+
+    assert [d.metadata["chunk_id"] for d in reranked] == ["2", "3"]
+    assert reranked[0].metadata["rerank_score"] == 3.0
+
+
+def ranked(*ids):
+    return [(doc(i, i), float(len(ids) - n)) for n, i in enumerate(ids)]
+
+
+def test_adaptive_policy_skips_when_retrievers_agree():
+    policy = AdaptiveRerankPolicy(enabled=True, skip_agreement=1.0, shrink_agreement=0.5)
+
+    assert policy.decide([ranked("a", "b", "c"), ranked("b", "a", "d")], 10, top_n=2) == ("skipped", 0)
+    assert policy.decide([ranked("a", "b", "c"), ranked("a", "d", "e")], 10, top_n=2) == ("shrunk", 4)
+    assert policy.decide([ranked("a", "b"), ranked("c", "d")], 10, top_n=2) == ("full", 10)
+    assert policy.stats()["skip_rate"] == round(1 / 3, 4)
+
+
+def test_adaptive_policy_disabled_always_reranks_everything():
+    policy = AdaptiveRerankPolicy(enabled=False)
+
+    assert policy.decide([ranked("a", "b"), ranked("a", "b")], 6, top_n=2) == ("full", 6)
@@ -0,0 +1,91 @@
+"""检索管道：每个问题只检索和重排序一次，答案基于同一份上下文生成"""
+import asyncio
+
+import pytest
+
+from app.services.qa_service import QAService
+from app.services.retrieval_pipeline import RetrievalPipeline
+
+
+DOCUMENT = "\n\n".join([
+    "混合检索：同时使用向量检索和 BM25 关键词检索，再融合两路结果。" * 5,
+    "重排序：使用 CrossEncoder 对融合后的候选片段重新打分。" * 5,
+    "切片：文档按语义边界切分为不超过 480 个 token 的片段。" * 5,
+])
+
+
+class RecordingLLMClient:
+    def __init__(self):
+        self.calls = []
+
+    def check_capacity(self):
+        pass
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs)
+        return "生成的答案"
+
+
+@pytest.fixture
+def qa_service(document_service, tmp_path, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    path = tmp_path / "guide.txt"
+    path.write_text(DOCUMENT, encoding="utf-8")
+    document_service.ingest_document(str(path))
+    return QAService(document_service=document_service)
+
+
+@pytest.fixture
+def counters(qa_service, monkeypatch):
+    counts = {"retrieve": 0, "rerank": 0}
+    retrieve = RetrievalPipeline.retrieve
+    rerank = qa_service._rerank_documents
+
+    def counting_retrieve(self, question):
+        counts["retrieve"] += 1
+        return retrieve(self, question)
+
+    def counting_rerank(*args, **kwargs):
+        counts["rerank"] += 1
+        return rerank(*args, **kwargs)
+
+    monkeypatch.setattr(RetrievalPipeline, "retrieve", counting_retrieve)
+    # 重排序函数在构建管道时绑定，需在首次获取管道之前替换
+    monkeypatch.setattr(qa_service, "_rerank_documents", counting_rerank)
+    return counts
+
+
+def test_answer_retrieves_and_reranks_once(qa_service, counters, tmp_path):
+    result = asyncio.run(qa_service.answer_question("什么是混合检索"))
+
+    assert counters == {"retrieve": 1, "rerank": 1}
+    assert result["answer"].startswith(QAService.RETRIEVAL_ONLY_NOTICE)
+    assert result["sources"] == [str(tmp_path / "guide.txt")]
+
+
+def test_llm_answers_from_the_single_retrieval_context(qa_service, counters):
+    client = RecordingLLMClient()
+    qa_service.llm = object()
+    qa_service.llm_client = client
+
+    result = asyncio.run(qa_service.answer_question("重排序用什么模型"))
+
+    assert result["answer"] == "生成的答案"
+    assert counters == {"retrieve": 1, "rerank": 1}
+    pipeline_result = qa_service.get_pipeline("default").run("重排序用什么模型")
+    assert client.calls == [{"context": pipeline_result.context, "question": "重排序用什么模型"}]
+
+
+def test_pipeline_is_built_once_per_collection(qa_service):
+    first = qa_service.get_pipeline("default")
+    asyncio.run(qa_service.answer_question("切片的大小"))
+
+    assert qa_service.get_pipeline("default") is first
+
+
+def test_pipeline_result_joins_top_docs_into_context(qa_service):
+    result = qa_service.get_pipeline("default").run("混合检索")
+
+    assert 0 < len(result.docs) <= 3
+    assert result.context == "\n\n".join(doc.page_content for doc in result.docs)
+    assert len(result.candidates) >= len(result.docs)
@@ -0,0 +1,99 @@
+"""流式问答：先推送来源，再逐个推送 token，失败时按是否已输出决定降级或报错"""
+import asyncio
+import json
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.qa_service import QAService
+from app.services.retrieval_pipeline import RetrievalResult
+
+
+class StreamingClient:
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    async def astream(self, inputs):
+        for i, chunk in enumerate(self.chunks):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError("连接中断")
+            yield chunk
+
+
+@pytest.fixture
+def qa_service(document_service, monkeypatch):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    service = QAService(document_service=document_service)
+    docs = [Document(page_content="检索到的片段内容", metadata={"source": "guide.txt"})]
+    monkeypatch.setattr(service, "retrieve", lambda question, names: RetrievalResult(docs, docs, "上下文"))
+    return service
+
+
+def collect(qa_service, question="问题"):
+    async def run():
+        return [event async for event in qa_service.stream_answer(question)]
+    return asyncio.run(run())
+
+
+def test_sources_come_first_then_tokens_then_done(qa_service):
+    qa_service.llm = object()
+    qa_service.llm_client = StreamingClient(["你", "好", ""])
+
+    events = collect(qa_service)
+
+    assert [e["event"] for e in events] == ["sources", "token", "token", "done"]
+    assert events[0]["data"] == {"sources": ["guide.txt"]}
+    assert "".join(e["data"]["content"] for e in events if e["event"] == "token") == "你好"
+
+
+def test_failure_before_first_token_falls_back_to_retrieved_text(qa_service):
+    qa_service.llm = object()
+    qa_service.llm_client = StreamingClient(["不会输出"], fail_after=0)
+
+    events = collect(qa_service)
+
+    assert [e["event"] for e in events] == ["sources", "token", "done"]
+    assert "检索到的片段内容" in events[1]["data"]["content"]
+
+
+def test_failure_mid_stream_reports_error(qa_service):
+    qa_service.llm = object()
+    qa_service.llm_client = StreamingClient(["第一段", "第二段"], fail_after=1)
+
+    events = collect(qa_service)
+
+    assert [e["event"] for e in events] == ["sources", "token", "error", "done"]
+    assert "连接中断" in events[2]["data"]["message"]
+
+
+def test_retrieval_only_mode_sends_one_token_event(qa_service):
+    events = collect(qa_service)
+
+    assert [e["event"] for e in events] == ["sources", "token", "done"]
+    assert events[1]["data"]["content"].startswith(QAService.RETRIEVAL_ONLY_NOTICE)
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_endpoint_speaks_server_sent_events(api):
+    api.post("/api/upload", files={"file": ("guide.txt", "混合检索融合两路结果。".encode("utf-8"), "text/plain")})
+    api.main.ingestion_jobs.shutdown(wait=True)
+
+    response = api.post("/api/ask/stream", json={"question": "混合检索"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["sources", "token", "done"]
+    assert events[0][1]["sources"] == [os.path.join("uploads", "guide.txt")]
+
+
+def test_stream_endpoint_rejects_empty_question(api):
+    assert api.post("/api/ask/stream", json={"question": "  "}).status_code == 400
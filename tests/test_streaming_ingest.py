@@ -0,0 +1,64 @@
+"""流式入库：逐页加载、清洗和切片与整篇处理结果一致，片段攒满一批即写入"""
+from pathlib import Path
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from app.services.document_service import DocumentService
+from app.services.text_normalizer import normalize_document
+
+
+SAMPLE_PDF = str(Path(__file__).resolve().parent.parent / "static" / "文档2.pdf")
+
+
+def test_pages_are_yielded_lazily_and_match_whole_document_loading(document_service):
+    pages = document_service.iter_pages(SAMPLE_PDF)
+    first = next(pages)
+
+    expected = [normalize_document(page) for page in PyPDFLoader(SAMPLE_PDF).load()]
+    streamed = [first] + list(pages)
+
+    assert [p.page_content for p in streamed] == [p.page_content for p in expected]
+    assert [p.metadata for p in streamed] == [p.metadata for p in expected]
+    assert [p.metadata["page"] for p in streamed] == list(range(len(expected)))
+
+
+def test_page_by_page_chunks_match_splitting_the_whole_document(document_service):
+    pages = document_service.load_document(SAMPLE_PDF)
+
+    streamed = list(document_service.iter_chunks(iter(pages)))
+    whole = document_service.text_splitter.split_documents(pages)
+
+    assert [(c.page_content, c.metadata) for c in streamed] == [(c.page_content, c.metadata) for c in whole]
+
+
+def test_chunks_are_written_before_the_last_page_is_loaded(document_service, monkeypatch):
+    monkeypatch.setenv("CHROMA_WRITE_BATCH", "3")
+    events = []
+    iter_pages = DocumentService.iter_pages
+    write_batch = DocumentService._write_batch
+
+    def recording_pages(self, file_path):
+        for page in iter_pages(self, file_path):
+            events.append(("page", page.metadata["page"]))
+            yield page
+
+    def recording_write(self, collection, ids, chunks, stats):
+        events.append(("write", len(ids)))
+        return write_batch(self, collection, ids, chunks, stats)
+
+    monkeypatch.setattr(DocumentService, "iter_pages", recording_pages)
+    monkeypatch.setattr(DocumentService, "_write_batch", recording_write)
+    progress = []
+
+    result = document_service.ingest_document(
+        SAMPLE_PDF, progress_callback=lambda stage, **kw: progress.append((stage, kw))
+    )
+
+    writes = [size for kind, size in events if kind == "write"]
+    last_page = max(i for i, event in enumerate(events) if event[0] == "page")
+    assert events.index(("write", 3)) < last_page
+    assert all(size <= 3 for size in writes)
+    assert sum(writes) == result["chunks_count"] == document_service.client.get_collection("default").count()
+
+    totals = [kw["chunks_total"] for stage, kw in progress if stage == "embedding"]
+    assert totals == sorted(totals) and totals[-1] == result["chunks_count"]
@@ -0,0 +1,79 @@
+"""文本规范化：与原先逐条 re.sub 的清洗结果一致，入库时写入版本标记，检索时跳过已清洗的片段"""
+import re
+from pathlib import Path
+
+import pytest
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+from app.services.text_normalizer import (
+    NORMALIZER_VERSION,
+    VERSION_KEY,
+    is_normalized,
+    normalize_document,
+    normalize_text,
+    normalized_documents,
+)
+
+
+SAMPLE_PDF = str(Path(__file__).resolve().parent.parent / "static" / "文档2.pdf")
+
+
+def original_clean(content):
+    """原 DocumentService._clean_documents 的清洗步骤"""
+    content = re.sub(r'([一-龥])\s+([一-龥])', r'\1\2', content)
+    content = re.sub(r'([一-龥])\s+([一-龥])', r'\1\2', content)
+    content = re.sub(r'([一-龥])\s+([a-zA-Z0-9])', r'\1\2', content)
+    content = re.sub(r'([a-zA-Z0-9])\s+([一-龥])', r'\1\2', content)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    return content.strip()
+
+
+@pytest.mark.parametrize("text", [
+    "一 二 三 四 五 六 七 八 九 十",
+    "第 1 条 规定 of the RAG 系统",
+    "a 中 b 国 c",
+    "中\n\n\n\n文",
+    "English  words\n\n\n\nstay   apart",
+    "  首尾空白  \n",
+    "中 文 1 2，标点 ， 前后",
+])
+def test_matches_original_cleaning(text):
+    assert normalize_text(text) == original_clean(text)
+
+
+def test_matches_original_cleaning_on_sample_pdf():
+    for page in PyPDFLoader(SAMPLE_PDF).load():
+        assert normalize_text(page.page_content) == original_clean(page.page_content)
+
+
+def test_normalize_document_marks_the_version():
+    doc = normalize_document(Document(page_content="中 文", metadata={"source": "a.pdf"}))
+
+    assert doc.page_content == "中文"
+    assert doc.metadata == {"source": "a.pdf", VERSION_KEY: NORMALIZER_VERSION}
+    assert is_normalized(doc.metadata)
+    assert not is_normalized({VERSION_KEY: NORMALIZER_VERSION - 1})
+    assert not is_normalized({})
+
+
+def test_query_path_skips_clean_chunks_and_copies_the_rest():
+    clean = Document(page_content="已 清洗", metadata={VERSION_KEY: NORMALIZER_VERSION})
+    legacy = Document(page_content="旧 数据", metadata={"source": "old.txt"}, id="c1")
+
+    result = normalized_documents([clean, legacy])
+
+    assert result[0] is clean and clean.page_content == "已 清洗"
+    assert result[1].page_content == "旧数据" and result[1].id == "c1"
+    assert legacy.page_content == "旧 数据"
+
+
+def test_ingested_chunks_carry_the_version_marker(document_service, tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("中 文 文 档 内 容。", encoding="utf-8")
+    document_service.ingest_document(str(path))
+
+    data = document_service.client.get_collection("default").get(include=["documents", "metadatas"])
+
+    assert data["documents"] == ["中文文档内容。"]
+    assert data["metadatas"][0][VERSION_KEY] == NORMALIZER_VERSION
@@ -0,0 +1,61 @@
+"""按 token 偏移量切分：结果与 RecursiveCharacterTextSplitter 一致"""
+import pytest
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.token_splitter import TokenAwareTextSplitter
+from tests.conftest import FakeTokenizer
+
+
+SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "，", "、"]
+
+TEXTS = [
+    "第一段第一句。第一段第二句，比较长一些；还有分号！\n第二行？\n\n第二段只有一句。",
+    "没有任何分隔符的一整段很长的中文文本用来检查超长片段的处理方式是否一致" * 3,
+    "短句。" * 40,
+    "  开头有空白。\n\n\n\n中间有多个空行，\n\n结尾也有空白。  ",
+    "混合 English words 与中文，数字 12345 和符号！" * 10,
+    "",
+]
+
+
+def reference_splitter(chunk_size, chunk_overlap):
+    tokenizer = FakeTokenizer()
+    return RecursiveCharacterTextSplitter(
+        separators=SEPARATORS,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=lambda text: len(tokenizer.encode(text))
+    )
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(8, 2), (20, 5), (40, 10), (480, 80)])
+@pytest.mark.parametrize("text", TEXTS)
+def test_matches_recursive_character_splitter(text, chunk_size, chunk_overlap):
+    splitter = TokenAwareTextSplitter(FakeTokenizer(), SEPARATORS, chunk_size, chunk_overlap)
+
+    assert splitter.split_text(text) == reference_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def test_oversized_piece_without_separators_is_kept_verbatim():
+    text = "甲" * 30 + "\n  " + "乙" * 30 + "  "
+    splitter = TokenAwareTextSplitter(FakeTokenizer(), ["\n"], chunk_size=10, chunk_overlap=0)
+
+    assert splitter.split_text(text) == ["甲" * 30, "\n  " + "乙" * 30 + "  "]
+
+
+def test_split_documents_copies_page_metadata():
+    splitter = TokenAwareTextSplitter(FakeTokenizer(), SEPARATORS, chunk_size=8, chunk_overlap=0)
+    pages = [Document(page_content="第一页。" * 5, metadata={"source": "a.pdf", "page": 0})]
+
+    chunks = splitter.split_documents(pages)
+
+    assert len(chunks) > 1
+    assert all(chunk.metadata == {"source": "a.pdf", "page": 0} for chunk in chunks)
+    chunks[0].metadata["page"] = 9
+    assert pages[0].metadata["page"] == 0
+
+
+def test_rejects_overlap_larger_than_chunk_size():
+    with pytest.raises(ValueError, match="chunk_overlap"):
+        TokenAwareTextSplitter(FakeTokenizer(), chunk_size=10, chunk_overlap=20)
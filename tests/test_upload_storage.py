@@ -0,0 +1,78 @@
+"""上传落盘：分块写入临时文件并计算哈希，超限拒绝（413），内容未变化的重复上传不再入库"""
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from app.services.upload_storage import UploadSpooler, UploadTooLargeError, file_sha256
+from tests.conftest import wait_for_job
+
+
+class ChunkedUpload:
+    """记录每次 read 请求的大小"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+        self.reads = []
+
+    async def read(self, size=-1):
+        self.reads.append(size)
+        block = self.data[self.offset:self.offset + size]
+        self.offset += len(block)
+        return block
+
+
+def test_spool_reads_in_chunks_and_hashes_while_writing(tmp_path):
+    data = os.urandom(10_000)
+    upload = ChunkedUpload(data)
+    target = str(tmp_path / "doc.txt")
+
+    tmp_file, size, digest = asyncio.run(UploadSpooler(chunk_size=4096, max_bytes=0).spool(upload, target))
+
+    assert upload.reads == [4096] * 4
+    assert size == len(data) and digest == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(target)
+    UploadSpooler.commit(tmp_file, target)
+    assert open(target, "rb").read() == data and file_sha256(target) == digest
+
+
+def test_oversized_upload_is_rejected_and_leaves_no_temp_file(tmp_path):
+    spooler = UploadSpooler(chunk_size=4, max_bytes=10)
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(spooler.spool(ChunkedUpload(b"x" * 11), str(tmp_path / "doc.txt")))
+    with pytest.raises(UploadTooLargeError):
+        spooler.check_size(11)
+
+    spooler.check_size(10)
+    assert os.listdir(tmp_path) == []
+
+
+def test_discard_tolerates_missing_file(tmp_path):
+    UploadSpooler.discard(str(tmp_path / "missing.part"))
+
+
+def test_upload_over_limit_returns_413(api):
+    api.main.upload_spooler.max_bytes = 10
+
+    response = api.post("/api/upload", files={"file": ("big.txt", "超过十个字节的内容".encode("utf-8"))})
+
+    assert response.status_code == 413
+    assert not [name for name in os.listdir("uploads") if name.endswith(".part")]
+
+
+def test_identical_reupload_is_reported_unchanged(api):
+    content = "第一次上传的内容。".encode("utf-8")
+    first = api.post("/api/upload", files={"file": ("same.txt", content)})
+    wait_for_job(api, first.json()["job_id"])
+
+    second = api.post("/api/upload", files={"file": ("same.txt", content)})
+    changed = api.post("/api/upload", files={"file": ("same.txt", "修改后的内容。".encode("utf-8"))})
+
+    assert second.status_code == 200
+    assert second.json()["status"] == "unchanged"
+    assert second.json()["content_hash"] == first.json()["content_hash"] == hashlib.sha256(content).hexdigest()
+    assert changed.status_code == 202
+    wait_for_job(api, changed.json()["job_id"])